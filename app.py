@@ -1,22 +1,58 @@
-import zipfile
 import logging
-import uuid
-from fastapi import FastAPI, HTTPException, Header, Depends
-from fastapi.responses import FileResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Depends, Request
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from utils.gpt_utils import generate_prompt_from_chatgpt
-from utils.app_utils import generate_and_save_image, convert_image_to_svg, convert_svg_to_gcode, sanitize_folder_name
-from utils.compression_utils import compress_png_thumbnail
+from utils.http_utils import close_http_client
+from utils.worker_utils import run_in_worker, shutdown_worker_pool
+from utils.pipeline_utils import BASE_FOLDER, PipelineError
+from utils.singleflight_utils import run_generation_once
+from utils.admission_utils import AdmissionRejected, get_admission_controller
+from utils.batch_utils import MAX_BATCH_SIZE, iter_batch_results
+from utils.sse_utils import format_sse, iter_pipeline_events
+from utils.job_scheduler import JobQueueFullError, submit_job, start_job_scheduler, stop_job_scheduler
+from utils.job_store import get_job, close_job_store
+from utils.app_utils import list_generated_files, sanitize_folder_name
+from utils.cache_utils import cache_stats
+from utils.retention_utils import start_retention_sweeper, stop_retention_sweeper, touch_artifact
+from utils.download_utils import IMMUTABLE_CACHE_CONTROL, ArtifactStaticFiles, content_type, etag_matches, file_etag, is_immutable_artifact, resolve_static_path
+from utils.zip_stream_utils import iter_zip_archive
+from utils.machine_profiles import get_machine_profile, list_machine_profiles
+from utils.gcode_analyzer_utils import GCODE_ANALYZE_MAX_BYTES, analyze_gcode
+from utils.metrics_utils import SIZE_BUCKETS, CorrelationIdFilter, increment, observe, render_metrics, start_request, time_stage
+import json
 import os
+import time
+import uuid
 from fastapi import status
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Validates the API keys and starts the job scheduler and retention sweeper on startup,
+    and releases shared resources (job workers, sweeper, HTTP connection pool, worker pool,
+    job store) on shutdown.
+    """
+    get_admission_controller()
+    await start_job_scheduler()
+    start_retention_sweeper()
+    yield
+    await stop_job_scheduler()
+    await stop_retention_sweeper()
+    await close_http_client()
+    shutdown_worker_pool()
+    close_job_store()
+
 # Create the FastAPI app instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Setup logging, tagging every record with the correlation id of the request it belongs to
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s")
+for handler in logging.getLogger().handlers:
+    handler.addFilter(CorrelationIdFilter())
 logger = logging.getLogger(__name__)
 
 # Add CORS middleware
@@ -27,117 +63,412 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
 )
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """
+    Assigns each request a correlation id (taken from X-Request-ID when the client sends
+    one), records its count and duration, and logs a structured summary with the time
+    spent in each pipeline stage.
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    timings = start_request(request_id)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        increment("http_requests_total", {"route": route_path, "method": request.method, "status": status_code})
+        observe("http_request_duration_seconds", elapsed, {"route": route_path})
+        logger.info(json.dumps({
+            "event": "request",
+            "method": request.method,
+            "path": request.url.path,
+            "status": status_code,
+            "duration_ms": round(elapsed * 1000, 1),
+            "stages": timings,
+        }))
+
 # Serve static files from the "tmp/static" directory
-app.mount("/static", StaticFiles(directory="tmp/static"), name="static")
+app.mount("/static", ArtifactStaticFiles(directory="tmp/static"), name="static")
 
-# Load API key from environment variables
+# Accept the API keys from environment variables (API_KEYS, or the single API_KEY), read once at startup
 async def verify_api_key(x_api_key: str = Header(...)):
-    api_key = os.getenv("API_KEY")
-    if x_api_key != api_key:
+    if x_api_key not in get_admission_controller().key_limits:
         logger.warning("Unauthorized access attempt with invalid API key")
         raise HTTPException(status_code=403, detail="Invalid API Key")
+    return x_api_key
+
+async def admit_request(api_key: str, weight: int = 1):
+    """
+    Waits for admission slots for a request running weight generations at once, answering
+    429 with Retry-After when the server is saturated.
+    """
+    try:
+        return await get_admission_controller().acquire(api_key, weight)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected generation request: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
 # Define the input model for the API request
 class ImageRequest(BaseModel):
     concept: str
+    machine_profile: Optional[str] = None
+    fresh: bool = False
+
+# Define the input model for batch generation requests
+class BatchImageRequest(BaseModel):
+    concepts: List[str]
+    variants: int = 1
+    machine_profile: Optional[str] = None
+
+def validate_machine_profile(name: Optional[str]):
+    """
+    Rejects requests naming a machine profile that doesn't exist.
+    """
+    try:
+        get_machine_profile(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def build_download_urls(state: dict) -> dict:
+    """
+    Builds the download URLs for the files produced by the generation pipeline.
+    """
+    base_url = os.getenv("BASE_URL")
+    download_url = f"{base_url}/download"
+    urls = {}
+    for key in ["image", "thumbnail", "svg", "gcode"]:
+        path = state.get(f"{key}_path")
+        if path:
+            urls[f"{key}_download_url"] = f"{download_url}?filepath={os.path.relpath(path, BASE_FOLDER).replace(os.sep, '/')}"
+    if state.get("gcode_path"):
+        folder_id = os.path.basename(state["output_folder"])
+        urls["zip_download_url"] = f"{base_url}/archive/{folder_id}/{sanitize_folder_name(state['concept'])}.zip"
+    if state.get("thumbnail_path"):
+        urls["thumbnail"] = f"{base_url}/static/{os.path.relpath(state['thumbnail_path'], BASE_FOLDER).replace(os.sep, '/')}"
+    previews = {
+        name: f"{base_url}/static/{os.path.relpath(derivative['path'], BASE_FOLDER).replace(os.sep, '/')}"
+        for name, derivative in (state.get("derivatives") or {}).items() if isinstance(derivative, dict)
+    }
+    if previews:
+        urls["previews"] = previews
+    if state.get("toolpath_preview_path"):
+        urls["toolpath_preview"] = f"{base_url}/static/{os.path.relpath(state['toolpath_preview_path'], BASE_FOLDER).replace(os.sep, '/')}"
+    return urls
+
+def build_derivative_timings(state: dict) -> dict:
+    """
+    Reports how long decoding the image and encoding each of its derivatives took, in seconds.
+    """
+    derivatives = state.get("derivatives") or {}
+    if not derivatives:
+        return None
+    timings = {"decode": derivatives.get("decode_seconds")}
+    timings.update({name: derivative["seconds"] for name, derivative in derivatives.items() if isinstance(derivative, dict)})
+    return timings
+
+# Fields sent with each stage's "done" event on /generate/stream
+STAGE_EVENT_FIELDS = {
+    "prompt": ["prompt"],
+    "image": [],
+    "thumbnail": ["thumbnail", "thumbnail_download_url", "previews", "derivative_timings"],
+    "svg": ["svg_download_url"],
+    "gcode": ["gcode_download_url", "gcode_stats", "toolpath_preview"],
+}
 
-@app.post("/generate", dependencies=[Depends(verify_api_key)])
-async def generate_image(request: ImageRequest):
+def build_generation_response(state: dict) -> dict:
+    """
+    Builds the response describing a completed generation.
+    """
+    return {
+        "message": "Image Generation Successful!",
+        "prompt": state["prompt"],
+        "machine_profile": state["machine_profile"],
+        "cache_hits": state["cache_hits"],
+        "gcode_stats": state.get("gcode_stats"),
+        "derivative_timings": build_derivative_timings(state),
+        **build_download_urls(state)
+    }
+
+@app.post("/generate")
+async def generate_image(request: ImageRequest, api_key: str = Depends(verify_api_key)):
     """
     Endpoint to generate an image based on the user's concept.
+
+    Concurrent requests for the same concept and machine profile share one pipeline run
+    and receive the same files, flagged with "coalesced"; set "fresh" to generate a new
+    image variant instead.
     """
+    validate_machine_profile(request.machine_profile)
+    admission = await admit_request(api_key)
     try:
-        user_input = request.concept
         logger.info("=== Image Generation Workflow Started ===")
-        
-        # Step 1: Generate a detailed prompt from ChatGPT
-        logger.info("Generating image prompt from user input...")
-        generated_prompt = generate_prompt_from_chatgpt(user_input)
-        logger.info(f"Generated Image Prompt: {generated_prompt}")
-
-        # Base directory to store generated assets
-        base_folder = "tmp/static"
-        
-        # Create a unique folder name using UUID
-        unique_folder_name = str(uuid.uuid4())
-        output_folder = os.path.join(base_folder, unique_folder_name)
-
-        # Create the unique output folder if it doesn't exist
-        os.makedirs(output_folder, exist_ok=True)
-
-        # Step 2: Generate and save the image
-        _, image_path = generate_and_save_image(generated_prompt, output_folder, user_input)
-        if not image_path:
-            raise HTTPException(status_code=500, detail="Failed to generate and save image.")
-
-        # Step 3: Create a thumbnail of the image
-        thumbnail_path = compress_png_thumbnail(image_path, output_path=os.path.join(output_folder, "thumbnail.png"))
-        if not thumbnail_path:
-            raise HTTPException(status_code=500, detail="Thumbnail generation failed.")
-
-        # Step 4: Convert the image to SVG
-        svg_path = convert_image_to_svg(image_path, output_folder)
-        if not svg_path:
-            raise HTTPException(status_code=500, detail="SVG conversion failed.")
-
-        # Step 5: Convert the SVG to G-code
-        gcode_path = convert_svg_to_gcode(svg_path, output_folder)
-        if not gcode_path:
-            raise HTTPException(status_code=500, detail="G-code conversion failed.")
-        
-        # Step 6: Create a ZIP file containing all generated files
-        zip_name = sanitize_folder_name(user_input) + ".zip"  # Use user's input to name the zip file
-        zip_path = os.path.join(output_folder, zip_name)
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            zipf.write(image_path, arcname=os.path.basename(image_path))
-            zipf.write(svg_path, arcname=os.path.basename(svg_path))
-            zipf.write(gcode_path, arcname=os.path.basename(gcode_path))
-            zipf.write(thumbnail_path, arcname=os.path.basename(thumbnail_path))
-
+        state, coalesced = await run_generation_once(request.concept, request.machine_profile, fresh=request.fresh)
+        logger.info(f"Generated Image Prompt: {state['prompt']}")
         logger.info("=== Image Generation Workflow Completed ===")
 
-        # Generate download URLs
-        base_url = os.getenv("BASE_URL")
-        download_url = f"{base_url}/download"
-        image_download_url = f"{download_url}?filepath={os.path.relpath(image_path, base_folder).replace(os.sep, '/')}"
-        thumbnail_download_url = f"{download_url}?filepath={os.path.relpath(thumbnail_path, base_folder).replace(os.sep, '/')}"
-        thumbnail = f"{base_url}/static/{os.path.relpath(thumbnail_path, base_folder).replace(os.sep, '/')}"
-        svg_download_url = f"{download_url}?filepath={os.path.relpath(svg_path, base_folder).replace(os.sep, '/')}"
-        gcode_download_url = f"{download_url}?filepath={os.path.relpath(gcode_path, base_folder).replace(os.sep, '/')}"
-        zip_download_url = f"{download_url}?filepath={os.path.relpath(zip_path, base_folder).replace(os.sep, '/')}"
-
-        return {
-            "message": "Image Generation Successful!",
-            "prompt": generated_prompt,
-            "image_download_url": image_download_url,
-            "thumbnail_download_url": thumbnail_download_url,
-            "thumbnail": thumbnail,
-            "svg_download_url": svg_download_url,
-            "gcode_download_url": gcode_download_url,
-            "zip_download_url": zip_download_url
-        }
+        return {**build_generation_response(state), "coalesced": coalesced}
 
+    except PipelineError as e:
+        logger.error(f"An error occurred: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         logger.error(f"An error occurred: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    finally:
+        admission.release()
+
+@app.post("/generate/stream")
+async def generate_image_stream(request: ImageRequest, api_key: str = Depends(verify_api_key)):
+    """
+    Endpoint to generate an image while streaming progress as server-sent events.
+
+    Each stage emits an event named after it when it starts and finishes; "done" events
+    carry the stage's result (the prompt text, the thumbnail, SVG and G-code URLs, the
+    G-code stats) so clients can show partial results straight away. The stream ends with
+    a "complete" event holding the same body as /generate, or an "error" event.
+    """
+    validate_machine_profile(request.machine_profile)
+    admission = await admit_request(api_key)
+
+    async def stream_events():
+        logger.info("=== Streamed Image Generation Started ===")
+        try:
+            async for kind, payload in iter_pipeline_events(request.concept, request.machine_profile, request.fresh):
+                if kind == "keepalive":
+                    yield ": keepalive\n\n"
+                elif kind == "stage":
+                    stage, stage_status, state = payload
+                    data = {"stage": stage, "status": stage_status}
+                    if stage_status == "done":
+                        results = {**state, **build_download_urls(state), "derivative_timings": build_derivative_timings(state)}
+                        data.update({field: results.get(field) for field in STAGE_EVENT_FIELDS[stage]})
+                        data["cached"] = stage in state["cache_hits"]
+                    yield format_sse(stage, data)
+                elif kind == "complete":
+                    logger.info("=== Streamed Image Generation Completed ===")
+                    yield format_sse("complete", build_generation_response(payload))
+                else:
+                    logger.error(f"An error occurred: {str(payload)}")
+                    if isinstance(payload, PipelineError):
+                        yield format_sse("error", {"stage": payload.stage, "error": str(payload)})
+                    else:
+                        yield format_sse("error", {"stage": None, "error": f"An error occurred: {str(payload)}"})
+        finally:
+            admission.release()
+
+    # The background task frees the slot if the client leaves before the stream starts
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(admission.release)
+    )
+
+@app.post("/generate/batch")
+async def generate_image_batch(request: BatchImageRequest, api_key: str = Depends(verify_api_key)):
+    """
+    Endpoint to generate several concepts, and several variants of each, in one request.
+
+    Generations run concurrently within the per-provider concurrency and rate limits, and
+    their results are streamed back as newline-delimited JSON, one line per generation in
+    the order they complete. The batch takes one admission slot per generation it runs at
+    once, up to the API key's limit, and runs its remaining generations as those finish.
+    """
+    validate_machine_profile(request.machine_profile)
+    if not request.concepts or request.variants < 1:
+        raise HTTPException(status_code=400, detail="At least one concept and one variant are required.")
+    if len(request.concepts) * request.variants > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {MAX_BATCH_SIZE} generations.")
+    controller = get_admission_controller()
+    concurrency = min(len(request.concepts) * request.variants, controller.key_limit(api_key), controller.max_concurrency)
+    admission = await admit_request(api_key, concurrency)
+
+    async def stream_results():
+        logger.info(f"=== Batch Generation Started: {len(request.concepts)} concepts x {request.variants} variants ===")
+        try:
+            async for result in iter_batch_results(request.concepts, request.variants, request.machine_profile, concurrency):
+                item = {"index": result["index"], "concept": result["concept"], "variant": result["variant"]}
+                state = result.get("state")
+                if state is None:
+                    logger.error(f"Batch item {result['index']} failed: {result['error']}")
+                    item.update({"status": "failed", "stage": result.get("stage"), "error": result["error"]})
+                else:
+                    item.update({
+                        "status": "completed",
+                        "prompt": state["prompt"],
+                        "machine_profile": state["machine_profile"],
+                        "cache_hits": state["cache_hits"],
+                        "gcode_stats": state.get("gcode_stats"),
+                        **build_download_urls(state)
+                    })
+                yield json.dumps(item) + "\n"
+            logger.info("=== Batch Generation Completed ===")
+        finally:
+            admission.release()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson", background=BackgroundTask(admission.release))
+
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_generation_job(request: ImageRequest, api_key: str = Depends(verify_api_key)):
+    """
+    Endpoint to queue an image generation job and return its id immediately. The job is
+    admitted like a /generate request and holds its slot until it completes or fails.
+    """
+    validate_machine_profile(request.machine_profile)
+    admission = await admit_request(api_key)
+    try:
+        job = await submit_job(request.concept, request.machine_profile, on_finish=admission.release, fresh=request.fresh)
+    except JobQueueFullError as e:
+        admission.release()
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception:
+        admission.release()
+        raise
+
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"{os.getenv('BASE_URL')}/jobs/{job['id']}"
+    }
+
+@app.get("/jobs/{job_id}", dependencies=[Depends(verify_api_key)])
+async def get_generation_job(job_id: str):
+    """
+    Endpoint to report the per-stage progress of a job and, once completed, its download URLs.
+    """
+    job = await run_in_worker(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    response = {
+        "job_id": job["id"],
+        "concept": job["concept"],
+        "status": job["status"],
+        "stages": job["stages"],
+        "error": job["error"],
+    }
+    for key in ["prompt", "machine_profile", "cache_hits", "gcode_stats"]:
+        if job["state"].get(key):
+            response[key] = job["state"][key]
+    response.update(build_download_urls(job["state"]))
+    return response
+
+@app.get("/machine-profiles")
+async def get_machine_profiles():
+    """
+    Endpoint to list the machine profiles G-code can be generated for.
+    """
+    return {"profiles": {name: get_machine_profile(name) for name in list_machine_profiles()}}
+
+@app.post("/gcode/analyze", dependencies=[Depends(verify_api_key)])
+async def analyze_gcode_upload(request: Request, machine_profile: Optional[str] = None):
+    """
+    Endpoint to analyze an uploaded G-code program, sent as the raw request body.
+
+    Returns its drawing bounds, draw and travel distances, move counts and estimated plot
+    time on the machine profile, with warnings for moves outside the bed.
+    """
+    validate_machine_profile(machine_profile)
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > GCODE_ANALYZE_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"G-code uploads are limited to {GCODE_ANALYZE_MAX_BYTES} bytes.")
+    if not body.strip():
+        raise HTTPException(status_code=400, detail="The request body must contain a G-code program.")
+
+    lines = body.decode("utf-8", errors="replace").splitlines()
+    return await run_in_worker(analyze_gcode, lines, get_machine_profile(machine_profile))
+
+@app.get("/cache/stats", dependencies=[Depends(verify_api_key)])
+async def get_cache_stats():
+    """
+    Endpoint to report cache hits, misses, stores and evictions per cached stage.
+    """
+    return await run_in_worker(cache_stats)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Endpoint exposing request, stage, provider and cache metrics in the Prometheus text format.
+    """
+    stats = await run_in_worker(cache_stats)
+    cache_counters = {
+        f"cache_{counter}_total": (f"Cache {counter} per cached stage.", {
+            (("namespace", namespace),): counters[counter] for namespace, counters in stats["namespaces"].items()
+        })
+        for counter in ["hits", "misses", "stores", "evictions"]
+    }
+    return PlainTextResponse(render_metrics(cache_counters), media_type="text/plain; version=0.0.4")
+
+@app.get("/archive/{folder_id}/{filename}")
+async def download_archive(folder_id: str, filename: str):
+    """
+    Endpoint to download all files of a generation as a ZIP archive, assembled while it streams.
+    """
+    try:
+        uuid.UUID(folder_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    file_paths = await run_in_worker(list_generated_files, os.path.join(BASE_FOLDER, folder_id))
+    if not file_paths:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
+    await run_in_worker(touch_artifact, folder_id)
+    archive_name = sanitize_folder_name(os.path.splitext(filename)[0]) or "generated"
+
+    def metered_archive():
+        size = 0
+        with time_stage("zip"):
+            for chunk in iter_zip_archive(file_paths):
+                size += len(chunk)
+                yield chunk
+        observe("archive_bytes", size, buckets=SIZE_BUCKETS)
+
+    return StreamingResponse(
+        metered_archive(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{archive_name}.zip"'}
+    )
 
 @app.get("/download")
-async def download_file(filepath: str):
+async def download_file(filepath: str, request: Request):
     """
     Endpoint to download a file with a given filepath.
-    """
-    full_path = os.path.join("tmp/static", filepath)
 
-    if not os.path.exists(full_path):
+    Responses carry a strong ETag derived from the file's content (answered with 304 when
+    it matches If-None-Match), support Range requests for resumable downloads, and are
+    marked immutable for files in a generation's output folder.
+    """
+    full_path = resolve_static_path(BASE_FOLDER, filepath)
+    if full_path is None:
         raise HTTPException(status_code=404, detail="File not found")
 
+    await run_in_worker(touch_artifact, filepath)
+    etag = await run_in_worker(file_etag, full_path)
+    headers = {"ETag": etag}
+    if is_immutable_artifact(filepath):
+        headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
     # Extract the filename from the path and use it in the response
     filename = os.path.basename(full_path)
 
-    # Using FileResponse to send the file with a header that forces a download
+    # FileResponse answers Range and If-Range requests with 206/416 and forces a download
     return FileResponse(
-        full_path, 
-        media_type="application/octet-stream", 
+        full_path,
+        media_type=content_type(full_path),
+        headers=headers,
         filename=filename  # Sets the default download filename to match user's concept input
     )
 
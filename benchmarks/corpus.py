@@ -0,0 +1,119 @@
+import math
+import os
+import random
+from PIL import Image, ImageDraw
+
+# Complexity levels of the generated corpus: number of shapes drawn per file
+COMPLEXITY = {"simple": 8, "medium": 40, "complex": 160}
+
+# Size of the generated PNGs, matching DALL-E 3's default output
+IMAGE_SIZE = 1024
+
+def _random_shape(rng: random.Random, size: int) -> tuple:
+    kind = rng.choice(["line", "ellipse", "curve", "polygon"])
+    x, y = rng.uniform(0.05, 0.95) * size, rng.uniform(0.05, 0.95) * size
+    # Keep every point, control point and arc within the canvas, so the drawing fits the viewBox
+    extent = min(rng.uniform(0.03, 0.3) * size, x, size - x, y, size - y)
+    if kind == "line":
+        angle = rng.uniform(0, 2 * math.pi)
+        return kind, [(x, y), (x + extent * math.cos(angle), y + extent * math.sin(angle))]
+    if kind == "ellipse":
+        return kind, [(x - extent, y - extent * 0.6), (x + extent, y + extent * 0.6)]
+    if kind == "curve":
+        return kind, [(x + rng.uniform(-extent, extent), y + rng.uniform(-extent, extent)) for _ in range(4)]
+    sides = rng.randint(3, 8)
+    return kind, [(x + extent * math.cos(2 * math.pi * i / sides), y + extent * math.sin(2 * math.pi * i / sides)) for i in range(sides)]
+
+def _bezier(points: list, steps: int = 32) -> list:
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3) = points
+    curve = []
+    for step in range(steps + 1):
+        t = step / steps
+        a, b, c, d = (1 - t) ** 3, 3 * (1 - t) ** 2 * t, 3 * (1 - t) * t * t, t ** 3
+        curve.append((a * x0 + b * x1 + c * x2 + d * x3, a * y0 + b * y1 + c * y2 + d * y3))
+    return curve
+
+def draw_png(path: str, shape_count: int, seed: int, size: int = IMAGE_SIZE):
+    """
+    Draws a black-on-white line drawing like the ones DALL-E is asked for.
+
+    Args:
+        path (str): Where to write the PNG.
+        shape_count (int): Number of lines, ellipses, curves and polygons to draw.
+        seed (int): Random seed, so the corpus is identical between runs.
+        size (int): Width and height in pixels.
+    """
+    rng = random.Random(seed)
+    image = Image.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(shape_count):
+        kind, points = _random_shape(rng, size)
+        width = rng.randint(2, 8)
+        if kind == "ellipse":
+            draw.ellipse(points, outline="black", width=width)
+        elif kind == "curve":
+            draw.line(_bezier(points), fill="black", width=width, joint="curve")
+        elif kind == "polygon":
+            draw.line(points + points[:1], fill="black", width=width, joint="curve")
+        else:
+            draw.line(points, fill="black", width=width)
+    image.save(path, format="PNG")
+
+def write_svg(path: str, shape_count: int, seed: int, size: int = IMAGE_SIZE):
+    """
+    Writes an SVG of lines, cubic curves, elliptical arcs and polygons, exercising every
+    path command the G-code converter handles.
+
+    Args:
+        path (str): Where to write the SVG.
+        shape_count (int): Number of shapes to draw.
+        seed (int): Random seed, so the corpus is identical between runs.
+        size (int): Width and height of the viewBox.
+    """
+    rng = random.Random(seed)
+    elements = []
+    for _ in range(shape_count):
+        kind, points = _random_shape(rng, size)
+        if kind == "ellipse":
+            (x0, y0), (x1, y1) = points
+            rx, ry, cy = (x1 - x0) / 2, (y1 - y0) / 2, (y0 + y1) / 2
+            elements.append(f'<path d="M {x0:.2f} {cy:.2f} A {rx:.2f} {ry:.2f} 0 1 0 {x1:.2f} {cy:.2f} A {rx:.2f} {ry:.2f} 0 1 0 {x0:.2f} {cy:.2f} Z"/>')
+        elif kind == "curve":
+            (x0, y0), (x1, y1), (x2, y2), (x3, y3) = points
+            elements.append(f'<path d="M {x0:.2f} {y0:.2f} C {x1:.2f} {y1:.2f} {x2:.2f} {y2:.2f} {x3:.2f} {y3:.2f}"/>')
+        elif kind == "polygon":
+            elements.append('<polygon points="' + " ".join(f"{x:.2f},{y:.2f}" for x, y in points) + '"/>')
+        else:
+            (x0, y0), (x1, y1) = points
+            elements.append(f'<line x1="{x0:.2f}" y1="{y0:.2f}" x2="{x1:.2f}" y2="{y1:.2f}"/>')
+    with open(path, "w") as svg_file:
+        svg_file.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 {size} {size}" '
+            f'fill="none" stroke="black">\n' + "\n".join(elements) + "\n</svg>\n"
+        )
+
+def build_corpus(directory: str, files_per_level: int = 3) -> dict:
+    """
+    Generates the benchmark corpus, skipping files that already exist.
+
+    Args:
+        directory (str): Where to write the corpus.
+        files_per_level (int): Number of PNGs and SVGs per complexity level.
+
+    Returns:
+        dict: {"png": [...], "svg": [...]}, the corpus file paths ordered by complexity.
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus = {"png": [], "svg": []}
+    for level, shape_count in COMPLEXITY.items():
+        for index in range(files_per_level):
+            seed = shape_count * 1000 + index
+            png_path = os.path.join(directory, f"{level}_{index}.png")
+            svg_path = os.path.join(directory, f"{level}_{index}.svg")
+            if not os.path.exists(png_path):
+                draw_png(png_path, shape_count, seed)
+            if not os.path.exists(svg_path):
+                write_svg(svg_path, shape_count, seed)
+            corpus["png"].append(png_path)
+            corpus["svg"].append(svg_path)
+    return corpus
@@ -0,0 +1,111 @@
+import asyncio
+import base64
+import hashlib
+import itertools
+import threading
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+def create_fake_provider_app(images: list, chat_latency: float = 0.5, image_latency: float = 5.0, convertio_latency: float = 3.0) -> FastAPI:
+    """
+    Builds an app standing in for the OpenAI chat and image endpoints and the Convertio API,
+    answering after a fixed latency so the pipeline can be benchmarked offline.
+
+    Args:
+        images (list): PNG files returned by the image endpoint, picked by a hash of the prompt.
+        chat_latency (float): Seconds before a chat completion is returned.
+        image_latency (float): Seconds before an image is returned.
+        convertio_latency (float): Seconds a Convertio conversion takes to finish.
+
+    Returns:
+        FastAPI: The fake provider app. Point OPENAI_BASE_URL at <url>/v1 and CONVERTIO_URL
+        at <url>/convert.
+    """
+    app = FastAPI()
+    image_data = []
+    for path in images:
+        with open(path, "rb") as image_file:
+            image_data.append(image_file.read())
+    conversions = {}
+    counter = itertools.count()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(chat_latency)
+        concept = body["messages"][-1]["content"]
+        return {
+            "id": f"chatcmpl-{next(counter)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": f"A simple line drawing of {concept}, made of a few clean shapes."},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.post("/v1/images/generations")
+    async def images_generations(request: Request):
+        body = await request.json()
+        await asyncio.sleep(image_latency)
+        digest = int(hashlib.sha256(body["prompt"].encode("utf-8")).hexdigest(), 16)
+        return {"created": int(time.time()), "data": [{"b64_json": base64.b64encode(image_data[digest % len(image_data)]).decode("ascii")}]}
+
+    @app.post("/convert")
+    async def start_conversion():
+        conversion_id = uuid.uuid4().hex
+        conversions[conversion_id] = {"ready_at": None, "data": None}
+        return {"status": "ok", "data": {"id": conversion_id}}
+
+    @app.put("/convert/{conversion_id}/{file_name}")
+    async def upload(conversion_id: str, file_name: str, request: Request):
+        conversion = conversions.get(conversion_id)
+        if conversion is None:
+            return JSONResponse({"status": "error", "error": "Unknown conversion"}, status_code=404)
+        await request.body()
+        # Answer with a fixed SVG; the conversion itself is benchmarked with the local vectorizer
+        conversion["data"] = b'<svg xmlns="http://www.w3.org/2000/svg" width="1024" height="1024"><path d="M 100 100 C 300 50 500 900 900 900"/></svg>'
+        conversion["ready_at"] = time.monotonic() + convertio_latency
+        return {"status": "ok"}
+
+    @app.get("/convert/{conversion_id}/status")
+    async def status(conversion_id: str, request: Request):
+        conversion = conversions.get(conversion_id)
+        if conversion is None or conversion["ready_at"] is None:
+            return JSONResponse({"status": "error", "error": "Unknown conversion"}, status_code=404)
+        if time.monotonic() < conversion["ready_at"]:
+            return {"status": "ok", "data": {"step": "convert"}}
+        return {"status": "ok", "data": {"step": "finish", "output": {"url": f"{str(request.base_url).rstrip('/')}/convert/{conversion_id}/output"}}}
+
+    @app.get("/convert/{conversion_id}/output")
+    async def output(conversion_id: str):
+        conversion = conversions.pop(conversion_id, None)
+        if conversion is None:
+            return Response(status_code=404)
+        return Response(conversion["data"], media_type="image/svg+xml")
+
+    return app
+
+class FakeProviderServer:
+    """Runs the fake provider app with uvicorn in a background thread."""
+
+    def __init__(self, app: FastAPI, port: int = 8765):
+        self.url = f"http://127.0.0.1:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join()
@@ -0,0 +1,306 @@
+"""
+Offline benchmarks for the conversion pipeline.
+
+Measures svg_to_gcode, the image derivative stage and the local vectorizer on a generated corpus of
+line drawings, and the full /generate request against local stand-ins for OpenAI and
+Convertio. Reports throughput, p50/p99 latency, peak memory and per-file G-code size and
+travel, and compares them against a saved baseline.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks --output ~/.cache/gpt-to-svg-gcode-ai/bench-baseline.json
+    python -m benchmarks.run_benchmarks --baseline ~/.cache/gpt-to-svg-gcode-ai/bench-baseline.json
+"""
+import argparse
+import asyncio
+import atexit
+import contextlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import build_corpus
+from benchmarks.fake_servers import FakeProviderServer, create_fake_provider_app
+
+def summarize(latencies: list, wall_time: float = None) -> dict:
+    """
+    Summarizes latencies in seconds. Throughput is per second of wall time, which defaults
+    to the sum of the latencies for sequential runs.
+    """
+    latencies = np.asarray(latencies)
+    wall_time = wall_time if wall_time is not None else float(latencies.sum())
+    return {
+        "runs": len(latencies),
+        "throughput": round(len(latencies) / wall_time, 3) if wall_time else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+        "mean_ms": round(float(latencies.mean()) * 1000, 2),
+    }
+
+def peak_memory(func, *args, **kwargs) -> int:
+    """Runs func once under tracemalloc and returns its peak traced allocation in bytes."""
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_files(func, paths: list, repeats: int, output_for) -> tuple:
+    """
+    Times func(path, output_for(path)) for every file, repeats times each, and measures the
+    peak memory of one extra run per file.
+
+    Returns:
+        tuple: (summary, per-file results holding the output path and last return value).
+    """
+    latencies, files = [], []
+    for path in paths:
+        output_path = output_for(path)
+        result = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = func(path, output_path)
+            latencies.append(time.perf_counter() - start)
+        files.append({
+            "file": os.path.basename(path),
+            "peak_memory_bytes": peak_memory(func, path, output_path),
+            "output_path": output_path,
+            "result": result,
+        })
+    summary = summarize(latencies)
+    summary["peak_memory_bytes"] = max(entry["peak_memory_bytes"] for entry in files)
+    return summary, files
+
+def bench_gcode(corpus: dict, repeats: int, work_dir: str) -> dict:
+    from utils.svg_to_gcode_utils import svg_to_gcode
+
+    def output_for(path):
+        return os.path.join(work_dir, os.path.basename(path).replace(".svg", ".gcode"))
+
+    summary, files = bench_files(svg_to_gcode, corpus["svg"], repeats, output_for)
+    summary["files"] = []
+    for entry in files:
+        _, stats = entry["result"]
+        summary["files"].append({
+            "file": entry["file"],
+            "gcode_bytes": os.path.getsize(entry["output_path"]),
+            "path_count": stats["path_count"],
+            "line_count": stats["line_count"],
+            "arc_count": stats["arc_count"],
+            "travel_before": stats["travel_before"],
+            "travel_after": stats["travel_after"],
+            "peak_memory_bytes": entry["peak_memory_bytes"],
+        })
+    return summary
+
+def bench_thumbnail(corpus: dict, repeats: int, work_dir: str) -> dict:
+    from utils.compression_utils import FILE_EXTENSIONS, decode_image, encode_derivative, parse_derivative_specs
+
+    specs = parse_derivative_specs()
+
+    def output_for(path):
+        return os.path.join(work_dir, "derivatives_" + os.path.splitext(os.path.basename(path))[0])
+
+    def create_derivatives(path, output_prefix):
+        # The pipeline encodes derivatives in parallel; here they run one after another to measure their total cost
+        image = decode_image(path, max(size for size, _ in specs.values()))
+        return [
+            encode_derivative(image, name, size, image_format, f"{output_prefix}_{name}.{FILE_EXTENSIONS[image_format]}")
+            for name, (size, image_format) in specs.items()
+        ]
+
+    summary, _ = bench_files(create_derivatives, corpus["png"], repeats, output_for)
+    return summary
+
+def bench_vectorize(corpus: dict, repeats: int, work_dir: str) -> dict:
+    from utils.vectorizer_utils import vectorize_png_to_svg
+
+    def output_for(path):
+        return os.path.join(work_dir, os.path.basename(path).replace(".png", ".svg"))
+
+    summary, files = bench_files(vectorize_png_to_svg, corpus["png"], repeats, output_for)
+    summary["files"] = [
+        {"file": entry["file"], "svg_bytes": os.path.getsize(entry["output_path"]), "peak_memory_bytes": entry["peak_memory_bytes"]}
+        for entry in files
+    ]
+    return summary
+
+async def _bench_pipeline(requests: int, concurrency: int) -> dict:
+    import httpx
+    from app import app
+    from utils.http_utils import close_http_client
+
+    slots = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+    run_id = int(time.time())
+
+    async def generate(client, index):
+        nonlocal failures
+        async with slots:
+            start = time.perf_counter()
+            response = await client.post("/generate", json={"concept": f"benchmark {run_id} {index}"}, headers={"x-api-key": os.environ["API_KEY"]})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(generate(client, index) for index in range(requests)))
+        wall_time = time.perf_counter() - start
+        timed_latencies, timed_failures = list(latencies), failures
+
+        # Like the other benchmarks, measure memory on an extra untimed run: one full round of concurrent requests
+        tracemalloc.start()
+        try:
+            await asyncio.gather(*(generate(client, index) for index in range(requests, requests + concurrency)))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    await close_http_client()
+
+    summary = summarize(timed_latencies, wall_time)
+    summary["peak_memory_bytes"] = peak
+    summary["concurrency"] = concurrency
+    summary["failures"] = timed_failures
+    return summary
+
+def bench_pipeline(corpus: dict, args) -> dict:
+    fake_app = create_fake_provider_app(corpus["png"], args.chat_latency, args.image_latency, args.convertio_latency)
+    with FakeProviderServer(fake_app, args.port) as server:
+        os.environ["OPENAI_BASE_URL"] = f"{server.url}/v1"
+        os.environ["CONVERTIO_URL"] = f"{server.url}/convert"
+        return asyncio.run(_bench_pipeline(args.requests, args.concurrency))
+
+def configure_environment(args, work_dir: str):
+    """
+    Points the app at the fake providers and keeps its state inside the work directory.
+    Must run before anything from utils or app is imported.
+    """
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "API_KEY": "benchmark",
+        # Admit every concurrent benchmark request, so the pipeline is measured rather than admission control
+        "API_KEYS": f"benchmark:{args.concurrency}",
+        "ADMISSION_MAX_CONCURRENCY": str(args.concurrency),
+        "BASE_URL": "http://bench",
+        "VECTORIZER": args.vectorizer,
+        "CACHE_ENABLED": "false",
+        "CONVERTIO_POLL_INTERVAL": "0.2",
+        "JOB_DB_PATH": os.path.join(work_dir, "jobs.sqlite3"),
+        "RETENTION_DB_PATH": os.path.join(work_dir, "artifacts.sqlite3"),
+    })
+    if not args.rate_limits:
+        os.environ.update({"PROMPT_RATE_LIMIT": "0", "IMAGE_RATE_LIMIT": "0"})
+    # Generated files go under the work directory's tmp/ rather than the repository's
+    os.makedirs(os.path.join(work_dir, "tmp", "static"), exist_ok=True)
+    os.chdir(work_dir)
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Lists the benchmarks whose p50 latency or peak memory, and the corpus files whose G-code
+    size or pen-up travel, grew by more than tolerance.
+    """
+    regressions = []
+    for name, summary in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ["p50_ms", "peak_memory_bytes"]:
+            if metric in summary and previous.get(metric) and summary[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {previous[metric]} -> {summary[metric]}")
+
+    previous_files = {entry["file"]: entry for entry in baseline.get("gcode", {}).get("files", [])}
+    for entry in results.get("gcode", {}).get("files", []):
+        previous = previous_files.get(entry["file"])
+        if not previous:
+            continue
+        for metric in ["gcode_bytes", "travel_after"]:
+            if previous[metric] and entry[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{entry['file']}: {metric} {previous[metric]} -> {entry[metric]}")
+    return regressions
+
+def print_report(results: dict):
+    print(f"\n{'benchmark':<12} {'runs':>5} {'per sec':>9} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>8}")
+    for name, summary in results.items():
+        peak = summary.get("peak_memory_bytes")
+        print(f"{name:<12} {summary['runs']:>5} {summary['throughput']:>9} {summary['p50_ms']:>9} {summary['p99_ms']:>9} {peak / 2 ** 20 if peak else 0:>8.1f}")
+    if "pipeline" in results:
+        pipeline = results["pipeline"]
+        print(f"\n/generate: {pipeline['failures']} of {pipeline['runs']} requests failed, {pipeline['concurrency']} at a time")
+    if "gcode" in results:
+        print(f"\n{'svg file':<14} {'gcode KB':>9} {'paths':>6} {'lines':>7} {'arcs':>6} {'travel before':>14} {'travel after':>13}")
+        for entry in results["gcode"]["files"]:
+            print(f"{entry['file']:<14} {entry['gcode_bytes'] / 1024:>9.1f} {entry['path_count']:>6} {entry['line_count']:>7} {entry['arc_count']:>6} {entry['travel_before']:>14} {entry['travel_after']:>13}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the conversion pipeline.")
+    parser.add_argument("--only", nargs="+", choices=["gcode", "thumbnail", "vectorize", "pipeline"], help="Benchmarks to run (default: all)")
+    parser.add_argument("--work-dir", help="Where the corpus and outputs are written (default: a temporary directory, removed afterwards)")
+    parser.add_argument("--files-per-level", type=int, default=3, help="Corpus files per complexity level")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per file")
+    parser.add_argument("--requests", type=int, default=12, help="/generate requests in the pipeline benchmark")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent /generate requests")
+    parser.add_argument("--vectorizer", default="local", choices=["local", "convertio"], help="Vectorizer used by the pipeline benchmark")
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="Seconds the fake ChatGPT takes per request")
+    parser.add_argument("--image-latency", type=float, default=2.0, help="Seconds the fake DALL-E takes per request")
+    parser.add_argument("--convertio-latency", type=float, default=2.0, help="Seconds a fake Convertio conversion takes")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the fake provider server")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the OpenAI rate limits instead of disabling them")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output while benchmarking")
+    parser.add_argument("--output", help="Write the results as JSON, e.g. to save a baseline")
+    parser.add_argument("--baseline", help="Fail if p50 latency or peak memory regressed against these results")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    if args.work_dir:
+        work_dir = os.path.abspath(args.work_dir)
+    else:
+        work_dir = tempfile.mkdtemp(prefix="gcode-bench-")
+        atexit.register(shutil.rmtree, work_dir, ignore_errors=True)
+    output_path = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    corpus = build_corpus(os.path.join(work_dir, "corpus"), args.files_per_level)
+    outputs_dir = os.path.join(work_dir, "outputs")
+    os.makedirs(outputs_dir, exist_ok=True)
+    configure_environment(args, work_dir)
+
+    selected = args.only or ["gcode", "thumbnail", "vectorize", "pipeline"]
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+        if not args.verbose:
+            logging.disable(logging.CRITICAL)
+        if "gcode" in selected:
+            results["gcode"] = bench_gcode(corpus, args.repeats, outputs_dir)
+        if "thumbnail" in selected:
+            results["thumbnail"] = bench_thumbnail(corpus, args.repeats, outputs_dir)
+        if "vectorize" in selected:
+            results["vectorize"] = bench_vectorize(corpus, args.repeats, outputs_dir)
+        if "pipeline" in selected:
+            results["pipeline"] = bench_pipeline(corpus, args)
+    print_report(results)
+
+    if output_path:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"\nResults written to {output_path}")
+    if baseline_path:
+        with open(baseline_path) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+if __name__ == "__main__":
+    main()
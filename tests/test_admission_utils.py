@@ -0,0 +1,40 @@
+import asyncio
+from utils.admission_utils import AdmissionController
+
+async def cycle_single_slots(controller: AdmissionController, key: str, until: float):
+    loop = asyncio.get_running_loop()
+    while loop.time() < until:
+        async with controller.admit(key):
+            await asyncio.sleep(0.01)
+
+def test_single_slot_requests_do_not_starve_a_queued_batch():
+    async def scenario():
+        controller = AdmissionController(4, 8, 0.5, {"batch": 4, "b": 2, "c": 2})
+        loop = asyncio.get_running_loop()
+        # The clients keep going for longer than the batch may wait
+        until = loop.time() + 1.0
+        clients = [asyncio.ensure_future(cycle_single_slots(controller, key, until)) for key in ("b", "c")]
+        await asyncio.sleep(0)
+        # The clients hold slots, so the batch has to queue for all four
+        admission = await controller.acquire("batch", 4)
+        assert controller.running_per_key == {"batch": 4}
+        admission.release()
+        await asyncio.gather(*clients)
+        assert controller.running == 0
+
+    asyncio.run(scenario())
+
+def test_key_at_its_limit_does_not_hold_up_other_keys():
+    async def scenario():
+        controller = AdmissionController(4, 8, 1.0, {"a": 1, "b": 1})
+        held = await controller.acquire("a")
+        waiting = asyncio.ensure_future(controller.acquire("a"))
+        await asyncio.sleep(0)
+        assert len(controller.waiters) == 1
+        other = await asyncio.wait_for(controller.acquire("b"), 0.1)
+        held.release()
+        (await waiting).release()
+        other.release()
+        assert controller.running == 0
+
+    asyncio.run(scenario())
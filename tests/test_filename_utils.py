@@ -0,0 +1,53 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pytest
+from utils.filename_utils import get_next_filename, get_next_folder_name
+
+# Concurrent callers, and the names each of them claims
+WORKERS = 8
+ALLOCATIONS_PER_WORKER = 25
+
+def claim_folders(directory: str, count: int) -> list:
+    return [get_next_folder_name(directory, "a_dog") for _ in range(count)]
+
+def claim_files(directory: str, count: int) -> list:
+    return [get_next_filename(directory, "generated_image", ".png") for _ in range(count)]
+
+def run_concurrently(executor, claim, directory: str) -> list:
+    futures = [executor.submit(claim, directory, ALLOCATIONS_PER_WORKER) for _ in range(WORKERS)]
+    return [name for future in futures for name in future.result()]
+
+def assert_claimed(names: list, directory: str, base_name: str, extension: str, exists):
+    assert len(names) == WORKERS * ALLOCATIONS_PER_WORKER
+    assert len(set(names)) == len(names)
+    assert all(exists(name) for name in names)
+    # Numbers are handed out without gaps, whichever caller got each one
+    numbers = sorted(int(os.path.basename(name)[len(base_name) + 1:len(os.path.basename(name)) - len(extension)]) for name in names)
+    assert numbers == list(range(1, len(names) + 1))
+    assert all(os.path.dirname(name) == str(directory) for name in names)
+
+@pytest.mark.parametrize("claim, base_name, extension, exists", [
+    (claim_folders, "a_dog", "", os.path.isdir),
+    (claim_files, "generated_image", ".png", os.path.isfile),
+])
+def test_concurrent_threads_claim_unique_names(tmp_path, claim, base_name, extension, exists):
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        names = run_concurrently(executor, claim, str(tmp_path))
+    assert_claimed(names, tmp_path, base_name, extension, exists)
+
+@pytest.mark.parametrize("claim, base_name, extension, exists", [
+    (claim_folders, "a_dog", "", os.path.isdir),
+    (claim_files, "generated_image", ".png", os.path.isfile),
+])
+def test_concurrent_processes_claim_unique_names(tmp_path, claim, base_name, extension, exists):
+    # Worker processes only share the counter file and the directory, not the in-process lock
+    with ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn")) as executor:
+        names = run_concurrently(executor, claim, str(tmp_path))
+    assert_claimed(names, tmp_path, base_name, extension, exists)
+
+def test_counter_is_rebuilt_from_existing_names(tmp_path):
+    for number in (1, 2, 7):
+        (tmp_path / f"a_dog_{number}").mkdir()
+    assert get_next_folder_name(str(tmp_path), "a_dog") == os.path.join(str(tmp_path), "a_dog_8")
+    assert get_next_folder_name(str(tmp_path), "a_dog") == os.path.join(str(tmp_path), "a_dog_9")
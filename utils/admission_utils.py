@@ -0,0 +1,230 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from utils.metrics_utils import increment, observe
+
+# Maximum number of generations running at once across all API keys
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 8))
+
+# Requests allowed to wait for a slot, and how long each may wait before being turned away
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 16))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
+
+# Concurrent generations per API key, unless API_KEYS sets a key's own limit
+API_KEY_CONCURRENCY = int(os.getenv("API_KEY_CONCURRENCY", 2))
+
+# Expected seconds per generation, used for Retry-After until real durations are measured
+ADMISSION_EXPECTED_SECONDS = float(os.getenv("ADMISSION_EXPECTED_SECONDS", 30))
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted; retry_after is the suggested wait in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def load_api_keys() -> dict:
+    """
+    Reads and validates the accepted API keys and their concurrency limits.
+
+    API_KEYS holds comma-separated keys, each optionally followed by ":<limit>", e.g.
+    "demo:1,partner:4"; keys without a limit get API_KEY_CONCURRENCY. The single API_KEY
+    setting is accepted as well. Called once, when the admission controller is created at
+    startup, so a malformed setting stops the server instead of failing every request.
+
+    Returns:
+        dict: Concurrency limit by API key.
+
+    Raises:
+        ValueError: If an API_KEYS entry has no key, or a limit that isn't a positive integer.
+            Entries are identified by position, so the keys themselves aren't logged.
+    """
+    keys = {}
+    for position, entry in enumerate(os.getenv("API_KEYS", "").split(","), start=1):
+        if not entry.strip():
+            continue
+        key, separator, limit = (part.strip() for part in entry.partition(":"))
+        if not key:
+            raise ValueError(f"API_KEYS entry {position} has no key.")
+        if not separator:
+            keys[key] = API_KEY_CONCURRENCY
+            continue
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"API_KEYS entry {position} has an invalid concurrency limit '{limit}'; expected a positive integer.")
+        keys[key] = int(limit)
+    if os.getenv("API_KEY") and os.getenv("API_KEY") not in keys:
+        keys[os.getenv("API_KEY")] = API_KEY_CONCURRENCY
+    return keys
+
+class Admission:
+    """Slots held by an admitted request; release() may be called more than once."""
+
+    def __init__(self, controller, key: str, weight: int = 1):
+        self.controller = controller
+        self.key = key
+        self.weight = weight
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self.key, self.weight, time.monotonic() - self.started)
+
+class AdmissionController:
+    """
+    Admission control in front of the generation pipeline.
+
+    At most max_concurrency generations run at once, and at most key_limits[key] per API
+    key; a request running several generations at once takes one slot for each. Requests
+    beyond that wait in a first-come, first-served queue of queue_size entries for up to
+    queue_timeout seconds; when the queue is full or the wait runs out, they are rejected
+    straight away with a suggested retry delay, so an overload doesn't slow every request
+    down together. Only a request held back by its own key's limit lets later ones overtake it.
+    """
+
+    def __init__(self, max_concurrency: int, queue_size: int, queue_timeout: float, key_limits: dict, default_key_limit: int = API_KEY_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.key_limits = key_limits
+        self.default_key_limit = default_key_limit
+        self.running = 0
+        self.running_per_key = {}
+        self.waiters = deque()
+        self.average_seconds = ADMISSION_EXPECTED_SECONDS
+
+    def key_limit(self, key: str) -> int:
+        """Returns the number of generations an API key may run at once."""
+        return self.key_limits.get(key, self.default_key_limit)
+
+    def _can_run(self, key: str, weight: int = 1) -> bool:
+        return self.running + weight <= self.max_concurrency and self.running_per_key.get(key, 0) + weight <= self.key_limit(key)
+
+    def _over_key_limit(self, key: str, weight: int) -> bool:
+        return self.running_per_key.get(key, 0) + weight > self.key_limit(key)
+
+    def _grant_waiters(self):
+        """
+        Hands free slots to waiters in arrival order. A waiter held back by its own key's
+        limit lets later ones go ahead, but one waiting for free slots stops the others, so
+        single-slot requests can't keep taking the slots a heavier request is waiting for.
+        """
+        for waiter in list(self.waiters):
+            waiter_key, waiter_weight, future = waiter
+            if future.done():
+                self.waiters.remove(waiter)
+            elif self._over_key_limit(waiter_key, waiter_weight):
+                continue
+            elif self.running + waiter_weight > self.max_concurrency:
+                break
+            else:
+                self.waiters.remove(waiter)
+                future.set_result(self._start(waiter_key, waiter_weight))
+
+    def _waiting_for_slots(self) -> bool:
+        return any(not future.done() and not self._over_key_limit(key, weight) for key, weight, future in self.waiters)
+
+    def _start(self, key: str, weight: int = 1) -> Admission:
+        self.running += weight
+        self.running_per_key[key] = self.running_per_key.get(key, 0) + weight
+        return Admission(self, key, weight)
+
+    def _release(self, key: str, weight: int, elapsed: float):
+        self.running -= weight
+        self.running_per_key[key] -= weight
+        if not self.running_per_key[key]:
+            del self.running_per_key[key]
+        self.average_seconds = 0.8 * self.average_seconds + 0.2 * elapsed
+        self._grant_waiters()
+
+    def retry_after(self) -> int:
+        """Estimates the seconds until a slot frees up for a new request."""
+        return max(1, math.ceil(self.average_seconds * (len(self.waiters) + 1) / self.max_concurrency))
+
+    def _reject(self, reason: str, message: str):
+        increment("admission_rejected_total", {"reason": reason})
+        raise AdmissionRejected(message, self.retry_after())
+
+    async def acquire(self, key: str, weight: int = 1) -> Admission:
+        """
+        Waits for slots for a request made with an API key.
+
+        Args:
+            key (str): The API key of the request.
+            weight (int): Generations the request runs at once, at most the key's limit and
+                max_concurrency.
+
+        Returns:
+            Admission: The held slots; release them when the request is done.
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait exceeds the queue timeout.
+            ValueError: If the weight can never be admitted.
+        """
+        if not 1 <= weight <= min(self.max_concurrency, self.key_limit(key)):
+            raise ValueError(f"Can't admit {weight} concurrent generations for this API key.")
+        # Only go ahead of the queue when no waiter is waiting for free slots
+        if self._can_run(key, weight) and not self._waiting_for_slots():
+            observe("admission_wait_seconds", 0.0)
+            return self._start(key, weight)
+        if len(self.waiters) >= self.queue_size:
+            self._reject("queue_full", "The server is busy, please retry later.")
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (key, weight, future)
+        self.waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            admission = await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+                # Waiters behind this one may fit in the slots it was waiting for
+                self._grant_waiters()
+            if not future.done():
+                future.cancel()
+                self._reject("timeout", "Timed out waiting for a free slot, please retry later.")
+            admission = future.result()
+        except asyncio.CancelledError:
+            # The client went away while waiting; give back a slot granted in the meantime
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+                self._grant_waiters()
+            if future.done() and not future.cancelled():
+                future.result().release()
+            else:
+                future.cancel()
+            raise
+        observe("admission_wait_seconds", time.monotonic() - started)
+        return admission
+
+    @asynccontextmanager
+    async def admit(self, key: str, weight: int = 1):
+        """Holds slots for the duration of the block; see acquire."""
+        admission = await self.acquire(key, weight)
+        try:
+            yield admission
+        finally:
+            admission.release()
+
+_controller = None
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Returns the process-wide admission controller, configured from the ADMISSION_* and
+    API key settings. Its key_limits are the accepted API keys.
+
+    Returns:
+        AdmissionController: The shared controller.
+
+    Raises:
+        ValueError: If API_KEYS is malformed; see load_api_keys.
+    """
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(ADMISSION_MAX_CONCURRENCY, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT, load_api_keys())
+    return _controller
@@ -1,10 +1,18 @@
+import logging
 import re
 import os
+import httpx
 from utils.dalle_utils import generate_image_from_dalle
 from utils.converter_utils import convert_png_to_svg
 from utils.svg_to_gcode_utils import svg_to_gcode
 from utils.filename_utils import get_next_folder_name
-import requests
+from utils.http_utils import send_with_retry
+from utils.worker_utils import run_in_worker
+
+logger = logging.getLogger(__name__)
+
+# Largest image accepted when it has to be downloaded from a URL
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", 20 * 1024 * 1024))
 
 def ensure_directory_exists(directory):
     """Ensure that the required directory exists."""
@@ -32,64 +40,92 @@ def sanitize_folder_name(name: str, max_length: int = 20) -> str:
     # Truncate to the specified maximum length
     return name[:max_length]
 
-def download_image(image_url, save_path):
-    """Download an image from the given URL and save it to the specified path."""
-    print("Starting image download...")
+async def download_image(image_url, max_bytes=MAX_IMAGE_BYTES):
+    """Stream an image from the given URL into memory, giving up if it exceeds max_bytes. Returns its bytes, or None on failure."""
+    logger.info("Starting image download...")
     try:
-        img_data = requests.get(image_url).content
-        with open(save_path, "wb") as handler:
-            handler.write(img_data)
-        print(f"Image saved as {save_path}")
-        print("Image download completed.")
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to download the image: {e}")
-        return False
+        chunks, size = [], 0
+        response = await send_with_retry("images", "GET", image_url, stream=True)
+        try:
+            response.raise_for_status()
+            if int(response.headers.get("content-length") or 0) > max_bytes:
+                logger.warning(f"Image is larger than {max_bytes} bytes, not downloading it.")
+                return None
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > max_bytes:
+                    logger.warning(f"Image is larger than {max_bytes} bytes, aborting download.")
+                    return None
+                chunks.append(chunk)
+        finally:
+            await response.aclose()
+        logger.info("Image download completed.")
+        return b"".join(chunks)
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to download the image: {e}")
+        return None
 
-def generate_and_save_image(prompt, base_folder, user_input):
-    """Generate an image using DALL-E and save it to a file within a new directory."""
-    print("Generating image from prompt...")
-    image_url = generate_image_from_dalle(prompt)
-    if not image_url:
-        print("Failed to generate image from DALL-E.")
-        return None, None
+def write_file(path, data):
+    """Write bytes to a file, creating its directory if needed."""
+    if os.path.dirname(path):
+        ensure_directory_exists(os.path.dirname(path))
+    with open(path, "wb") as handler:
+        handler.write(data)
+    return path
+
+def read_file(path):
+    """Read a file's bytes."""
+    with open(path, "rb") as handler:
+        return handler.read()
 
+def create_image_folder(base_folder, user_input):
+    """Create the next numbered folder named after the user's input to hold a generated image."""
     # Sanitize and generate the folder name
     sanitized_name = sanitize_folder_name(user_input)
     folder_name = get_next_folder_name(base_folder, sanitized_name)
     ensure_directory_exists(folder_name)
-    
-    image_filename = os.path.join(folder_name, "generated.png")
-    if download_image(image_url, image_filename):
-        print("Image generation and saving completed.")
-        return folder_name, image_filename
-    return None, None
+    return folder_name
+
+async def generate_image(prompt):
+    """Generate an image using DALL-E and return its PNG data, downloading it only if the API returned a URL."""
+    logger.info("Generating image from prompt...")
+    image = await generate_image_from_dalle(prompt)
+    if not image:
+        logger.error("Failed to generate image from DALL-E.")
+        return None
+    if isinstance(image, str):
+        image = await download_image(image)
+    if image:
+        logger.info("Image generation completed.")
+    return image
 
-def convert_image_to_svg(image_path, output_folder):
-    """Convert a PNG image to SVG format and save it in the same folder."""
-    print("Starting SVG conversion...")
-    svg_path = os.path.join(output_folder, "generated.svg")
-    converted_svg_path = convert_png_to_svg(image_path)
-    if converted_svg_path:
-        os.rename(converted_svg_path, svg_path)
-        print(f"SVG Conversion Successful! Saved as: {svg_path}")
-        print("SVG conversion completed.")
+async def convert_image_to_svg(image, output_folder):
+    """Convert a PNG image, given as a path or its bytes, to SVG format and save it in the output folder."""
+    logger.info("Starting SVG conversion...")
+    svg_path = await convert_png_to_svg(image, os.path.join(output_folder, "generated.svg"))
+    if svg_path:
+        logger.info(f"SVG Conversion Successful! Saved as: {svg_path}")
+        logger.info("SVG conversion completed.")
         return svg_path
     else:
-        print("SVG conversion failed.")
+        logger.error("SVG conversion failed.")
         return None
 
-def convert_svg_to_gcode(svg_path, output_folder):
-    """Convert an SVG file to G-code and save it in the same folder."""
-    print("Starting G-code conversion...")
-    gcode_path = os.path.join(output_folder, "generated.gcode")
-    converted_gcode_path = svg_to_gcode(svg_path)
-    if converted_gcode_path:
-        os.rename(converted_gcode_path, gcode_path)
-        print(f"G-code Conversion Successful! Saved as: {gcode_path}")
-        print("G-code conversion completed.")
-        return gcode_path
+async def convert_svg_to_gcode(svg_path, output_folder, profile=None):
+    """Convert an SVG file to G-code for a machine profile and save it in the same folder, returning its path and conversion stats."""
+    logger.info("Starting G-code conversion...")
+    gcode_path, stats = await run_in_worker(svg_to_gcode, svg_path, os.path.join(output_folder, "generated.gcode"), profile=profile)
+    if gcode_path:
+        logger.info(f"G-code Conversion Successful! Saved as: {gcode_path}")
+        logger.info("G-code conversion completed.")
+        return gcode_path, stats
     else:
-        print("G-code conversion failed.")
-        return None
+        logger.error("G-code conversion failed.")
+        return None, None
 
+def list_generated_files(output_folder):
+    """List the files generated into an output folder, ordered by path, for archiving."""
+    file_paths = []
+    for root, _, files in os.walk(output_folder):
+        file_paths.extend(os.path.join(root, name) for name in files if not name.startswith(".") and not name.endswith(".zip"))
+    return sorted(file_paths)
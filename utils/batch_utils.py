@@ -0,0 +1,63 @@
+import asyncio
+import logging
+import os
+from utils.cache_utils import normalize_concept
+from utils.pipeline_utils import PipelineError, generate_prompt, run_generation_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of generations (concepts times variants) in one batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 20))
+
+async def _run_item(index: int, concept: str, variant: int, prompt_task: asyncio.Task, machine_profile: str, slots: asyncio.Semaphore) -> dict:
+    """Runs one generation of a batch, turning failures into a result instead of raising."""
+    result = {"index": index, "concept": concept, "variant": variant}
+    try:
+        shared = await prompt_task
+        state = {"prompt": shared["prompt"], "cache_hits": list(shared["cache_hits"])}
+        async with slots:
+            result["state"] = await run_generation_pipeline(concept, state=state, machine_profile=machine_profile, variant=variant)
+    except PipelineError as e:
+        result["stage"] = e.stage
+        result["error"] = str(e)
+    except Exception as e:
+        logger.error(f"Batch item {index} failed: {e}")
+        result["error"] = f"An error occurred: {str(e)}"
+    return result
+
+async def iter_batch_results(concepts: list, variants: int = 1, machine_profile: str = None, concurrency: int = None):
+    """
+    Runs the generation pipeline for every concept and variant, up to concurrency of them at
+    a time, yielding each result as soon as it completes. Concepts that normalize to the same
+    text share a single ChatGPT prompt, and the per-stage concurrency and rate limits bound
+    the calls made to each provider.
+
+    Args:
+        concepts (list): The concepts provided by the user.
+        variants (int): Number of images to generate per concept.
+        machine_profile (str, optional): Name of the machine profile to generate G-code for.
+        concurrency (int, optional): Generations run at once, e.g. the admission slots held
+            for the batch. Defaults to all of them.
+
+    Yields:
+        dict: The result of one generation, with its "index" (position in the batch, concept
+        major), "concept" and "variant", and either the pipeline "state" or an "error"
+        (plus the failed "stage" when known).
+    """
+    prompt_tasks = {}
+    tasks = []
+    slots = asyncio.Semaphore(concurrency or len(concepts) * variants)
+    for concept in concepts:
+        key = normalize_concept(concept)
+        if key not in prompt_tasks:
+            prompt_tasks[key] = asyncio.ensure_future(generate_prompt(concept))
+        for variant in range(variants):
+            tasks.append(asyncio.ensure_future(_run_item(len(tasks), concept, variant, prompt_tasks[key], machine_profile, slots)))
+
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # Stop the remaining generations if the client goes away before the batch is done
+        for task in tasks + list(prompt_tasks.values()):
+            task.cancel()
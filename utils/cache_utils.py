@@ -0,0 +1,336 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Directory holding cached prompts, images, SVGs and G-code, keyed by content hash
+CACHE_DIR = os.getenv("CACHE_DIR", "tmp/cache")
+
+# Set to false to always regenerate every stage
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Disk eviction: entries unused for longer than CACHE_MAX_AGE seconds are dropped, and the
+# least recently used entries are dropped while the cache exceeds CACHE_MAX_BYTES
+CACHE_MAX_AGE = float(os.getenv("CACHE_MAX_AGE", 7 * 24 * 3600))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 1024 ** 3))
+
+# In-memory LRU front: total size, and the largest single entry it will hold
+CACHE_MEMORY_BYTES = int(os.getenv("CACHE_MEMORY_BYTES", 64 * 1024 ** 2))
+CACHE_MEMORY_ITEM_BYTES = int(os.getenv("CACHE_MEMORY_ITEM_BYTES", 1024 ** 2))
+
+# Bumped whenever a change to the pipeline makes previously cached results stale
+CACHE_VERSION = 1
+
+# _lock guards the in-memory state and is only held briefly; directory scans and evictions
+# run under _eviction_lock instead, so lookups don't wait for them
+_lock = threading.Lock()
+_eviction_lock = threading.Lock()
+_memory = OrderedDict()
+_memory_bytes = 0
+_disk_bytes = None
+_counters = {}
+
+def normalize_concept(concept: str) -> str:
+    """
+    Normalizes a concept so that trivially different spellings share cache entries.
+
+    Args:
+        concept (str): The concept provided by the user.
+
+    Returns:
+        str: The concept lower-cased with surrounding and repeated whitespace removed.
+    """
+    return " ".join(concept.lower().split())
+
+def cache_key(*parts) -> str:
+    """
+    Builds a cache key from the values that determine a cached result.
+
+    Args:
+        *parts: JSON-serializable values, such as inputs, content hashes and settings.
+
+    Returns:
+        str: The SHA-256 hex digest of the parts.
+    """
+    return hashlib.sha256(json.dumps([CACHE_VERSION, *parts], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def file_digest(file_path: str) -> str:
+    """
+    Hashes the content of a file.
+
+    Args:
+        file_path (str): The file to hash.
+
+    Returns:
+        str: The SHA-256 hex digest of the file's content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def data_digest(data: bytes) -> str:
+    """
+    Hashes in-memory content the same way file_digest hashes a file.
+
+    Args:
+        data (bytes): The content to hash.
+
+    Returns:
+        str: The SHA-256 hex digest of the content.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+def _entry_path(namespace: str, key: str) -> str:
+    return os.path.join(CACHE_DIR, namespace, key[:2], key)
+
+def _count(namespace: str, event: str, amount: int = 1):
+    counters = _counters.setdefault(namespace, {"hits": 0, "misses": 0, "stores": 0, "evictions": 0})
+    counters[event] += amount
+
+def _remember(memory_key: tuple, data: bytes):
+    """Adds an entry to the in-memory LRU, evicting the least recently used ones as needed."""
+    global _memory_bytes
+    if len(data) > CACHE_MEMORY_ITEM_BYTES:
+        return
+    previous = _memory.pop(memory_key, None)
+    if previous is not None:
+        _memory_bytes -= len(previous)
+    _memory[memory_key] = data
+    _memory_bytes += len(data)
+    while _memory_bytes > CACHE_MEMORY_BYTES:
+        _, evicted = _memory.popitem(last=False)
+        _memory_bytes -= len(evicted)
+
+def _forget(memory_key: tuple):
+    global _memory_bytes
+    evicted = _memory.pop(memory_key, None)
+    if evicted is not None:
+        _memory_bytes -= len(evicted)
+
+def _disk_entries() -> list:
+    """Lists (last_used, size, namespace, path) for every entry on disk."""
+    entries = []
+    if not os.path.isdir(CACHE_DIR):
+        return entries
+    for namespace in os.scandir(CACHE_DIR):
+        if not namespace.is_dir():
+            continue
+        for shard in os.scandir(namespace.path):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, namespace.name, entry.path))
+    return entries
+
+def evict_cache() -> int:
+    """
+    Removes cache entries that have expired, then the least recently used ones until the
+    cache fits within CACHE_MAX_BYTES.
+
+    Returns:
+        int: The number of entries removed.
+    """
+    global _disk_bytes
+    with _eviction_lock:
+        entries = sorted(_disk_entries())
+        total = sum(size for _, size, _, _ in entries)
+        expires = time.time() - CACHE_MAX_AGE
+        evicted = []
+        for last_used, size, namespace, path in entries:
+            if last_used >= expires and total <= CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            evicted.append((namespace, os.path.basename(path)))
+            total -= size
+        with _lock:
+            for memory_key in evicted:
+                _forget(memory_key)
+                _count(memory_key[0], "evictions")
+            _disk_bytes = total
+    return len(evicted)
+
+def _disk_usage() -> int:
+    """Returns the bytes held on disk, scanning the cache directory the first time."""
+    global _disk_bytes
+    if _disk_bytes is None:
+        with _eviction_lock:
+            usage = sum(size for _, size, _, _ in _disk_entries())
+            with _lock:
+                if _disk_bytes is None:
+                    _disk_bytes = usage
+    return _disk_bytes
+
+def _store(namespace: str, key: str, write) -> bool:
+    """Writes an entry atomically through write(path), then evicts if the cache is too large."""
+    global _disk_bytes
+    path = _entry_path(namespace, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(temp_path)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.error(f"Failed to write cache entry {namespace}/{key}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    _disk_usage()
+    with _lock:
+        _count(namespace, "stores")
+        _disk_bytes += size
+        over_quota = _disk_bytes > CACHE_MAX_BYTES
+    if over_quota:
+        evict_cache()
+    return True
+
+def _lookup(namespace: str, key: str) -> str:
+    """Returns the path of a live disk entry, refreshing its last-used time, or None."""
+    path = _entry_path(namespace, key)
+    try:
+        if time.time() - os.path.getmtime(path) > CACHE_MAX_AGE:
+            return None
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+def cache_get(namespace: str, key: str) -> bytes:
+    """
+    Looks up a cached value, trying the in-memory LRU before the disk.
+
+    Args:
+        namespace (str): The kind of value, e.g. "prompt" or "gcode".
+        key (str): The cache key.
+
+    Returns:
+        bytes: The cached value, or None on a miss.
+    """
+    if not CACHE_ENABLED:
+        return None
+    memory_key = (namespace, key)
+    with _lock:
+        if memory_key in _memory:
+            _memory.move_to_end(memory_key)
+            _count(namespace, "hits")
+            return _memory[memory_key]
+
+    path = _lookup(namespace, key)
+    data = None
+    if path:
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            data = None
+    with _lock:
+        if data is None:
+            _count(namespace, "misses")
+        else:
+            _count(namespace, "hits")
+            _remember(memory_key, data)
+    return data
+
+def cache_put(namespace: str, key: str, data: bytes):
+    """
+    Stores a value in the cache.
+
+    Args:
+        namespace (str): The kind of value, e.g. "prompt" or "gcode".
+        key (str): The cache key.
+        data (bytes): The value to store.
+    """
+    if not CACHE_ENABLED:
+        return
+
+    def write(path):
+        with open(path, "wb") as file:
+            file.write(data)
+
+    if _store(namespace, key, write):
+        with _lock:
+            _remember((namespace, key), data)
+
+def cache_get_json(namespace: str, key: str):
+    """
+    Looks up a cached JSON value.
+
+    Returns:
+        The decoded value, or None on a miss.
+    """
+    data = cache_get(namespace, key)
+    return json.loads(data) if data is not None else None
+
+def cache_put_json(namespace: str, key: str, value):
+    """Stores a JSON-serializable value in the cache."""
+    cache_put(namespace, key, json.dumps(value).encode("utf-8"))
+
+def cache_get_file(namespace: str, key: str, destination: str) -> bool:
+    """
+    Copies a cached file to a destination path. Files are copied straight from disk,
+    bypassing the in-memory LRU.
+
+    Args:
+        namespace (str): The kind of file, e.g. "image" or "svg".
+        key (str): The cache key.
+        destination (str): Where to write the file.
+
+    Returns:
+        bool: True on a hit, False on a miss.
+    """
+    if not CACHE_ENABLED:
+        return False
+    path = _lookup(namespace, key)
+    copied = False
+    if path:
+        try:
+            shutil.copyfile(path, destination)
+            copied = True
+        except OSError:
+            copied = False
+    with _lock:
+        _count(namespace, "hits" if copied else "misses")
+    return copied
+
+def cache_put_file(namespace: str, key: str, source: str):
+    """
+    Stores a copy of a file in the cache.
+
+    Args:
+        namespace (str): The kind of file, e.g. "image" or "svg".
+        key (str): The cache key.
+        source (str): The file to store.
+    """
+    if CACHE_ENABLED:
+        _store(namespace, key, lambda path: shutil.copyfile(source, path))
+
+def cache_stats() -> dict:
+    """
+    Reports cache usage.
+
+    Returns:
+        dict: Per-namespace hit, miss, store and eviction counters, and the bytes held in
+        memory and on disk.
+    """
+    disk_bytes = _disk_usage()
+    with _lock:
+        return {
+            "enabled": CACHE_ENABLED,
+            "namespaces": {namespace: dict(counters) for namespace, counters in _counters.items()},
+            "memory_entries": len(_memory),
+            "memory_bytes": _memory_bytes,
+            "disk_bytes": disk_bytes,
+        }
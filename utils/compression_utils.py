@@ -1,60 +1,202 @@
-from PIL import Image
+from PIL import Image, ImageDraw
+import asyncio
+import io
+import logging
 import os
+import time
+import numpy as np
+from utils.curve_utils import ARC_CW, ARC_CCW
+from utils.gcode_analyzer_utils import arc_sweeps, parse_gcode
+from utils.metrics_utils import observe
+from utils.worker_utils import run_in_worker
 
-def compress_png_basic(input_path: str, output_path: str = None, quality: int = 50) -> str:
+logger = logging.getLogger(__name__)
+
+# Derivatives made from each generated image, as comma-separated name:size:format entries.
+# Size is the longest side in pixels; "thumbnail" is always made, as the PNG the UI shows first.
+IMAGE_DERIVATIVES = os.getenv("IMAGE_DERIVATIVES", "thumbnail:200:png,thumbnail_webp:200:webp,preview:512:webp,preview_png:512:png")
+
+# Quality of lossy WebP derivatives (0-100)
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", 80))
+
+# Longest side of the rasterized G-code toolpath preview, in pixels
+TOOLPATH_PREVIEW_SIZE = int(os.getenv("TOOLPATH_PREVIEW_SIZE", 512))
+
+FILE_EXTENSIONS = {"PNG": "png", "WEBP": "webp", "JPEG": "jpg"}
+
+def parse_derivative_specs(value: str = IMAGE_DERIVATIVES) -> dict:
+    """
+    Parses derivative specifications.
+
+    Args:
+        value (str): Comma-separated name:size:format entries, e.g. "preview:512:webp".
+
+    Returns:
+        dict: (size, format) by derivative name, always including "thumbnail".
+
+    Raises:
+        ValueError: If an entry is malformed or names an unsupported format.
     """
-    Compress a PNG image by reducing its quality using Pillow.
-    
+    specs = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        name, size, image_format = [part.strip() for part in entry.split(":")]
+        if image_format.upper() not in FILE_EXTENSIONS:
+            raise ValueError(f"Unsupported derivative format '{image_format}'. Supported formats: {', '.join(FILE_EXTENSIONS)}")
+        specs[name] = (int(size), image_format.upper())
+    specs.setdefault("thumbnail", (200, "PNG"))
+    return specs
+
+def decode_image(source, max_size: int) -> Image.Image:
+    """
+    Decodes an image once for all of its derivatives, at the smallest resolution that still
+    covers the largest one: JPEG sources are decoded at reduced scale with Image.draft, and
+    the result is shrunk by the largest whole factor with Image.reduce.
+
     Args:
-        input_path (str): Path to the input PNG image.
-        output_path (str, optional): Path to save the compressed PNG image. If None, it will overwrite the input.
-        quality (int, optional): The quality setting for JPEG conversion (0-100). Default is 85.
-    
+        source (str or bytes): Path to the image, or its content.
+        max_size (int): Longest side of the largest derivative, in pixels.
+
     Returns:
-        str: Path to the compressed PNG file, or None if compression fails.
+        Image.Image: The decoded image, in RGB or RGBA.
+    """
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+        img.draft("RGB", (max_size, max_size))
+        img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+    factor = min(img.width, img.height) // max_size
+    if factor > 1:
+        img = img.reduce(factor)
+    return img
+
+def encode_derivative(image: Image.Image, name: str, size: int, image_format: str, output_path: str) -> dict:
     """
+    Resizes a decoded image to fit within size x size and saves it.
+
+    Args:
+        image (Image.Image): The decoded image from decode_image; it isn't modified.
+        name (str): The derivative name, used to label its timing metric.
+        size (int): Longest side in pixels.
+        image_format (str): "PNG", "WEBP" or "JPEG".
+        output_path (str): Where to save the derivative.
+
+    Returns:
+        dict: The derivative's "path", "width", "height", "bytes" and encoding "seconds".
+    """
+    start = time.perf_counter()
+    derivative = image.copy()
+    derivative.thumbnail((size, size), Image.LANCZOS)
+    if image_format == "WEBP":
+        derivative.save(output_path, "WEBP", quality=WEBP_QUALITY, method=4)
+    elif image_format == "JPEG":
+        derivative.convert("RGB").save(output_path, "JPEG", quality=WEBP_QUALITY, optimize=True)
+    else:
+        derivative.save(output_path, "PNG", optimize=True)
+    elapsed = time.perf_counter() - start
+    observe("image_derivative_duration_seconds", elapsed, {"derivative": name})
+    return {
+        "path": output_path,
+        "width": derivative.width,
+        "height": derivative.height,
+        "bytes": os.path.getsize(output_path),
+        "seconds": round(elapsed, 4),
+    }
+
+async def create_image_derivatives(source, output_folder: str, specs: dict = None) -> dict:
+    """
+    Builds the thumbnail and previews of an image: decodes it once, then resizes and encodes
+    every derivative concurrently in the worker pool.
+
+    Args:
+        source (str or bytes): Path to the image, or its content.
+        output_folder (str): Folder the derivatives are saved in, as <name>.<extension>.
+        specs (dict, optional): (size, format) by name. Defaults to the IMAGE_DERIVATIVES setting.
+
+    Returns:
+        dict: The result of encode_derivative by name, plus the decoding time under
+        "decode_seconds", or None if the image can't be decoded or a derivative fails.
+    """
+    specs = specs or parse_derivative_specs()
     try:
-        # Set output path if not specified
-        if output_path is None:
-            output_path = input_path
-
-        # Open image and convert to RGB (required for JPEG)
-        with Image.open(input_path) as img:
-            # PNG images are compressed differently, quality parameter works well for JPEGs
-            output_file = output_path.replace(".png", "_compressed.jpg")
-            img = img.convert("RGB")
-            img.save(output_file, "JPEG", optimize=True, quality=quality)
-
-        print(f"Compressed image saved at: {output_file}")
-        return output_file
+        start = time.perf_counter()
+        image = await run_in_worker(decode_image, source, max(size for size, _ in specs.values()))
+        decode_seconds = time.perf_counter() - start
+        observe("image_derivative_duration_seconds", decode_seconds, {"derivative": "decode"})
+
+        results = await asyncio.gather(*(
+            run_in_worker(encode_derivative, image, name, size, image_format, os.path.join(output_folder, f"{name}.{FILE_EXTENSIONS[image_format]}"))
+            for name, (size, image_format) in specs.items()
+        ))
+        derivatives = dict(zip(specs, results))
+        derivatives["decode_seconds"] = round(decode_seconds, 4)
+        logger.info(f"Created {len(specs)} image derivatives in {output_folder}")
+        return derivatives
     except Exception as e:
-        print(f"Failed to compress image: {e}")
+        logger.error(f"Failed to create image derivatives: {e}")
         return None
 
-def compress_png_thumbnail(input_path: str, output_path: str = None, max_size: tuple = (200, 200)) -> str:
+def render_toolpath_preview(gcode_path: str, profile: dict, output_path: str, size: int = TOOLPATH_PREVIEW_SIZE) -> str:
     """
-    Create a thumbnail of the PNG image using Pillow.
-    
+    Rasterizes a G-code program as seen from above the machine bed: drawing moves in black
+    and pen-up travel in light grey. Lines are drawn at twice the size and reduced, which
+    smooths them.
+
     Args:
-        input_path (str): Path to the input PNG image.
-        output_path (str, optional): Path to save the thumbnail PNG image. If None, it will overwrite the input.
-        max_size (tuple, optional): Maximum width and height for the thumbnail. Default is (200, 200).
-    
+        gcode_path (str): Path to the G-code file.
+        profile (dict): The machine profile giving the bed size and origin.
+        output_path (str): Where to save the PNG preview.
+        size (int): Longest side of the preview, in pixels.
+
     Returns:
-        str: Path to the thumbnail PNG file, or None if compression fails.
+        str: Path to the preview, or None if rendering fails.
     """
     try:
-        # Set output path if not specified
-        if output_path is None:
-            output_path = input_path.replace(".png", "_thumbnail.png")
+        start = time.perf_counter()
+        with open(gcode_path) as gcode_file:
+            parsed = parse_gcode(gcode_file, profile)
+        moves = parsed["moves"]
+
+        scale_factor = 25.4 if parsed["units"] == "in" else 1.0
+        bed = np.array([profile["bed_width"], profile["bed_height"]]) / scale_factor
+        origin = -bed / 2 if profile["origin"] == "center" else np.zeros(2)
+        pixels = 2 * size / bed.max()
+        width, height = int(np.ceil(bed[0] * pixels)), int(np.ceil(bed[1] * pixels))
+
+        # Sample arcs at roughly one point per pixel of length
+        arcs = np.flatnonzero((moves[:, 6] == ARC_CW) | (moves[:, 6] == ARC_CCW))
+        arc_points = {}
+        if len(arcs):
+            radii, start_angles, sweeps = arc_sweeps(moves[arcs, 0:2], moves[arcs, 2:4], moves[arcs, 4:6], moves[arcs, 6])
+            for index, radius, start_angle, sweep in zip(arcs.tolist(), radii, start_angles, sweeps):
+                count = max(2, int(np.ceil(abs(sweep) * radius * pixels / 2)))
+                angles = start_angle + sweep * np.linspace(0.0, 1.0, count)
+                arc_points[index] = moves[index, 4:6] + radius * np.column_stack([np.cos(angles), np.sin(angles)])
+
+        # Join consecutive moves into polylines so each stroke is drawn in one call
+        polylines, current, current_draws = [], None, None
+        for index, move in enumerate(moves):
+            segment = arc_points[index] if index in arc_points else move[0:4].reshape(2, 2)
+            draws = bool(move[8])
+            if current is not None and draws == current_draws:
+                current.append(segment[1:])
+            else:
+                if current is not None:
+                    polylines.append((current_draws, np.vstack(current)))
+                current, current_draws = [segment], draws
+        if current is not None:
+            polylines.append((current_draws, np.vstack(current)))
 
-        # Open image and create a thumbnail
-        with Image.open(input_path) as img:
-            img.thumbnail(max_size)  # Removed Image.ANTIALIAS as it is no longer needed.
-            img.save(output_path, "PNG", optimize=True)
+        preview = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(preview)
+        for draws, polyline in polylines:
+            pixel_points = np.column_stack([(polyline[:, 0] - origin[0]) * pixels, height - (polyline[:, 1] - origin[1]) * pixels])
+            draw.line([tuple(point) for point in pixel_points.tolist()], fill=0 if draws else 200, width=2 if draws else 1)
+        preview = preview.reduce(2)
+        preview.save(output_path, "PNG")
 
-        print(f"Thumbnail saved at: {output_path}")
+        observe("image_derivative_duration_seconds", time.perf_counter() - start, {"derivative": "toolpath_preview"})
+        logger.info(f"Toolpath preview saved at: {output_path}")
         return output_path
     except Exception as e:
-        print(f"Failed to create thumbnail: {e}")
+        logger.error(f"Failed to render toolpath preview: {e}")
         return None
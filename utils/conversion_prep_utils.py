@@ -1,34 +1,208 @@
-from PIL import Image, ImageOps
-import requests
-from io import BytesIO
+import os
+from PIL import Image
+import numpy as np
+from scipy import ndimage
 
-def preprocess_image_to_black_and_white(image_url: str) -> Image:
+# Thresholding: "otsu", "adaptive", or a fixed grey level at or below which pixels count as ink
+PREPROCESS_THRESHOLD = os.getenv("PREPROCESS_THRESHOLD", os.getenv("VECTORIZER_THRESHOLD", "otsu"))
+
+# Adaptive thresholding: window size in pixels, and how much darker than the local mean ink must be
+PREPROCESS_BLOCK_SIZE = int(os.getenv("PREPROCESS_BLOCK_SIZE", 51))
+PREPROCESS_OFFSET = float(os.getenv("PREPROCESS_OFFSET", 10))
+
+# Morphological opening (removes hairline noise) and closing (bridges small gaps), as disk radii in pixels
+PREPROCESS_OPEN_RADIUS = int(os.getenv("PREPROCESS_OPEN_RADIUS", 0))
+PREPROCESS_CLOSE_RADIUS = int(os.getenv("PREPROCESS_CLOSE_RADIUS", 1))
+
+# Ink specks and background holes up to these areas in pixels are removed and filled
+PREPROCESS_MIN_SPECK_AREA = int(os.getenv("PREPROCESS_MIN_SPECK_AREA", 16))
+PREPROCESS_MAX_HOLE_AREA = int(os.getenv("PREPROCESS_MAX_HOLE_AREA", 16))
+
+# Thin strokes to one-pixel centerlines, so each line is drawn once instead of outlined
+PREPROCESS_THIN = os.getenv("PREPROCESS_THIN", "false").lower() in ("1", "true", "yes")
+
+_EIGHT_CONNECTED = np.ones((3, 3), dtype=bool)
+
+def to_grayscale(img: Image) -> np.ndarray:
     """
-    Downloads an image from the provided URL and converts it to a pure black and white format,
-    biased towards black.
-    
+    Converts an image to an array of grey levels, treating transparent pixels as white.
+
     Args:
-        image_url (str): The URL of the image to be processed.
-        
+        img (Image): The PIL Image to convert.
+
+    Returns:
+        np.ndarray: (height, width) uint8 array.
+    """
+    if img.mode in ("RGBA", "LA", "P"):
+        # Composite transparent pixels onto white so they are treated as background
+        background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, img.convert("RGBA"))
+    return np.asarray(img.convert("L"))
+
+def otsu_threshold(grayscale: np.ndarray) -> int:
+    """
+    Picks the grey level that best separates ink from background (Otsu's method).
+
+    Args:
+        grayscale (np.ndarray): uint8 grey levels.
+
     Returns:
-        Image: The processed PIL Image object.
-    """
-    try:
-        # Download the image from the URL
-        response = requests.get(image_url)
-        response.raise_for_status()  # Ensure the request was successful
-        
-        # Open the image
-        img = Image.open(BytesIO(response.content))
-        
-        # Convert to grayscale
-        grayscale_img = img.convert("L")
-        
-        # Apply a lower threshold to bias towards black
-        threshold = 100  # Lowering the threshold makes more pixels turn black
-        bw_img = grayscale_img.point(lambda x: 255 if x > threshold else 0, '1')
-        
-        return bw_img
-    except Exception as e:
-        print(f"Error processing image to black and white: {e}")
-        return None
+        int: The threshold; grey levels at or below it are ink.
+    """
+    histogram = np.bincount(grayscale.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight = np.cumsum(histogram)
+    mass = np.cumsum(histogram * levels)
+    total_weight, total_mass = weight[-1], mass[-1]
+    background_weight = total_weight - weight
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_ink = mass / weight
+        mean_background = (total_mass - mass) / background_weight
+        variance = weight * background_weight * (mean_ink - mean_background) ** 2
+    return int(np.argmax(np.nan_to_num(variance[:-1])))
+
+def adaptive_threshold(grayscale: np.ndarray, block_size: int = PREPROCESS_BLOCK_SIZE, offset: float = PREPROCESS_OFFSET) -> np.ndarray:
+    """
+    Marks pixels noticeably darker than their surroundings as ink, which copes with uneven
+    shading and grey backgrounds.
+
+    Args:
+        grayscale (np.ndarray): uint8 grey levels.
+        block_size (int): Side of the square window the local mean is taken over.
+        offset (float): How much darker than the local mean a pixel must be to count as ink.
+
+    Returns:
+        np.ndarray: Boolean ink mask.
+    """
+    local_mean = ndimage.uniform_filter(grayscale.astype(np.float32), size=block_size, mode="nearest")
+    return grayscale < local_mean - offset
+
+def _disk(radius: int) -> np.ndarray:
+    y, x = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+    return x * x + y * y <= radius * radius
+
+def open_and_close(mask: np.ndarray, open_radius: int = PREPROCESS_OPEN_RADIUS, close_radius: int = PREPROCESS_CLOSE_RADIUS) -> np.ndarray:
+    """
+    Applies a morphological opening then closing with disk-shaped structuring elements.
+
+    Args:
+        mask (np.ndarray): Boolean ink mask.
+        open_radius (int): Opening radius in pixels; 0 skips it.
+        close_radius (int): Closing radius in pixels; 0 skips it.
+
+    Returns:
+        np.ndarray: The filtered mask.
+    """
+    if open_radius > 0:
+        mask = ndimage.binary_opening(mask, structure=_disk(open_radius))
+    if close_radius > 0:
+        # Pad so that the erosion step doesn't eat ink touching the border
+        padded = np.pad(mask, close_radius)
+        closed = ndimage.binary_closing(padded, structure=_disk(close_radius))
+        mask = closed[close_radius:-close_radius, close_radius:-close_radius]
+    return mask
+
+def remove_specks(mask: np.ndarray, min_area: int = PREPROCESS_MIN_SPECK_AREA, max_hole_area: int = PREPROCESS_MAX_HOLE_AREA) -> np.ndarray:
+    """
+    Removes small ink specks and fills small holes in the ink, by connected-component area.
+
+    Args:
+        mask (np.ndarray): Boolean ink mask.
+        min_area (int): Ink components smaller than this many pixels are removed.
+        max_hole_area (int): Enclosed background components up to this many pixels are filled.
+
+    Returns:
+        np.ndarray: The cleaned mask.
+    """
+    if min_area > 1:
+        labels, _ = ndimage.label(mask, structure=_EIGHT_CONNECTED)
+        keep = np.bincount(labels.ravel()) >= min_area
+        keep[0] = False
+        mask = keep[labels]
+    if max_hole_area > 0:
+        # Background is 4-connected where ink is 8-connected; components touching the border aren't holes
+        labels, _ = ndimage.label(~mask)
+        fill = np.bincount(labels.ravel()) <= max_hole_area
+        fill[0] = False
+        fill[np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]])] = False
+        mask = mask | fill[labels]
+    return mask
+
+def _thinning_tables() -> tuple:
+    """
+    Builds Zhang-Suen deletion tables indexed by the 8-neighbourhood code, where bit i is
+    set when neighbour P(i + 2) is ink, going clockwise from north (P2) to north-west (P9).
+    """
+    codes = np.arange(256)
+    neighbours = (codes[:, None] >> np.arange(8)) & 1
+    p2, p3, p4, p5, p6, p7, p8, p9 = neighbours.T
+    count = neighbours.sum(axis=1)
+    transitions = ((neighbours == 0) & (np.roll(neighbours, -1, axis=1) == 1)).sum(axis=1)
+    base = (count >= 2) & (count <= 6) & (transitions == 1)
+    first = base & (p2 * p4 * p6 == 0) & (p4 * p6 * p8 == 0)
+    second = base & (p2 * p4 * p8 == 0) & (p2 * p6 * p8 == 0)
+    return first, second
+
+_THINNING_TABLES = _thinning_tables()
+
+def thin(mask: np.ndarray) -> np.ndarray:
+    """
+    Thins ink to one-pixel-wide, 8-connected centerlines (Zhang-Suen), fully vectorized:
+    each sub-iteration computes every pixel's neighbourhood code at once and looks up
+    whether it may be deleted.
+
+    Args:
+        mask (np.ndarray): Boolean ink mask.
+
+    Returns:
+        np.ndarray: The skeleton as a boolean mask.
+    """
+    skeleton = np.pad(mask, 1).astype(np.uint8)
+    height, width = skeleton.shape
+    # (row, column) offsets of P2..P9
+    offsets = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+    changed = True
+    while changed:
+        changed = False
+        for table in _THINNING_TABLES:
+            code = np.zeros((height - 2, width - 2), dtype=np.uint8)
+            for bit, (dy, dx) in enumerate(offsets):
+                code |= skeleton[1 + dy:height - 1 + dy, 1 + dx:width - 1 + dx] << bit
+            interior = skeleton[1:-1, 1:-1]
+            delete = (interior == 1) & table[code]
+            if delete.any():
+                interior[delete] = 0
+                changed = True
+    return skeleton[1:-1, 1:-1].astype(bool)
+
+def preprocess_image(img: Image, threshold=PREPROCESS_THRESHOLD, open_radius: int = PREPROCESS_OPEN_RADIUS, close_radius: int = PREPROCESS_CLOSE_RADIUS,
+                     min_speck_area: int = PREPROCESS_MIN_SPECK_AREA, max_hole_area: int = PREPROCESS_MAX_HOLE_AREA, thinning: bool = PREPROCESS_THIN) -> np.ndarray:
+    """
+    Turns an in-memory image into a clean ink mask ready for vectorization: thresholding,
+    morphological opening and closing, speck removal and hole filling, then optional thinning.
+
+    Args:
+        img (Image): The PIL Image to preprocess.
+        threshold (str or int): "otsu", "adaptive", or a fixed grey level.
+        open_radius (int): Opening radius in pixels.
+        close_radius (int): Closing radius in pixels.
+        min_speck_area (int): Smallest ink component kept, in pixels.
+        max_hole_area (int): Largest hole filled, in pixels.
+        thinning (bool): Whether to thin strokes to one-pixel centerlines.
+
+    Returns:
+        np.ndarray: (height, width) boolean array, True where the image is ink.
+    """
+    grayscale = to_grayscale(img)
+    if threshold == "adaptive":
+        mask = adaptive_threshold(grayscale)
+    elif threshold == "otsu":
+        mask = grayscale <= otsu_threshold(grayscale)
+    else:
+        mask = grayscale <= int(threshold)
+
+    mask = open_and_close(mask, open_radius, close_radius)
+    mask = remove_specks(mask, min_speck_area, max_hole_area)
+    if thinning:
+        mask = thin(mask)
+    return mask
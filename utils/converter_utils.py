@@ -1,31 +1,93 @@
-import requests
+import asyncio
+import httpx
+import logging
 import os
-from dotenv import load_dotenv
 import time
+from dotenv import load_dotenv
+from utils.http_utils import send_with_retry
+from utils.vectorizer_utils import vectorize_png_to_svg
+from utils.worker_utils import run_in_worker
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-def convert_png_to_svg(file_path: str) -> str:
+# Vectorizer used for PNG to SVG conversion: "local" (in-process tracer) or "convertio"
+VECTORIZER = os.getenv("VECTORIZER", "local")
+
+# Longest time to wait for a Convertio conversion, and the initial and longest intervals between status checks
+CONVERTIO_MAX_WAIT = float(os.getenv("CONVERTIO_MAX_WAIT", 120))
+CONVERTIO_POLL_INTERVAL = float(os.getenv("CONVERTIO_POLL_INTERVAL", 2))
+CONVERTIO_MAX_POLL_INTERVAL = 10
+
+def _image_name(image) -> str:
+    """Returns the file name of an image given as a path, or a generic name for image bytes."""
+    return "generated.png" if isinstance(image, bytes) else os.path.basename(image)
+
+def _default_svg_path(image) -> str:
+    """Returns the shared location SVGs are written to when no output path is given."""
+    base_name = os.path.splitext(_image_name(image))[0]
+    return os.path.join("tmp/static/converted", f"{base_name}.svg")
+
+def _read_image(path: str) -> bytes:
+    """Reads the PNG to upload."""
+    with open(path, "rb") as file_data:
+        return file_data.read()
+
+def _save_svg(path: str, content: bytes) -> str:
+    """Writes a downloaded SVG, creating its directory if needed."""
+    save_directory = os.path.dirname(path)
+    if save_directory:
+        os.makedirs(save_directory, exist_ok=True)
+    with open(path, "wb") as svg_file:
+        svg_file.write(content)
+    return path
+
+async def convert_png_to_svg(image, output_path: str = None) -> str:
+    """
+    Converts a PNG file to SVG with the vectorizer selected by the VECTORIZER setting.
+
+    Args:
+        image (str or bytes): The path to the PNG file to convert, or its content.
+        output_path (str, optional): Where to write the SVG. Defaults to tmp/static/converted,
+            which is shared between requests, so concurrent callers should always pass one.
+
+    Returns:
+        str: The local file path of the converted SVG file, or None if the conversion failed.
+    """
+    output_path = output_path or _default_svg_path(image)
+    if VECTORIZER == "convertio":
+        return await convert_png_to_svg_convertio(image, output_path)
+    if VECTORIZER != "local":
+        logger.warning(f"Unknown vectorizer '{VECTORIZER}', expected 'local' or 'convertio'.")
+        return None
+
+    return await run_in_worker(vectorize_png_to_svg, image, output_path)
+
+async def convert_png_to_svg_convertio(image, output_path: str = None) -> str:
     """
     Converts a PNG file to SVG using the Convertio API.
 
     Args:
-        file_path (str): The path to the PNG file to convert.
+        image (str or bytes): The path to the PNG file to convert, or its content.
+        output_path (str, optional): Where to write the SVG. Defaults to tmp/static/converted.
 
     Returns:
         str: The local file path of the converted SVG file, or None if the conversion failed.
     """
     try:
-        # Get the base name for the upload
-        file_name = os.path.basename(file_path)
-        base_name = os.path.splitext(file_name)[0]  # Remove extension
+        # Get the file name for the upload
+        file_name = _image_name(image)
+        svg_file_path = output_path or _default_svg_path(image)
         api_key = os.getenv("CONVERTIO_API_KEY")
         url = os.getenv("CONVERTIO_URL")
 
-        # Step 1: Initiate the conversion request (correctly formatted as JSON)
-        response = requests.post(
-            url,
+        # Step 1: Initiate the conversion request (correctly formatted as JSON).
+        # Not retried, since a repeated request would start a second conversion
+        response = await send_with_retry(
+            "convertio", "POST", url,
+            retries=0,
             json={  # Use json parameter instead of data
                 "apikey": api_key,
                 "input": "upload",
@@ -34,7 +96,7 @@ def convert_png_to_svg(file_path: str) -> str:
         )
 
         # Print the response for debugging
-        print("Initial Response:", response.text)
+        logger.debug(f"Initial Response: {response.text}")
 
         # Check if the request was successful
         if response.status_code == 200 and response.json().get("status") == "ok":
@@ -42,58 +104,59 @@ def convert_png_to_svg(file_path: str) -> str:
             upload_url = f"{url}/{conversion_id}/{file_name}"
             
             # Step 2: Upload the file
-            with open(file_path, "rb") as file_data:
-                upload_response = requests.put(
-                    upload_url, 
-                    data=file_data,
-                    headers={"Content-Type": "application/octet-stream"}
-                )
+            if not isinstance(image, bytes):
+                image = await run_in_worker(_read_image, image)
+            upload_response = await send_with_retry(
+                "convertio", "PUT", upload_url,
+                content=image,
+                headers={"Content-Type": "application/octet-stream"}
+            )
 
             # Print the upload response for debugging
-            print("Upload Response:", upload_response.text)
+            logger.debug(f"Upload Response: {upload_response.text}")
 
             if upload_response.status_code != 200:
-                print("Failed to upload file for conversion.")
+                logger.error("Failed to upload file for conversion.")
                 return None
 
-            # Step 3: Check conversion status
+            # Step 3: Check conversion status, backing off between checks, until CONVERTIO_MAX_WAIT runs out
             status_url = f"{url}/{conversion_id}/status"
+            deadline = time.monotonic() + CONVERTIO_MAX_WAIT
+            poll_interval = CONVERTIO_POLL_INTERVAL
             while True:
-                status_response = requests.get(status_url)
-                print("Status Response:", status_response.text)  # Debugging
+                status_response = await send_with_retry("convertio", "GET", status_url)
+                logger.debug(f"Status Response: {status_response.text}")
                 if status_response.status_code == 200:
                     status_data = status_response.json()["data"]
                     if status_data["step"] == "finish" and "output" in status_data:
                         svg_url = status_data["output"]["url"]
 
                         # Step 4: Download the SVG file and save locally
-                        save_directory = "tmp/static/converted"
-                        if not os.path.exists(save_directory):
-                            os.makedirs(save_directory)
-
-                        # Define the path for the saved SVG
-                        svg_file_path = os.path.join(save_directory, f"{base_name}.svg")
+                        svg_response = await send_with_retry("convertio", "GET", svg_url)
+                        if svg_response.status_code != 200:
+                            logger.error("Failed to download the converted SVG.")
+                            return None
+                        await run_in_worker(_save_svg, svg_file_path, svg_response.content)
                         
-                        # Download the SVG
-                        svg_data = requests.get(svg_url).content
-                        with open(svg_file_path, "wb") as svg_file:
-                            svg_file.write(svg_data)
-                        
-                        print(f"SVG saved locally as {svg_file_path}")
+                        logger.info(f"SVG saved locally as {svg_file_path}")
                         return svg_file_path
                     elif status_data["step"] in ["error", "failed"]:
-                        print("Conversion failed.")
+                        logger.error("Conversion failed.")
+                        return None
+                    elif time.monotonic() + poll_interval > deadline:
+                        logger.warning(f"Conversion did not finish within {CONVERTIO_MAX_WAIT:.0f} seconds.")
                         return None
                     else:
-                        # Still converting, wait a few seconds
-                        time.sleep(3)
+                        # Still converting, wait a little longer each time
+                        await asyncio.sleep(poll_interval)
+                        poll_interval = min(poll_interval * 1.5, CONVERTIO_MAX_POLL_INTERVAL)
                 else:
-                    print("Failed to check conversion status.")
+                    logger.error("Failed to check conversion status.")
                     return None
         else:
-            print(f"Failed to initiate conversion: {response.json().get('error')}")
+            logger.error(f"Failed to initiate conversion: {response.json().get('error')}")
             return None
 
-    except requests.RequestException as e:
-        print(f"An error occurred during conversion: {e}")
+    except (httpx.HTTPError, OSError, ValueError, KeyError) as e:
+        logger.error(f"An error occurred during conversion: {e}")
         return None
@@ -0,0 +1,179 @@
+from math import comb
+import numpy as np
+
+# Motion codes used for toolpath segments, matching the G-code commands that draw them
+LINE, ARC_CW, ARC_CCW = 1, 2, 3
+
+def _bernstein_points(control_points: np.ndarray, count: int) -> np.ndarray:
+    """Evaluates a Bezier curve at count + 1 evenly spaced parameters, endpoints included."""
+    degree = len(control_points) - 1
+    t = np.linspace(0.0, 1.0, count + 1)[:, None]
+    basis = np.hstack([comb(degree, i) * t ** i * (1 - t) ** (degree - i) for i in range(degree + 1)])
+    return basis @ control_points
+
+def flatten_bezier(control_points, tolerance: float) -> np.ndarray:
+    """
+    Samples a quadratic or cubic Bezier curve finely enough that the polyline through the
+    samples stays within the tolerance of the curve.
+
+    The sample count comes from Wang's formula, which bounds the flattening error from the
+    second differences of the control points, so it adapts to how sharply the curve bends.
+
+    Args:
+        control_points: (3, 2) or (4, 2) control points, start and end included.
+        tolerance (float): Maximum distance between the curve and the polyline.
+
+    Returns:
+        np.ndarray: (n, 2) sample points, starting and ending at the curve's endpoints.
+    """
+    control_points = np.asarray(control_points, dtype=float)
+    degree = len(control_points) - 1
+    second_differences = control_points[2:] - 2 * control_points[1:-1] + control_points[:-2]
+    bend = np.hypot(*second_differences.T).max()
+    count = int(np.ceil(np.sqrt(degree * (degree - 1) / 8 * bend / max(tolerance, 1e-9))))
+    return _bernstein_points(control_points, max(count, 1))
+
+def flatten_elliptical_arc(center, radii, rotation: float, start_angle: float, sweep: float, tolerance: float) -> np.ndarray:
+    """
+    Samples an elliptical arc finely enough that the polyline through the samples stays
+    within the tolerance of the arc.
+
+    Args:
+        center: (x, y) centre of the ellipse.
+        radii: (rx, ry) radii of the ellipse.
+        rotation (float): Rotation of the ellipse's x axis, in radians.
+        start_angle (float): Parametric start angle, in radians.
+        sweep (float): Signed parametric sweep, in radians.
+        tolerance (float): Maximum distance between the arc and the polyline.
+
+    Returns:
+        np.ndarray: (n, 2) sample points, starting and ending at the arc's endpoints.
+    """
+    rx, ry = abs(radii[0]), abs(radii[1])
+    radius = max(rx, ry, 1e-9)
+    # Largest angular step whose chord sagitta stays within the tolerance
+    step = 2 * np.arccos(max(0.0, 1 - tolerance / radius)) if tolerance < radius else np.pi / 2
+    count = max(1, int(np.ceil(abs(sweep) / max(step, 1e-6))))
+    angles = start_angle + sweep * np.linspace(0.0, 1.0, count + 1)
+    cos_r, sin_r = np.cos(rotation), np.sin(rotation)
+    x, y = rx * np.cos(angles), ry * np.sin(angles)
+    return np.column_stack([center[0] + cos_r * x - sin_r * y, center[1] + sin_r * x + cos_r * y])
+
+def arc_endpoint_to_center(start, end, radii, rotation: float, large_arc: bool, sweep: bool) -> tuple:
+    """
+    Converts an SVG elliptical arc from endpoint to centre parameterization (SVG 1.1, F.6.5),
+    enlarging radii that are too small to span the endpoints.
+
+    Args:
+        start: (x, y) start point.
+        end: (x, y) end point.
+        radii: (rx, ry) radii of the ellipse.
+        rotation (float): Rotation of the ellipse's x axis, in radians.
+        large_arc (bool): The large-arc flag.
+        sweep (bool): The sweep flag; true for positive-angle direction.
+
+    Returns:
+        tuple: (center, (rx, ry), start_angle, sweep_angle), angles in radians.
+    """
+    rx, ry = abs(radii[0]), abs(radii[1])
+    cos_r, sin_r = np.cos(rotation), np.sin(rotation)
+    dx, dy = (start[0] - end[0]) / 2, (start[1] - end[1]) / 2
+    x1, y1 = cos_r * dx + sin_r * dy, -sin_r * dx + cos_r * dy
+
+    scale = (x1 / rx) ** 2 + (y1 / ry) ** 2
+    if scale > 1:
+        rx, ry = rx * np.sqrt(scale), ry * np.sqrt(scale)
+    numerator = max(0.0, (rx * ry) ** 2 - (rx * y1) ** 2 - (ry * x1) ** 2)
+    factor = np.sqrt(numerator / ((rx * y1) ** 2 + (ry * x1) ** 2))
+    if large_arc == sweep:
+        factor = -factor
+    cx1, cy1 = factor * rx * y1 / ry, -factor * ry * x1 / rx
+    center = np.array([cos_r * cx1 - sin_r * cy1 + (start[0] + end[0]) / 2, sin_r * cx1 + cos_r * cy1 + (start[1] + end[1]) / 2])
+
+    start_angle = np.arctan2((y1 - cy1) / ry, (x1 - cx1) / rx)
+    end_angle = np.arctan2((-y1 - cy1) / ry, (-x1 - cx1) / rx)
+    sweep_angle = (end_angle - start_angle) % (2 * np.pi)
+    if not sweep and sweep_angle > 0:
+        sweep_angle -= 2 * np.pi
+    return center, (rx, ry), start_angle, sweep_angle
+
+def _circumcircle(a, b, c):
+    """Returns the centre of the circle through three points, or None if they are collinear."""
+    d = 2 * (a[0] * (b[1] - c[1]) + b[0] * (c[1] - a[1]) + c[0] * (a[1] - b[1]))
+    if abs(d) < 1e-12:
+        return None
+    a2, b2, c2 = a @ a, b @ b, c @ c
+    return np.array([
+        (a2 * (b[1] - c[1]) + b2 * (c[1] - a[1]) + c2 * (a[1] - b[1])) / d,
+        (a2 * (c[0] - b[0]) + b2 * (a[0] - c[0]) + c2 * (b[0] - a[0])) / d,
+    ])
+
+def _fits_chord(points: np.ndarray, tolerance: float) -> bool:
+    """Checks whether all points lie within the tolerance of the chord between the first and last."""
+    chord = points[-1] - points[0]
+    length = np.hypot(*chord)
+    relative = points - points[0]
+    if length < 1e-12:
+        return np.hypot(*relative.T).max() <= tolerance
+    return np.abs(relative[:, 0] * chord[1] - relative[:, 1] * chord[0]).max() / length <= tolerance
+
+def _fit_circle(points: np.ndarray, tolerance: float):
+    """
+    Tries to describe the points as one circular arc.
+
+    Returns:
+        tuple: (center, motion) if every point lies within the tolerance of the circle through
+        the first, middle and last points and the points run around it in one direction,
+        otherwise None.
+    """
+    center = _circumcircle(points[0], points[len(points) // 2], points[-1])
+    if center is None:
+        return None
+    offsets = points - center
+    radii = np.hypot(*offsets.T)
+    if np.abs(radii - radii[0]).max() > tolerance:
+        return None
+    turns = offsets[:-1, 0] * offsets[1:, 1] - offsets[:-1, 1] * offsets[1:, 0]
+    if np.all(turns > 0):
+        return center, ARC_CCW
+    if np.all(turns < 0):
+        return center, ARC_CW
+    return None
+
+def fit_arcs(points: np.ndarray, tolerance: float) -> tuple:
+    """
+    Replaces a sampled curve with as few lines and circular arcs as fit within the tolerance.
+
+    Runs of samples are tried as a single straight line, then as a single arc, and are split
+    in half until one of them fits; two samples always fit a line.
+
+    Args:
+        points (np.ndarray): (n, 2) samples along the curve.
+        tolerance (float): Maximum distance between the samples and the fitted geometry.
+
+    Returns:
+        tuple: (vertices, segments). vertices is a (k + 1, 2) array of segment endpoints and
+        segments a (k, 3) array holding, per segment, the arc centre (x, y) and the motion
+        code (LINE, ARC_CW or ARC_CCW). Line segments have a zero centre.
+    """
+    points = np.asarray(points, dtype=float)
+    vertices, segments = [points[0]], []
+    pending = [(0, len(points) - 1)]
+    while pending:
+        start, end = pending.pop()
+        run = points[start:end + 1]
+        if end - start < 2 or _fits_chord(run, tolerance):
+            vertices.append(points[end])
+            segments.append((0.0, 0.0, LINE))
+            continue
+        fitted = _fit_circle(run, tolerance)
+        if fitted is not None:
+            center, motion = fitted
+            vertices.append(points[end])
+            segments.append((center[0], center[1], motion))
+            continue
+        middle = (start + end) // 2
+        # Stack is last-in first-out, so push the second half first
+        pending.append((middle, end))
+        pending.append((start, middle))
+    return np.array(vertices), np.array(segments, dtype=float).reshape(-1, 3)
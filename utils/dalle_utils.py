@@ -1,40 +1,72 @@
-from openai import OpenAI
+import base64
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError
 from dotenv import load_dotenv
+import logging
 import os
+import time
+from utils.http_utils import OPENAI_MAX_RETRIES, OPENAI_TIMEOUT, get_circuit_breaker
+from utils.metrics_utils import record_provider_call
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Initialize the OpenAI client with the API key and organization
-client = OpenAI(
+client = AsyncOpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),
-    organization=os.getenv("OPENAI_ORGANIZATION")
+    organization=os.getenv("OPENAI_ORGANIZATION"),
+    timeout=OPENAI_TIMEOUT,
+    max_retries=OPENAI_MAX_RETRIES
 )
 
-def generate_image_from_dalle(prompt: str):
+# Image generation parameters
+IMAGE_MODEL = "dall-e-3"
+IMAGE_QUALITY = "standard"
+
+async def generate_image_from_dalle(prompt: str):
     """
-    Generates an image URL using DALL-E based on the provided prompt.
-    
+    Generates an image using DALL-E based on the provided prompt.
+
+    The image is requested inline as base64, which saves a second HTTP round trip to
+    download it.
+
     Args:
         prompt (str): The detailed description for the image.
         
     Returns:
-        str: URL of the generated image.
+        bytes or str: The PNG data of the generated image, or its URL if the API returned
+        one instead of inline data. None if generation failed.
     """
+    breaker = get_circuit_breaker("openai")
+    start = time.perf_counter()
     try:
+        breaker.check()
         # Truncate the prompt to 1000 characters if it exceeds the limit
         if len(prompt) > 800:
             prompt = prompt[:800]
         
-        response = client.images.generate(
+        response = await client.images.generate(
             prompt= 'make me a medium to low complexity line drawing of' + prompt + ' the output should be clean, 2 dimensional fine line drawings with medium to low complexity. the lines should be pure black. the background solid white with empty space. ',
-            model="dall-e-3",
+            model=IMAGE_MODEL,
             # size="256x256",  # Increased size for better quality
-            quality="standard",    # Assuming 'high' is supported (check OpenAI docs for exact parameter usage)
+            quality=IMAGE_QUALITY,    # Assuming 'high' is supported (check OpenAI docs for exact parameter usage)
+            response_format="b64_json",
             n=1
         )
-        image_url = response.data[0].url
-        return image_url
+        breaker.record_success()
+        record_provider_call("openai-images", time.perf_counter() - start, True)
+        image = response.data[0]
+        if image.b64_json:
+            return base64.b64decode(image.b64_json)
+        return image.url
+    except (APIConnectionError, InternalServerError) as e:
+        # Timeouts, connection failures and server errors that outlasted the SDK's retries
+        breaker.record_failure()
+        record_provider_call("openai-images", time.perf_counter() - start, False)
+        logger.error(f"Error generating image: {e}")
+        return None
     except Exception as e:
-        print(f"Error generating image: {e}")
+        record_provider_call("openai-images", time.perf_counter() - start, False)
+        logger.error(f"Error generating image: {e}")
         return None
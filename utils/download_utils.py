@@ -0,0 +1,115 @@
+import hashlib
+import mimetypes
+import os
+import uuid
+from functools import lru_cache
+from fastapi.staticfiles import StaticFiles
+
+# Artifacts in a generation's uuid folder never change once written, so clients may cache them for good
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Content types mimetypes doesn't know (or guesses inconsistently across platforms)
+CONTENT_TYPES = {
+    ".gcode": "text/x-gcode",
+    ".svg": "image/svg+xml",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".zip": "application/zip",
+}
+
+def resolve_static_path(base_folder: str, relative_path: str) -> str:
+    """
+    Resolves a client-supplied path inside a base folder, following symlinks.
+
+    Args:
+        base_folder (str): The folder files are served from.
+        relative_path (str): The requested path, relative to the base folder.
+
+    Returns:
+        str: The real path of the file, or None if it escapes the base folder or isn't a regular file.
+    """
+    base = os.path.realpath(base_folder)
+    full_path = os.path.realpath(os.path.join(base, relative_path))
+    if os.path.commonpath([base, full_path]) != base or not os.path.isfile(full_path):
+        return None
+    return full_path
+
+def is_immutable_artifact(relative_path: str) -> bool:
+    """
+    Checks whether a path lies in a generation's uuid-scoped output folder.
+
+    Args:
+        relative_path (str): The path relative to the static folder.
+
+    Returns:
+        bool: True if the path's first component is a UUID.
+    """
+    first = relative_path.replace("\\", "/").lstrip("/").split("/", 1)[0]
+    try:
+        uuid.UUID(first)
+    except ValueError:
+        return False
+    return True
+
+def content_type(file_path: str) -> str:
+    """
+    Determines the content type to serve a file with.
+
+    Args:
+        file_path (str): The file path.
+
+    Returns:
+        str: The MIME type, falling back to application/octet-stream.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    return CONTENT_TYPES.get(extension) or mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+@lru_cache(maxsize=4096)
+def _content_etag(file_path: str, modified_ns: int, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return f'"{digest.hexdigest()[:32]}"'
+
+def file_etag(file_path: str) -> str:
+    """
+    Computes a strong ETag from a file's content. Hashes are remembered per path,
+    modification time and size, so each file version is only read once.
+
+    Args:
+        file_path (str): The file path.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    stat_result = os.stat(file_path)
+    return _content_etag(file_path, stat_result.st_mtime_ns, stat_result.st_size)
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Checks an If-None-Match header against an ETag.
+
+    Args:
+        if_none_match (str): The header value, possibly listing several (weak) ETags or "*".
+        etag (str): The current ETag.
+
+    Returns:
+        bool: True if the client's copy is current.
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+class ArtifactStaticFiles(StaticFiles):
+    """
+    StaticFiles that marks files in uuid-scoped output folders as immutable, so thumbnails
+    aren't refetched on every view.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if is_immutable_artifact(self.get_path(scope)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -1,62 +1,94 @@
 import os
+import threading
+
+# Hidden file, per directory and base name, remembering the last number handed out
+COUNTER_PREFIX = ".counter_"
+
+_lock = threading.Lock()
+
+def _counter_path(directory: str, key: str) -> str:
+    return os.path.join(directory, f"{COUNTER_PREFIX}{key}")
+
+def _highest_existing(directory: str, base_name: str, extension: str) -> int:
+    """Finds the highest number already used by a base_name_N entry, by listing the directory."""
+    highest_number = 0
+    for entry in os.listdir(directory):
+        if not entry.startswith(base_name) or not entry.endswith(extension):
+            continue
+        try:
+            number = int(entry[len(base_name):len(entry) - len(extension)].strip("_"))
+            highest_number = max(highest_number, number)
+        except ValueError:
+            continue
+    return highest_number
+
+def _read_counter(directory: str, base_name: str, extension: str) -> int:
+    """Reads the persisted counter, rebuilding it from a directory listing if it is missing."""
+    try:
+        with open(_counter_path(directory, base_name + extension)) as counter_file:
+            return int(counter_file.read().strip() or 0)
+    except (OSError, ValueError):
+        return _highest_existing(directory, base_name, extension)
+
+def _write_counter(directory: str, base_name: str, extension: str, number: int):
+    """Persists the counter atomically. It is only a hint, so failures are ignored."""
+    path = _counter_path(directory, base_name + extension)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "w") as counter_file:
+            counter_file.write(str(number))
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _allocate(directory: str, base_name: str, extension: str, claim) -> str:
+    """
+    Claims the next free base_name_N path. The counter makes the usual case a single
+    attempt; claim() is atomic, so concurrent callers never receive the same path.
+    """
+    with _lock:
+        number = _read_counter(directory, base_name, extension)
+        while True:
+            number += 1
+            path = os.path.join(directory, f"{base_name}_{number}{extension}")
+            try:
+                claim(path)
+            except FileExistsError:
+                continue
+            _write_counter(directory, base_name, extension, number)
+            return path
+
+def _claim_file(path: str):
+    os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
 
 def get_next_filename(directory: str, base_name: str, extension: str) -> str:
     """
-    Determines the next available incremented filename in the specified directory.
-    
+    Claims the next available incremented filename in the specified directory.
+
+    The file is created empty so that no other caller can be given the same name.
+
     Args:
         directory (str): The directory where files are saved.
         base_name (str): The base name for the files.
         extension (str): The file extension (e.g., '.png').
-    
+
     Returns:
-        str: The next available filename (e.g., 'generated_image_1.png').
+        str: The claimed filename (e.g., 'generated_image_1.png').
     """
-    # Get all files in the directory that match the base name and extension
-    existing_files = [
-        f for f in os.listdir(directory) 
-        if f.startswith(base_name) and f.endswith(extension)
-    ]
-
-    # Extract numbers from existing filenames and find the highest
-    highest_number = 0
-    for filename in existing_files:
-        try:
-            number = int(filename.replace(base_name, "").replace(extension, "").strip("_"))
-            highest_number = max(highest_number, number)
-        except ValueError:
-            continue
-
-    # Increment the highest number found
-    next_number = highest_number + 1
-    return os.path.join(directory, f"{base_name}_{next_number}{extension}")
+    return _allocate(directory, base_name, extension, _claim_file)
 
 def get_next_folder_name(directory: str, base_name: str) -> str:
     """
-    Determines the next available incremented folder name in the specified directory.
-    
+    Claims the next available incremented folder name in the specified directory.
+
+    The folder is created so that no other caller can be given the same name.
+
     Args:
         directory (str): The directory where the folders are created.
         base_name (str): The base name for the folders.
-    
+
     Returns:
-        str: The next available folder name (e.g., 'generated_image_1').
+        str: The claimed folder name (e.g., 'generated_image_1').
     """
-    # Get all folders in the directory that match the base name
-    existing_folders = [
-        f for f in os.listdir(directory) 
-        if os.path.isdir(os.path.join(directory, f)) and f.startswith(base_name)
-    ]
-
-    # Extract numbers from existing folder names and find the highest
-    highest_number = 0
-    for folder in existing_folders:
-        try:
-            number = int(folder.replace(base_name, "").strip("_"))
-            highest_number = max(highest_number, number)
-        except ValueError:
-            continue
-
-    # Increment the highest number found
-    next_number = highest_number + 1
-    return os.path.join(directory, f"{base_name}_{next_number}")
+    return _allocate(directory, base_name, "", os.mkdir)
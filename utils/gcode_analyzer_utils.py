@@ -0,0 +1,284 @@
+import os
+import re
+import numpy as np
+from utils.curve_utils import ARC_CW, ARC_CCW
+
+# Largest G-code upload accepted for analysis, in bytes
+GCODE_ANALYZE_MAX_BYTES = int(os.getenv("GCODE_ANALYZE_MAX_BYTES", 20 * 1024 * 1024))
+
+# Motion code of rapid moves, alongside the LINE (G1), ARC_CW and ARC_CCW codes of curve_utils
+RAPID = 0
+
+MM_PER_INCH = 25.4
+
+_COMMENT = re.compile(r"\([^)]*\)|;.*")
+_WORD = re.compile(r"([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+def _normalize(command: str) -> str:
+    return " ".join(_COMMENT.sub("", command).upper().split())
+
+def parse_gcode(lines, profile: dict) -> dict:
+    """
+    Parses a G-code program into arrays of its XY moves, tracking the modal state (motion
+    mode, feed rate, units, absolute or relative positioning) and whether the pen is down.
+
+    The pen is down after the profile's pen-down commands and up after its pen-up commands;
+    in programs that use neither, a Z at or below zero lowers it. Moves are drawing moves
+    when the pen is down, or when the program never lifts or lowers it, except rapids (G0).
+
+    Args:
+        lines (iterable): The lines of the program.
+        profile (dict): The machine profile giving pen commands and the rapid feed rate.
+
+    Returns:
+        dict: "moves", an (n, 10) array holding per XY move its start (x, y), end (x, y),
+        arc centre (x, y), motion code, feed rate per minute, whether it draws, and whether
+        the machine comes to a stop before it (a pen change, dwell or Z move came first);
+        "units" ("mm" or "in"), "dwell_seconds", "z_moves" as (distance, feed) pairs,
+        "pen_lifts" and "unsupported" (the G words that were skipped).
+    """
+    pen_down_commands = {_normalize(command) for command in profile["pen_down"]}
+    pen_up_commands = {_normalize(command) for command in profile["pen_up"]}
+    rapid_feed = profile["rapid_feed"]
+
+    moves, z_moves, unsupported = [], [], set()
+    x = y = z = 0.0
+    motion, feed, units, relative = RAPID, profile["draw_feed"], "mm", False
+    pen_down, stopped, dwell_seconds, pen_lifts = None, True, 0.0, 0
+
+    for line in lines:
+        command = _normalize(line)
+        if not command:
+            continue
+        codes, axes = [], {}
+        for letter, value in _WORD.findall(command):
+            if letter in "GM":
+                codes.append(f"{letter}{float(value):g}")
+            else:
+                axes[letter] = float(value)
+        if "M2" in codes or "M30" in codes:
+            break
+        for code in codes:
+            if code in ("G0", "G1", "G2", "G3"):
+                motion = int(code[1:])
+            elif code in ("G20", "G21"):
+                units = "in" if code == "G20" else "mm"
+            elif code in ("G90", "G91"):
+                relative = code == "G91"
+            elif code.startswith("G") and code not in ("G4", "G17", "G94"):
+                unsupported.add(code)
+        if "G4" in codes:
+            dwell_seconds += axes.get("P", axes.get("S", 0.0))
+            stopped = True
+            continue
+        if "F" in axes:
+            feed = axes["F"]
+
+        was_down = pen_down
+        if command in pen_down_commands:
+            pen_down = True
+        elif command in pen_up_commands:
+            pen_down = False
+        elif "Z" in axes:
+            pen_down = (z + axes["Z"] if relative else axes["Z"]) <= 0
+        if was_down and pen_down is False:
+            pen_lifts += 1
+        stopped = stopped or pen_down != was_down
+
+        if "Z" in axes:
+            target_z = z + axes["Z"] if relative else axes["Z"]
+            if "X" not in axes and "Y" not in axes:
+                z_moves.append((abs(target_z - z), rapid_feed if motion == RAPID else feed))
+                stopped = True
+            z = target_z
+
+        if "X" in axes or "Y" in axes:
+            target_x = (x if relative else 0.0) + axes["X"] if "X" in axes else x
+            target_y = (y if relative else 0.0) + axes["Y"] if "Y" in axes else y
+            arc = motion in (ARC_CW, ARC_CCW)
+            center_x, center_y = (x + axes.get("I", 0.0), y + axes.get("J", 0.0)) if arc else (0.0, 0.0)
+            draws = motion != RAPID and pen_down is not False
+            moves.append((x, y, target_x, target_y, center_x, center_y, motion, rapid_feed if motion == RAPID else feed, draws, stopped))
+            x, y, stopped = target_x, target_y, False
+
+    return {
+        "moves": np.array(moves, dtype=float).reshape(-1, 10),
+        "units": units,
+        "dwell_seconds": dwell_seconds,
+        "z_moves": np.array(z_moves, dtype=float).reshape(-1, 2),
+        "pen_lifts": pen_lifts,
+        "unsupported": sorted(unsupported),
+    }
+
+def arc_sweeps(starts: np.ndarray, ends: np.ndarray, centers: np.ndarray, motion: np.ndarray) -> tuple:
+    """
+    Computes the circle of G2/G3 moves.
+
+    Args:
+        starts (np.ndarray): (n, 2) start points.
+        ends (np.ndarray): (n, 2) end points.
+        centers (np.ndarray): (n, 2) arc centres.
+        motion (np.ndarray): (n,) motion codes, ARC_CW or ARC_CCW.
+
+    Returns:
+        tuple: Radii, start angles and signed sweeps in radians (positive counter-clockwise).
+        Arcs ending where they start are full circles.
+    """
+    radii = np.hypot(*(starts - centers).T)
+    start_angles = np.arctan2(*(starts - centers).T[::-1])
+    end_angles = np.arctan2(*(ends - centers).T[::-1])
+    sweeps = np.where(motion == ARC_CCW, end_angles - start_angles, start_angles - end_angles) % (2 * np.pi)
+    sweeps = np.where(np.isclose(sweeps, 0.0) & np.all(np.isclose(starts, ends), axis=1), 2 * np.pi, sweeps)
+    return radii, start_angles, np.where(motion == ARC_CCW, sweeps, -sweeps)
+
+def arc_bounds(points: np.ndarray, arcs: tuple = None) -> np.ndarray:
+    """
+    Computes the bounding box of points, widened to the extremes of the given arcs.
+
+    Args:
+        points (np.ndarray): (n, 2) points, including the arcs' end points.
+        arcs (tuple, optional): The arcs' centres, then their radii, start angles and signed
+            sweeps as returned by arc_sweeps.
+
+    Returns:
+        np.ndarray: [min_x, min_y, max_x, max_y].
+    """
+    if arcs is not None and len(arcs[0]):
+        centers, radii, start_angles, sweeps = arcs
+        # An arc reaches its circle's extreme along an axis when it sweeps over that direction
+        for quarter in range(4):
+            angle = quarter * np.pi / 2
+            offset = np.where(sweeps >= 0, angle - start_angles, start_angles - angle) % (2 * np.pi)
+            reached = offset <= np.abs(sweeps)
+            direction = np.array([np.cos(angle), np.sin(angle)]).round()
+            points = np.vstack([points, centers[reached] + radii[reached, None] * direction])
+    return np.concatenate([points.min(axis=0), points.max(axis=0)])
+
+def _move_times(lengths: np.ndarray, speeds: np.ndarray, entry: np.ndarray, exit: np.ndarray, acceleration: float) -> np.ndarray:
+    """
+    Times moves with a trapezoidal velocity profile: accelerate from the entry speed, cruise at
+    the feed rate if the move is long enough to reach it, then decelerate to the exit speed.
+    """
+    peak = np.minimum(speeds, np.sqrt(acceleration * lengths + (entry ** 2 + exit ** 2) / 2))
+    entry, exit = np.minimum(entry, peak), np.minimum(exit, peak)
+    ramp_distance = (2 * peak ** 2 - entry ** 2 - exit ** 2) / (2 * acceleration)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        times = (2 * peak - entry - exit) / acceleration + np.maximum(lengths - ramp_distance, 0.0) / peak
+    return np.where(lengths > 0, times, 0.0)
+
+def estimate_runtime(parsed: dict, profile: dict) -> float:
+    """
+    Estimates how long a parsed program takes to run, in seconds.
+
+    Every move is timed with a trapezoidal velocity profile using the profile's acceleration.
+    Consecutive moves are joined without stopping, at the cornering speed given by the
+    profile's junction deviation (the model GRBL's planner uses); the machine stops around
+    pen changes, dwells and Z moves, which are added to the total.
+
+    Args:
+        parsed (dict): The result of parse_gcode.
+        profile (dict): The machine profile giving acceleration and junction deviation.
+
+    Returns:
+        float: The estimated runtime in seconds.
+    """
+    scale = MM_PER_INCH if parsed["units"] == "in" else 1.0
+    acceleration = profile["acceleration"] / scale
+    deviation = profile["junction_deviation"] / scale
+
+    z_moves = parsed["z_moves"]
+    total = parsed["dwell_seconds"] + float(np.sum(_move_times(z_moves[:, 0], z_moves[:, 1] / 60, np.zeros(len(z_moves)), np.zeros(len(z_moves)), acceleration)))
+
+    moves = parsed["moves"]
+    if not len(moves):
+        return total
+    starts, ends, centers, motion = moves[:, 0:2], moves[:, 2:4], moves[:, 4:6], moves[:, 6]
+    speeds = np.maximum(moves[:, 7], 1e-6) / 60
+    arcs = (motion == ARC_CW) | (motion == ARC_CCW)
+
+    # Entry and exit directions: along the chord for lines, tangent to the circle for arcs
+    chords = ends - starts
+    lengths = np.hypot(*chords.T)
+    radii, _, sweeps = arc_sweeps(starts[arcs], ends[arcs], centers[arcs], motion[arcs])
+    lengths[arcs] = radii * np.abs(sweeps)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        entry_directions = np.nan_to_num(chords / np.hypot(*chords.T)[:, None])
+        exit_directions = entry_directions.copy()
+        turn = np.where(motion[arcs] == ARC_CCW, 1.0, -1.0)[:, None]
+        for directions, points in ((entry_directions, starts), (exit_directions, ends)):
+            radial = points[arcs] - centers[arcs]
+            directions[arcs] = np.nan_to_num(turn * np.column_stack([-radial[:, 1], radial[:, 0]]) / np.hypot(*radial.T)[:, None])
+
+    # Junction speeds between consecutive moves the machine doesn't stop between
+    cos_theta = -np.sum(exit_directions[:-1] * entry_directions[1:], axis=1)
+    sin_half = np.sqrt(np.clip((1 - cos_theta) / 2, 0.0, 1.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        junction = np.where(sin_half < 0.999999, np.sqrt(acceleration * deviation * sin_half / (1 - sin_half)), np.inf)
+    junction = np.minimum(junction, np.minimum(speeds[:-1], speeds[1:]))
+    continuous = (moves[1:, 9] == 0) & (moves[1:, 8] == moves[:-1, 8])
+    junction = np.where(continuous, junction, 0.0)
+
+    entry = np.concatenate([[0.0], junction])
+    exit = np.concatenate([junction, [0.0]])
+    return total + float(np.sum(_move_times(lengths, speeds, entry, exit, acceleration)))
+
+def analyze_gcode(lines, profile: dict) -> dict:
+    """
+    Summarizes a G-code program: drawing bounds, draw and travel distances, move counts and
+    an estimated runtime on the machine, with warnings for moves that leave the bed.
+
+    Args:
+        lines (iterable): The lines of the program, e.g. an open file.
+        profile (dict): The machine profile the program is meant for.
+
+    Returns:
+        dict: The summary. Distances and bounds are in the program's units.
+    """
+    parsed = parse_gcode(lines, profile)
+    moves, units = parsed["moves"], parsed["units"]
+    scale = MM_PER_INCH if units == "in" else 1.0
+    starts, ends, centers, motion, draws = moves[:, 0:2], moves[:, 2:4], moves[:, 4:6], moves[:, 6], moves[:, 8] == 1
+
+    arcs = (motion == ARC_CW) | (motion == ARC_CCW)
+    lengths = np.hypot(*(ends - starts).T)
+    radii, start_angles, sweeps = arc_sweeps(starts[arcs], ends[arcs], centers[arcs], motion[arcs])
+    lengths[arcs] = radii * np.abs(sweeps)
+
+    warnings = []
+    bounds = None
+    if np.any(draws):
+        drawn_arcs = draws[arcs]
+        bounds = arc_bounds(np.vstack([starts[draws], ends[draws]]), (centers[arcs][drawn_arcs], radii[drawn_arcs], start_angles[drawn_arcs], sweeps[drawn_arcs]))
+    else:
+        warnings.append("The program has no drawing moves.")
+
+    # Every position the machine reaches, travel included, must lie on the bed
+    within_bed = True
+    if len(moves):
+        extent = arc_bounds(np.vstack([starts, ends]), (centers[arcs], radii, start_angles, sweeps))
+        width, height = profile["bed_width"] / scale, profile["bed_height"] / scale
+        bed = np.array([0.0, 0.0, width, height]) - (np.array([width, height, width, height]) / 2 if profile["origin"] == "center" else 0.0)
+        tolerance = 10.0 ** -int(profile["precision"])
+        within_bed = bool(np.all(extent[:2] >= bed[:2] - tolerance) and np.all(extent[2:] <= bed[2:] + tolerance))
+        if not within_bed:
+            warnings.append(
+                f"Moves reach X {extent[0]:.2f} to {extent[2]:.2f} and Y {extent[1]:.2f} to {extent[3]:.2f}, outside the "
+                f"{profile['name']} bed of X {bed[0]:g} to {bed[2]:g} and Y {bed[1]:g} to {bed[3]:g} {units}."
+            )
+    if parsed["unsupported"]:
+        warnings.append(f"Ignored unsupported commands: {', '.join(parsed['unsupported'])}.")
+
+    return {
+        "machine_profile": profile["name"],
+        "units": units,
+        "bounds": [round(float(value), 3) for value in bounds] if bounds is not None else None,
+        "within_bed": within_bed,
+        "draw_distance": round(float(np.sum(lengths[draws])), 2),
+        "travel_distance": round(float(np.sum(lengths[~draws])), 2),
+        "draw_moves": int(np.count_nonzero(draws)),
+        "travel_moves": int(np.count_nonzero(~draws)),
+        "arc_moves": int(np.count_nonzero(arcs)),
+        "pen_lifts": parsed["pen_lifts"],
+        "estimated_seconds": round(estimate_runtime(parsed, profile), 1),
+        "warnings": warnings,
+    }
@@ -0,0 +1,132 @@
+import os
+import numpy as np
+from utils.curve_utils import LINE, ARC_CW, ARC_CCW
+
+# Approximate number of characters buffered before a chunk of G-code is yielded
+GCODE_CHUNK_SIZE = int(os.getenv("GCODE_CHUNK_SIZE", 65536))
+
+MM_PER_INCH = 25.4
+
+def machine_transform(geometry: dict, profile: dict, extents=None) -> tuple:
+    """
+    Computes the mapping from SVG user units to machine coordinates for a profile.
+
+    With scale_to_fit the document is scaled uniformly to fill the bed inside the margin and
+    centred on it; otherwise it keeps its physical size and sits at the margin. The fitted
+    area is the viewBox grown to the drawing's extents, so geometry outside the viewBox still
+    lands on the bed. flip_y turns the SVG's downward Y axis into the machine's upward one,
+    and origin "center" puts the machine's (0, 0) in the middle of the bed instead of its
+    bottom-left corner.
+
+    Args:
+        geometry (dict): Document geometry as returned by svg_units_utils.document_geometry.
+        profile (dict): The machine profile.
+        extents (sequence, optional): The drawing's [min_x, min_y, max_x, max_y] in user units.
+
+    Returns:
+        tuple: (scale_x, scale_y, offset_x, offset_y) such that machine = scale * svg + offset,
+        in the profile's output units.
+    """
+    min_x, min_y, width, height = geometry["viewbox"]
+    if profile["scale_to_fit"] and extents is not None:
+        if width > 0 and height > 0:
+            extents = (min(min_x, extents[0]), min(min_y, extents[1]), max(min_x + width, extents[2]), max(min_y + height, extents[3]))
+        min_x, min_y, width, height = extents[0], extents[1], extents[2] - extents[0], extents[3] - extents[1]
+    bed_width, bed_height, margin = profile["bed_width"], profile["bed_height"], profile["margin"]
+
+    scale = geometry["mm_per_unit"]
+    if profile["scale_to_fit"] and width > 0 and height > 0:
+        scale = min((bed_width - 2 * margin) / width, (bed_height - 2 * margin) / height)
+        left, bottom = (bed_width - width * scale) / 2, (bed_height - height * scale) / 2
+    else:
+        left, bottom = margin, margin
+    if profile["origin"] == "center":
+        left, bottom = left - bed_width / 2, bottom - bed_height / 2
+
+    scale_x = scale
+    offset_x = left - min_x * scale
+    if profile["flip_y"]:
+        scale_y, offset_y = -scale, bottom + (min_y + height) * scale
+    else:
+        scale_y, offset_y = scale, bottom - min_y * scale
+
+    if profile["units"] == "in":
+        return tuple(value / MM_PER_INCH for value in (scale_x, scale_y, offset_x, offset_y))
+    return scale_x, scale_y, offset_x, offset_y
+
+def _templates(profile: dict) -> dict:
+    """Builds the printf-style line templates for each motion code."""
+    digits = int(profile["precision"])
+    xy = f"X%.{digits}f Y%.{digits}f"
+    ij = f"I%.{digits}f J%.{digits}f"
+    return {
+        LINE: f"G1 {xy}\n",
+        ARC_CW: f"G2 {xy} {ij}\n",
+        ARC_CCW: f"G3 {xy} {ij}\n",
+        "travel": f"G0 {xy}\n" if not profile["travel_feed"] else f"G1 {xy} F{profile['travel_feed']:g}\n",
+    }
+
+def _format_stroke(toolpath, templates: dict, draw_feed) -> str:
+    """
+    Formats the drawing moves of one stroke in a single printf operation: the per-segment
+    templates are joined into one format string and filled from a flat array of values.
+    """
+    motion = toolpath.segments[:, 2].astype(np.int64)
+    ends = toolpath.points[1:]
+    if len(motion) == 0:
+        return ""
+    if np.all(motion == LINE):
+        formats = [templates[LINE]] * len(motion)
+        values = ends.ravel()
+    else:
+        relative_centers = toolpath.segments[:, :2] - toolpath.points[:-1]
+        values = np.column_stack([ends, relative_centers])
+        used = np.ones(values.shape, dtype=bool)
+        used[motion == LINE, 2:] = False
+        values = values[used]
+        formats = [templates[code] for code in motion.tolist()]
+    if draw_feed:
+        formats[0] = formats[0][:-1] + f" F{draw_feed:g}\n"
+    return "".join(formats) % tuple(values.tolist())
+
+def iter_gcode(toolpaths, profile: dict, chunk_size: int = GCODE_CHUNK_SIZE):
+    """
+    Generates G-code for toolpaths in machine coordinates, in chunks of roughly chunk_size
+    characters, so output of any size can be streamed to a file, archive or HTTP response.
+
+    Each stroke is a rapid to its start, the profile's pen-down commands, its drawing moves
+    (G1 lines, G2/G3 arcs) at the drawing feed rate, then the pen-up commands.
+
+    Args:
+        toolpaths (iterable): Toolpath strokes in drawing order.
+        profile (dict): The machine profile.
+        chunk_size (int): Approximate size of each yielded chunk.
+
+    Yields:
+        str: Consecutive pieces of the G-code program.
+    """
+    templates = _templates(profile)
+    pen_up = "".join(f"{command}\n" for command in profile["pen_up"])
+    pen_down = "".join(f"{command}\n" for command in profile["pen_down"])
+
+    header = [
+        "; G-code generated from SVG",
+        f"; Machine profile: {profile['name']}",
+        "G20 ; Set units to inches" if profile["units"] == "in" else "G21 ; Set units to mm",
+        "G90 ; Absolute positioning",
+        *profile["header"],
+    ]
+    buffer = ["".join(f"{line}\n" for line in header), pen_up]
+    size = sum(len(part) for part in buffer)
+
+    for toolpath in toolpaths:
+        part = templates["travel"] % tuple(toolpath.points[0].tolist()) + pen_down + _format_stroke(toolpath, templates, profile["draw_feed"]) + pen_up
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer, size = [], 0
+
+    buffer.append("".join(f"{line}\n" for line in profile["footer"]))
+    buffer.append("M2 ; End of program\n")
+    yield "".join(buffer)
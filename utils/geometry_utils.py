@@ -0,0 +1,194 @@
+import numpy as np
+
+def split_polylines(points: np.ndarray, offsets: np.ndarray) -> list:
+    """
+    Splits concatenated polyline points into one array per polyline.
+
+    Args:
+        points (np.ndarray): (N, 2) array holding the points of all polylines back to back.
+        offsets (np.ndarray): (M + 1,) array where polyline i is points[offsets[i]:offsets[i + 1]].
+
+    Returns:
+        list: The M polylines as (n, 2) arrays.
+    """
+    return np.split(points, offsets[1:-1])
+
+def join_polylines(polylines: list) -> tuple:
+    """
+    Concatenates polylines into a single point array plus offsets.
+
+    Args:
+        polylines (list): Polylines as (n, 2) arrays.
+
+    Returns:
+        tuple: (points, offsets) as accepted by split_polylines.
+    """
+    lengths = np.fromiter((len(p) for p in polylines), dtype=np.int64, count=len(polylines))
+    offsets = np.zeros(len(polylines) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if not polylines:
+        return np.empty((0, 2)), offsets
+    return np.concatenate(polylines).astype(float, copy=False), offsets
+
+def point_segment_distances(points: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Computes the distance of each point to the matching line segment.
+
+    Args:
+        points (np.ndarray): (N, 2) points.
+        starts (np.ndarray): (N, 2) segment start points.
+        ends (np.ndarray): (N, 2) segment end points.
+
+    Returns:
+        np.ndarray: (N,) distances. Degenerate segments measure the distance to their start point.
+    """
+    direction = ends - starts
+    length_sq = np.einsum("ij,ij->i", direction, direction)
+    relative = points - starts
+    t = np.einsum("ij,ij->i", relative, direction) / np.where(length_sq > 0, length_sq, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+    closest = starts + direction * t[:, None]
+    return np.hypot(*(points - closest).T)
+
+def simplify_rdp(points: np.ndarray, offsets: np.ndarray, tolerance: float) -> tuple:
+    """
+    Simplifies many polylines at once with the Ramer-Douglas-Peucker algorithm.
+
+    The recursion is run breadth-first over all polylines together, so each level of
+    the recursion is a handful of NumPy operations regardless of the polyline count.
+
+    Args:
+        points (np.ndarray): (N, 2) array holding the points of all polylines back to back.
+        offsets (np.ndarray): (M + 1,) polyline start offsets into points.
+        tolerance (float): Maximum distance a removed point may lie from the simplified line.
+
+    Returns:
+        tuple: (points, offsets) of the simplified polylines. Endpoints are always kept.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    if len(points) == 0:
+        return points, offsets
+    starts, ends = offsets[:-1], offsets[1:] - 1
+    nonempty = ends >= starts
+    keep[starts[nonempty]] = True
+    keep[ends[nonempty]] = True
+
+    # Intervals (a, b) of point indices whose interior still has to be checked
+    a, b = starts[nonempty], ends[nonempty]
+    while True:
+        pending = b - a >= 2
+        a, b = a[pending], b[pending]
+        if len(a) == 0:
+            break
+        counts = b - a - 1
+        group = np.repeat(np.arange(len(a)), counts)
+        first = np.zeros(len(a), dtype=np.int64)
+        np.cumsum(counts[:-1], out=first[1:])
+        interior = np.repeat(a + 1, counts) + (np.arange(counts.sum()) - np.repeat(first, counts))
+
+        distances = point_segment_distances(points[interior], points[a[group]], points[b[group]])
+        max_distance = np.maximum.reduceat(distances, first)
+
+        # Index of the farthest point of each interval (first one on ties)
+        is_max = distances == max_distance[group]
+        _, first_max = np.unique(group[is_max], return_index=True)
+        split = interior[is_max][first_max]
+
+        refine = max_distance > tolerance
+        split, a, b = split[refine], a[refine], b[refine]
+        keep[split] = True
+        a, b = np.concatenate([a, split]), np.concatenate([split, b])
+
+    kept_counts = np.add.reduceat(keep.astype(np.int64), np.minimum(offsets[:-1], len(keep) - 1))
+    kept_counts = np.where(offsets[1:] > offsets[:-1], kept_counts, 0)
+    new_offsets = np.zeros_like(offsets)
+    np.cumsum(kept_counts, out=new_offsets[1:])
+    return points[keep], new_offsets
+
+def _interior_mask(offsets: np.ndarray, count: int) -> np.ndarray:
+    """Marks points that are neither the first nor the last point of their polyline."""
+    interior = np.ones(count, dtype=bool)
+    nonempty = offsets[1:] > offsets[:-1]
+    interior[offsets[:-1][nonempty]] = False
+    interior[offsets[1:][nonempty] - 1] = False
+    return interior
+
+def _compact(points: np.ndarray, offsets: np.ndarray, keep: np.ndarray) -> tuple:
+    """Drops the points not marked in keep and recomputes the offsets."""
+    counts = np.diff(np.concatenate([[0], np.cumsum(keep)])[offsets])
+    new_offsets = np.zeros_like(offsets)
+    np.cumsum(counts, out=new_offsets[1:])
+    return points[keep], new_offsets
+
+def merge_collinear(points: np.ndarray, offsets: np.ndarray, angle_tolerance: float = 1e-6) -> tuple:
+    """
+    Removes repeated points and interior points where the polyline continues straight on,
+    merging runs of collinear segments into single segments.
+
+    Args:
+        points (np.ndarray): (N, 2) array holding the points of all polylines back to back.
+        offsets (np.ndarray): (M + 1,) polyline start offsets into points.
+        angle_tolerance (float): Largest change of direction, in radians, still treated as straight.
+
+    Returns:
+        tuple: (points, offsets) of the merged polylines. Endpoints are always kept.
+    """
+    if len(points) == 0:
+        return points, offsets
+
+    # Repeated points first, so that the direction test below sees real directions
+    repeated = np.zeros(len(points), dtype=bool)
+    repeated[1:] = np.all(points[1:] == points[:-1], axis=1)
+    points, offsets = _compact(points, offsets, ~(repeated & _interior_mask(offsets, len(points))))
+
+    index = np.nonzero(_interior_mask(offsets, len(points)))[0]
+    incoming = points[index] - points[index - 1]
+    outgoing = points[index + 1] - points[index]
+    cross = incoming[:, 0] * outgoing[:, 1] - incoming[:, 1] * outgoing[:, 0]
+    dot = np.einsum("ij,ij->i", incoming, outgoing)
+    straight = (dot > 0) & (np.abs(np.arctan2(cross, dot)) <= angle_tolerance)
+    keep = np.ones(len(points), dtype=bool)
+    keep[index[straight]] = False
+    return _compact(points, offsets, keep)
+
+def simplify_visvalingam(points: np.ndarray, offsets: np.ndarray, tolerance: float) -> tuple:
+    """
+    Simplifies many polylines at once with the Visvalingam-Whyatt algorithm.
+
+    A point is removed when the triangle it forms with its neighbours has an area below
+    tolerance squared. Each round removes every such point that is a local minimum among
+    its neighbours, then recomputes the areas, so the work is a few NumPy operations per
+    round rather than a heap operation per point.
+
+    Args:
+        points (np.ndarray): (N, 2) array holding the points of all polylines back to back.
+        offsets (np.ndarray): (M + 1,) polyline start offsets into points.
+        tolerance (float): Linear tolerance; the area threshold is its square.
+
+    Returns:
+        tuple: (points, offsets) of the simplified polylines. Endpoints are always kept.
+    """
+    threshold = tolerance * tolerance
+    while len(points):
+        interior = _interior_mask(offsets, len(points))
+        index = np.nonzero(interior)[0]
+        if len(index) == 0:
+            break
+        previous, current, following = points[index - 1], points[index], points[index + 1]
+        areas = np.full(len(points), np.inf)
+        areas[index] = 0.5 * np.abs(
+            (current[:, 0] - previous[:, 0]) * (following[:, 1] - previous[:, 1])
+            - (following[:, 0] - previous[:, 0]) * (current[:, 1] - previous[:, 1])
+        )
+        # Remove local minima only, so no two neighbours go in one round. Ties are broken by a
+        # fixed pseudo-random priority so that runs of equal areas thin out quickly
+        priority = np.random.default_rng(len(points)).random(len(points))
+        left, right = np.roll(areas, 1), np.roll(areas, -1)
+        left_priority, right_priority = np.roll(priority, 1), np.roll(priority, -1)
+        below_left = (areas < left) | ((areas == left) & (priority < left_priority))
+        below_right = (areas < right) | ((areas == right) & (priority < right_priority))
+        remove = interior & (areas < threshold) & below_left & below_right
+        if not remove.any():
+            break
+        points, offsets = _compact(points, offsets, ~remove)
+    return points, offsets
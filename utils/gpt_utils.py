@@ -1,17 +1,31 @@
-from openai import OpenAI
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError
 from dotenv import load_dotenv
+import logging
 import os
+import time
+from utils.http_utils import OPENAI_MAX_RETRIES, OPENAI_TIMEOUT, get_circuit_breaker
+from utils.metrics_utils import record_provider_call
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Initialize the OpenAI client with the API key and organization
-client = OpenAI(
+client = AsyncOpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),
-    organization=os.getenv("OPENAI_ORGANIZATION")
+    organization=os.getenv("OPENAI_ORGANIZATION"),
+    timeout=OPENAI_TIMEOUT,
+    max_retries=OPENAI_MAX_RETRIES
 )
 
-def generate_prompt_from_chatgpt(prompt: str) -> str:
+# Chat model used to expand concepts into image prompts
+PROMPT_MODEL = 'gpt-4o-mini'
+
+# Returned when the prompt could not be generated
+FALLBACK_PROMPT = "A beautiful and vivid scene, inspired by your input, could not be generated."
+
+async def generate_prompt_from_chatgpt(prompt: str) -> str:
     """
     Generates a creative and detailed prompt for image generation using ChatGPT.
     
@@ -21,10 +35,13 @@ def generate_prompt_from_chatgpt(prompt: str) -> str:
     Returns:
         str: A more detailed and creative description generated by ChatGPT.
     """
+    breaker = get_circuit_breaker("openai")
+    start = time.perf_counter()
     try:
+        breaker.check()
         model = os.getenv("OPENAI_MODEL")
-        completion = client.chat.completions.create(
-            model='gpt-4o-mini',  
+        completion = await client.chat.completions.create(
+            model=PROMPT_MODEL,
             messages=[
                 {"role": "system", "content": (
                  "You are a creative assistant that specializes in generating simple, clean, and easy-to-draw descriptions for visual art"
@@ -35,8 +52,17 @@ def generate_prompt_from_chatgpt(prompt: str) -> str:
                 {"role": "user", "content": prompt}
             ]
         )
+        breaker.record_success()
+        record_provider_call("openai-chat", time.perf_counter() - start, True)
         return completion.choices[0].message.content
+    except (APIConnectionError, InternalServerError) as e:
+        # Timeouts, connection failures and server errors that outlasted the SDK's retries
+        breaker.record_failure()
+        record_provider_call("openai-chat", time.perf_counter() - start, False)
+        logger.error(f"Error generating prompt: {e}")
+        return FALLBACK_PROMPT
     except Exception as e:
-        print(f"Error generating prompt: {e}")
-        return "A beautiful and vivid scene, inspired by your input, could not be generated."
+        record_provider_call("openai-chat", time.perf_counter() - start, False)
+        logger.error(f"Error generating prompt: {e}")
+        return FALLBACK_PROMPT
 
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+import random
+import time
+import httpx
+from utils.metrics_utils import record_provider_call
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a connection, and for each read/write once connected
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+
+# Connections kept open to external services
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+
+# Retries of failed requests, with exponential backoff and full jitter between attempts
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 3))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.5))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", 10))
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Consecutive failures after which a provider's circuit opens, and seconds before it is tried again
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))
+
+# Timeout in seconds and retries (with the SDK's own backoff) for OpenAI calls
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 90))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 2))
+
+# Shared async HTTP client, created lazily so every request reuses the same connection pool
+_client = None
+_breakers = {}
+
+class CircuitOpenError(httpx.HTTPError):
+    """
+    Raised instead of calling a provider whose circuit is open. It is an httpx.HTTPError,
+    so callers already handling failed requests handle it too.
+    """
+
+class CircuitBreaker:
+    """
+    Fails fast while a provider is down. After CIRCUIT_FAILURE_THRESHOLD consecutive failures
+    the circuit opens and calls are refused; once CIRCUIT_RESET_TIMEOUT has passed a single
+    trial call is let through, closing the circuit again if it succeeds.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def check(self):
+        """
+        Raises CircuitOpenError unless a call may be made now.
+        """
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError(f"{self.name} is unavailable, not retrying for up to {self.reset_timeout:.0f}s")
+        if state == "half-open":
+            # Let this call through as the trial, and keep refusing others until it has an outcome
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """
+    Returns the circuit breaker guarding a provider, creating it on first use.
+
+    Args:
+        name (str): The provider, e.g. "openai" or "convertio".
+
+    Returns:
+        CircuitBreaker: The process-wide breaker for the provider.
+    """
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+def backoff_delay(attempt: int, retry_after: str = None) -> float:
+    """
+    Returns how long to wait before retry number attempt (starting at 0), honouring a
+    Retry-After header in seconds when the server sent one.
+    """
+    if retry_after:
+        try:
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared asynchronous HTTP client, creating it on first use.
+
+    Returns:
+        httpx.AsyncClient: The process-wide HTTP client.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+        )
+    return _client
+
+async def send_with_retry(provider: str, method: str, url: str, retries: int = HTTP_RETRIES, stream: bool = False, **kwargs) -> httpx.Response:
+    """
+    Sends a request through the shared client, retrying connection errors, timeouts and
+    retryable status codes with exponential backoff, behind the provider's circuit breaker.
+
+    Args:
+        provider (str): Name of the circuit breaker guarding the service.
+        method (str): The HTTP method.
+        url (str): The URL to request.
+        retries (int): Number of retries after the first attempt. Only pass more than 0 for
+            requests that are safe to repeat.
+        stream (bool): Whether to return before reading the body. The caller must then
+            close the response.
+        **kwargs: Passed on to httpx.AsyncClient.build_request (json, content, headers...).
+
+    Returns:
+        httpx.Response: The last response, which may still be an error status.
+
+    Raises:
+        httpx.HTTPError: If the request could not be completed, or CircuitOpenError if the
+            provider's circuit is open.
+    """
+    client = get_http_client()
+    breaker = get_circuit_breaker(provider)
+    breaker.check()
+    start = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            response = await client.send(client.build_request(method, url, **kwargs), stream=stream)
+        except httpx.TransportError as e:
+            if attempt == retries:
+                breaker.record_failure()
+                record_provider_call(provider, time.perf_counter() - start, False)
+                raise
+            logger.warning(f"{provider} request failed ({e!r}), retrying")
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code not in RETRY_STATUS_CODES:
+            breaker.record_success()
+            record_provider_call(provider, time.perf_counter() - start, response.status_code < 400)
+            return response
+        if attempt == retries:
+            breaker.record_failure()
+            record_provider_call(provider, time.perf_counter() - start, False)
+            return response
+        logger.warning(f"{provider} answered {response.status_code}, retrying")
+        await response.aclose()
+        await asyncio.sleep(backoff_delay(attempt, response.headers.get("retry-after")))
+
+async def close_http_client():
+    """Closes the shared HTTP client and releases its pooled connections."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+from utils.job_store import create_job, get_job, update_job, list_unfinished_jobs
+from utils.pipeline_utils import STAGES, PipelineError, run_generation_pipeline
+from utils.metrics_utils import start_request
+from utils.worker_utils import run_in_worker
+
+logger = logging.getLogger(__name__)
+
+# Number of jobs processed concurrently, and the maximum number waiting in the queue
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", 4))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 100))
+
+_queue = None
+_workers = []
+_on_finish = {}
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is full."""
+
+async def submit_job(concept: str, machine_profile: str = None, on_finish=None, fresh: bool = False) -> dict:
+    """
+    Creates a job for the concept and queues it for processing.
+
+    Args:
+        concept (str): The concept provided by the user.
+        machine_profile (str, optional): Name of the machine profile to generate G-code for.
+        on_finish (callable, optional): Called with no arguments once the job has completed
+            or failed, e.g. to release the admission slot it holds. It isn't called if the
+            job can't be queued.
+        fresh (bool, optional): Generate a new image rather than reusing a cached one. It is
+            kept in the job's state, so a job resumed after a restart stays fresh.
+
+    Returns:
+        dict: The created job record.
+
+    Raises:
+        JobQueueFullError: If the queue has no room for another job.
+    """
+    if _queue is None or _queue.full():
+        raise JobQueueFullError("The job queue is full, try again later.")
+    state = {"machine_profile": machine_profile} if machine_profile else {}
+    if fresh:
+        state["fresh"] = True
+    job = await run_in_worker(create_job, concept, STAGES, state=state or None)
+    try:
+        _queue.put_nowait(job["id"])
+    except asyncio.QueueFull:
+        # Filled up by other submissions while the job was being created
+        await run_in_worker(update_job, job["id"], status="failed", error="The job queue was full.")
+        raise JobQueueFullError("The job queue is full, try again later.")
+    if on_finish is not None:
+        _on_finish[job["id"]] = on_finish
+    return job
+
+async def _run_job(job_id: str):
+    """
+    Runs the pipeline for a job, persisting per-stage progress as it goes. The job database
+    is written from the worker pool, so a slow commit doesn't hold up other requests.
+    """
+    job = await run_in_worker(get_job, job_id)
+    if job is None or job["status"] not in ("queued", "running"):
+        return
+
+    # Tag the job's logs and stage timings with its id
+    start_request(job_id)
+    stages = job["stages"]
+    await run_in_worker(update_job, job_id, status="running")
+
+    async def on_stage(stage, status, state):
+        stages[stage] = status
+        await run_in_worker(update_job, job_id, stages=stages, state=state)
+
+    try:
+        state = await run_generation_pipeline(job["concept"], state=job["state"], on_stage=on_stage, fresh=bool(job["state"].get("fresh")))
+        await run_in_worker(update_job, job_id, status="completed", state=state)
+    except PipelineError as e:
+        stages[e.stage] = "failed"
+        await run_in_worker(update_job, job_id, status="failed", stages=stages, error=str(e))
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        await run_in_worker(update_job, job_id, status="failed", error=f"An error occurred: {str(e)}")
+
+async def _worker():
+    """Pulls job ids off the queue and runs them one at a time."""
+    while True:
+        job_id = await _queue.get()
+        try:
+            await _run_job(job_id)
+        finally:
+            on_finish = _on_finish.pop(job_id, None)
+            if on_finish is not None:
+                on_finish()
+            _queue.task_done()
+
+async def start_job_scheduler():
+    """Starts the job workers and re-queues jobs left unfinished by a previous run."""
+    global _queue
+    _queue = asyncio.Queue(maxsize=JOB_QUEUE_SIZE)
+    for job in list_unfinished_jobs():
+        if _queue.full():
+            update_job(job["id"], status="failed", error="Job could not be resumed after restart: queue is full.")
+        else:
+            _queue.put_nowait(job["id"])
+    for _ in range(JOB_CONCURRENCY):
+        _workers.append(asyncio.create_task(_worker()))
+
+async def stop_job_scheduler():
+    """Cancels the job workers. Interrupted jobs stay unfinished and resume on the next start."""
+    global _queue
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+    for on_finish in _on_finish.values():
+        on_finish()
+    _on_finish.clear()
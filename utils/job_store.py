@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# SQLite database holding job records, so queued and finished jobs survive restarts
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "tmp/jobs.sqlite3")
+
+_connection = None
+_lock = threading.Lock()
+
+def _get_connection() -> sqlite3.Connection:
+    """Opens the job database on first use and creates the jobs table if needed."""
+    global _connection
+    if _connection is None:
+        directory = os.path.dirname(JOB_DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _connection = sqlite3.connect(JOB_DB_PATH, check_same_thread=False)
+        _connection.row_factory = sqlite3.Row
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                concept TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stages TEXT NOT NULL,
+                state TEXT NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        _connection.commit()
+    return _connection
+
+def _row_to_job(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "concept": row["concept"],
+        "status": row["status"],
+        "stages": json.loads(row["stages"]),
+        "state": json.loads(row["state"]),
+        "error": row["error"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+
+def create_job(concept: str, stages: list, state: dict = None) -> dict:
+    """
+    Creates a new queued job.
+
+    Args:
+        concept (str): The concept provided by the user.
+        stages (list): Names of the pipeline stages to track, all starting as "pending".
+        state (dict, optional): Initial pipeline state, such as the requested options.
+
+    Returns:
+        dict: The created job record.
+    """
+    job_id = str(uuid.uuid4())
+    now = time.time()
+    with _lock:
+        connection = _get_connection()
+        connection.execute(
+            "INSERT INTO jobs (id, concept, status, stages, state, error, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, concept, "queued", json.dumps({stage: "pending" for stage in stages}), json.dumps(state or {}), None, now, now),
+        )
+        connection.commit()
+    return get_job(job_id)
+
+def get_job(job_id: str) -> dict:
+    """
+    Looks up a job by its id.
+
+    Args:
+        job_id (str): The job id.
+
+    Returns:
+        dict: The job record, or None if no such job exists.
+    """
+    with _lock:
+        row = _get_connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+def update_job(job_id: str, status: str = None, stages: dict = None, state: dict = None, error: str = None):
+    """
+    Updates the given fields of a job record, leaving the others untouched.
+
+    Args:
+        job_id (str): The job id.
+        status (str, optional): New job status ("queued", "running", "completed" or "failed").
+        stages (dict, optional): Per-stage progress, mapping stage name to its status.
+        state (dict, optional): Pipeline outputs produced so far.
+        error (str, optional): Error message for failed jobs.
+    """
+    fields = {"updated_at": time.time()}
+    if status is not None:
+        fields["status"] = status
+    if stages is not None:
+        fields["stages"] = json.dumps(stages)
+    if state is not None:
+        fields["state"] = json.dumps(state)
+    if error is not None:
+        fields["error"] = error
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with _lock:
+        connection = _get_connection()
+        connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        connection.commit()
+
+def list_unfinished_jobs() -> list:
+    """
+    Lists jobs that were queued or running, oldest first.
+
+    Returns:
+        list: Job records that have not completed or failed.
+    """
+    with _lock:
+        rows = _get_connection().execute(
+            "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+        ).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+def close_job_store():
+    """Closes the job database connection."""
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection = None
@@ -0,0 +1,86 @@
+import copy
+import json
+import os
+
+# Machine profile used when a request doesn't name one
+MACHINE_PROFILE = os.getenv("MACHINE_PROFILE", "default")
+
+# Optional JSON file with extra profiles, keyed by name; each entry overrides the "default" profile
+MACHINE_PROFILES_FILE = os.getenv("MACHINE_PROFILES_FILE")
+
+# Built-in profiles. Lengths are in millimetres, feed rates in millimetres per minute and
+# acceleration in millimetres per second squared.
+MACHINE_PROFILES = {
+    # Pen plotter that lifts the pen on the Z axis
+    "default": {
+        "bed_width": 300.0,
+        "bed_height": 200.0,
+        "margin": 10.0,
+        "units": "mm",
+        "origin": "bottom-left",
+        "flip_y": True,
+        "scale_to_fit": True,
+        "pen_up": ["G0 Z5"],
+        "pen_down": ["G1 Z0 F1000"],
+        "draw_feed": 3000.0,
+        "travel_feed": None,
+        # Feed rate of G0 rapids and the cornering tolerance, used to estimate plot time
+        "rapid_feed": 6000.0,
+        "acceleration": 500.0,
+        "junction_deviation": 0.01,
+        "precision": 3,
+        "header": [],
+        "footer": ["G0 X0 Y0"],
+    },
+    # GRBL-style pen plotter with a servo lift driven by the spindle commands
+    "servo": {
+        "pen_up": ["M3 S30", "G4 P0.15"],
+        "pen_down": ["M3 S90", "G4 P0.15"],
+        "footer": ["M5", "G0 X0 Y0"],
+    },
+    # A4 landscape drawing area, e.g. for desktop pen plotters
+    "a4": {
+        "bed_width": 297.0,
+        "bed_height": 210.0,
+        "draw_feed": 2400.0,
+    },
+}
+
+def _load_profiles() -> dict:
+    """Merges the built-in profiles with the ones from MACHINE_PROFILES_FILE."""
+    profiles = copy.deepcopy(MACHINE_PROFILES)
+    if MACHINE_PROFILES_FILE and os.path.exists(MACHINE_PROFILES_FILE):
+        with open(MACHINE_PROFILES_FILE) as profiles_file:
+            profiles.update(json.load(profiles_file))
+    return profiles
+
+def list_machine_profiles() -> list:
+    """
+    Lists the names of the available machine profiles.
+
+    Returns:
+        list: Profile names.
+    """
+    return sorted(_load_profiles())
+
+def get_machine_profile(name: str = None) -> dict:
+    """
+    Looks up a machine profile, filling in unspecified settings from the "default" profile.
+
+    Args:
+        name (str, optional): The profile name. Defaults to the MACHINE_PROFILE setting.
+
+    Returns:
+        dict: The complete profile, including its name.
+
+    Raises:
+        ValueError: If no profile has the given name.
+    """
+    name = name or MACHINE_PROFILE
+    profiles = _load_profiles()
+    if name not in profiles:
+        raise ValueError(f"Unknown machine profile '{name}'. Available profiles: {', '.join(sorted(profiles))}")
+    profile = copy.deepcopy(profiles["default"])
+    profile.update(profiles[name])
+    profile["name"] = name
+    return profile
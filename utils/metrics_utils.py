@@ -0,0 +1,177 @@
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets for durations in seconds
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Histogram buckets for sizes: bytes, path counts and G-code lines
+SIZE_BUCKETS = (10, 100, 1000, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8)
+
+# Help text of every metric, which also fixes their order in /metrics
+METRIC_HELP = {
+    "http_requests_total": "HTTP requests by route, method and status code.",
+    "http_request_duration_seconds": "Time to produce the HTTP response headers, by route.",
+    "stage_duration_seconds": "Duration of pipeline stages, including time waiting for a concurrency slot.",
+    "stage_errors_total": "Pipeline stages that raised an error.",
+    "provider_request_duration_seconds": "Duration of calls to external providers, including retries.",
+    "provider_requests_total": "Calls to external providers by outcome (ok or error).",
+    "image_bytes": "Size of generated PNG images.",
+    "svg_bytes": "Size of traced SVG files.",
+    "svg_path_count": "Number of paths converted to G-code per drawing.",
+    "gcode_line_count": "Number of line moves in generated G-code.",
+    "archive_bytes": "Size of streamed ZIP archives.",
+    "image_derivative_duration_seconds": "Time to decode generated images and to encode each thumbnail, preview and toolpath preview.",
+    "admission_wait_seconds": "Time generation requests waited for an admission slot.",
+    "admission_rejected_total": "Generation requests turned away with 429, by reason (queue_full or timeout).",
+    "generation_requests_total": "Generation requests that led a pipeline run, joined an identical one in flight (coalesced) or asked for a fresh variant.",
+}
+
+# Correlation id of the request being handled, attached to every log record
+correlation_id = contextvars.ContextVar("correlation_id", default="-")
+
+# Stage durations of the request being handled, logged when it completes
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((labels or {}).items()))
+
+def increment(name: str, labels: dict = None, value: float = 1):
+    """
+    Adds to a counter.
+
+    Args:
+        name (str): The metric name, listed in METRIC_HELP.
+        labels (dict, optional): Label names and values.
+        value (float): Amount to add.
+    """
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, value: float, labels: dict = None, buckets: tuple = DURATION_BUCKETS):
+    """
+    Records a value in a histogram.
+
+    Args:
+        name (str): The metric name, listed in METRIC_HELP.
+        value (float): The observed value.
+        labels (dict, optional): Label names and values.
+        buckets (tuple): Upper bounds of the histogram buckets, fixed on first use.
+    """
+    key = (name, _label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for index, bound in enumerate(histogram["buckets"]):
+            if value <= bound:
+                histogram["counts"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+@contextmanager
+def time_stage(stage: str):
+    """
+    Times a pipeline stage, recording its duration and whether it failed, and adding it to
+    the timings logged for the current request.
+
+    Args:
+        stage (str): The stage name.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        increment("stage_errors_total", {"stage": stage})
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("stage_duration_seconds", elapsed, {"stage": stage})
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0) + elapsed, 4)
+
+def record_provider_call(provider: str, elapsed: float, ok: bool):
+    """
+    Records one call to an external provider.
+
+    Args:
+        provider (str): The provider, e.g. "openai-chat", "openai-images" or "convertio".
+        elapsed (float): Duration of the call in seconds, including retries.
+        ok (bool): Whether the call succeeded.
+    """
+    observe("provider_request_duration_seconds", elapsed, {"provider": provider})
+    increment("provider_requests_total", {"provider": provider, "outcome": "ok" if ok else "error"})
+
+def start_request(request_id: str) -> dict:
+    """
+    Binds a correlation id to the current request's context, and starts collecting its
+    stage timings. Tasks started while handling the request inherit both.
+
+    Args:
+        request_id (str): The correlation id.
+
+    Returns:
+        dict: The stage timings, filled in as the request's stages complete.
+    """
+    correlation_id.set(request_id)
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+class CorrelationIdFilter(logging.Filter):
+    """Adds the current correlation id to log records as %(correlation_id)s."""
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def render_metrics(extra_counters: dict = None) -> str:
+    """
+    Renders all metrics in the Prometheus text exposition format.
+
+    Args:
+        extra_counters (dict, optional): Counters kept elsewhere, as
+            {name: (help, {label tuple: value})}.
+
+    Returns:
+        str: The metrics page.
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: {**value, "counts": list(value["counts"])} for key, value in _histograms.items()}
+
+    lines = []
+    for name, help_text in METRIC_HELP.items():
+        counter_series = sorted((labels, value) for (metric, labels), value in counters.items() if metric == name)
+        histogram_series = sorted((labels, value) for (metric, labels), value in histograms.items() if metric == name)
+        if counter_series:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in counter_series]
+        if histogram_series:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for labels, histogram in histogram_series:
+                for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+
+    for name, (help_text, series) in (extra_counters or {}).items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in sorted(series.items())]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,147 @@
+import os
+import time
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Path ordering settings
+PATH_ORDER_WINDOW = int(os.getenv("PATH_ORDER_WINDOW", 32))
+PATH_ORDER_PASSES = int(os.getenv("PATH_ORDER_PASSES", 3))
+PATH_ORDER_TIME_LIMIT = float(os.getenv("PATH_ORDER_TIME_LIMIT", 2.0))
+
+def travel_distance(starts: np.ndarray, ends: np.ndarray, order: np.ndarray, reverse: np.ndarray, origin=(0.0, 0.0)) -> float:
+    """
+    Computes the total pen-up travel needed to draw paths in the given order.
+
+    Args:
+        starts (np.ndarray): (N, 2) start points of the paths.
+        ends (np.ndarray): (N, 2) end points of the paths.
+        order (np.ndarray): (N,) indices of the paths in drawing order.
+        reverse (np.ndarray): (N,) booleans, True where a path is drawn end to start.
+        origin (tuple): Pen position before the first path.
+
+    Returns:
+        float: The summed length of the rapid moves between paths.
+    """
+    if len(order) == 0:
+        return 0.0
+    entry = np.where(reverse[:, None], ends, starts)[order]
+    exit_ = np.where(reverse[:, None], starts, ends)[order]
+    previous = np.vstack([np.asarray(origin, dtype=float)[None, :], exit_[:-1]])
+    return float(np.hypot(*(entry - previous).T).sum())
+
+def _nearest_neighbour(starts: np.ndarray, ends: np.ndarray, origin) -> tuple:
+    """
+    Builds a greedy tour: from the current pen position, draw the closest undrawn path,
+    entering it from whichever endpoint is nearer. Endpoints are looked up in a KD-tree
+    that is rebuilt once half of its entries belong to drawn paths.
+    """
+    count = len(starts)
+    drawn = np.zeros(count, dtype=bool)
+    order = np.empty(count, dtype=np.int64)
+    reverse = np.zeros(count, dtype=bool)
+
+    # Endpoint k belongs to path k % count and is an end point when k >= count
+    endpoints = np.vstack([starts, ends])
+    endpoint_ids = np.arange(2 * count)
+    tree = cKDTree(endpoints)
+    stale = 0
+
+    position = np.asarray(origin, dtype=float)
+    for step in range(count):
+        k = min(8, len(endpoint_ids))
+        while True:
+            _, found = tree.query(position, k=k)
+            found = np.atleast_1d(found)
+            candidates = endpoint_ids[found[found < len(endpoint_ids)]]
+            undrawn = candidates[~drawn[candidates % count]]
+            if len(undrawn) or k >= len(endpoint_ids):
+                break
+            k = min(k * 4, len(endpoint_ids))
+
+        endpoint = undrawn[0]
+        path = endpoint % count
+        drawn[path] = True
+        order[step] = path
+        reverse[path] = endpoint >= count
+        position = starts[path] if reverse[path] else ends[path]
+
+        stale += 2
+        if stale * 2 > len(endpoint_ids) and step < count - 1:
+            endpoint_ids = endpoint_ids[~drawn[endpoint_ids % count]]
+            tree = cKDTree(endpoints[endpoint_ids])
+            stale = 0
+    return order, reverse
+
+def _two_opt(starts, ends, order, reverse, origin, window, passes, deadline) -> tuple:
+    """
+    Improves a tour with windowed 2-opt moves. Reversing the run of paths between two
+    positions also flips the direction of every path in it, which is free for a plotter.
+    """
+    entry = np.where(reverse[:, None], ends, starts)[order]
+    exit_ = np.where(reverse[:, None], starts, ends)[order]
+    order = order.copy()
+    flipped = reverse[order].copy()
+    count = len(order)
+    origin = np.asarray(origin, dtype=float)
+
+    for _ in range(passes):
+        improved = False
+        for i in range(count - 1):
+            if time.monotonic() > deadline:
+                break
+            before = exit_[i - 1] if i > 0 else origin
+            last = min(i + window, count - 1)
+            j = np.arange(i + 1, last + 1)
+
+            # Replace edges (before -> entry[i]) and (exit[j] -> entry[j + 1])
+            # with (before -> exit[j]) and (entry[i] -> entry[j + 1])
+            removed = np.hypot(*(entry[i] - before)) + np.hypot(*(entry[np.minimum(j + 1, count - 1)] - exit_[j]).T)
+            added = np.hypot(*(exit_[j] - before).T) + np.hypot(*(entry[np.minimum(j + 1, count - 1)] - entry[i]).T)
+            at_end = j == count - 1
+            removed = np.where(at_end, np.hypot(*(entry[i] - before)), removed)
+            added = np.where(at_end, np.hypot(*(exit_[j] - before).T), added)
+
+            gain = removed - added
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-9:
+                stop = j[best] + 1
+                entry[i:stop], exit_[i:stop] = exit_[i:stop][::-1].copy(), entry[i:stop][::-1].copy()
+                order[i:stop] = order[i:stop][::-1]
+                flipped[i:stop] = ~flipped[i:stop][::-1]
+                improved = True
+        if not improved or time.monotonic() > deadline:
+            break
+
+    reverse = np.zeros(len(order), dtype=bool)
+    reverse[order] = flipped
+    return order, reverse
+
+def order_paths(starts: np.ndarray, ends: np.ndarray, origin=(0.0, 0.0), window: int = PATH_ORDER_WINDOW, passes: int = PATH_ORDER_PASSES, time_limit: float = PATH_ORDER_TIME_LIMIT) -> tuple:
+    """
+    Orders paths to minimize pen-up travel, allowing any path to be drawn in reverse.
+
+    A nearest-neighbour tour seeded at the origin is improved with windowed 2-opt moves
+    until no move helps, the pass limit is reached or the time limit runs out.
+
+    Args:
+        starts (np.ndarray): (N, 2) start points of the paths.
+        ends (np.ndarray): (N, 2) end points of the paths.
+        origin (tuple): Pen position before the first path.
+        window (int): How many positions ahead 2-opt looks for a better reconnection.
+        passes (int): Maximum number of 2-opt passes over the tour.
+        time_limit (float): Maximum time in seconds spent on 2-opt.
+
+    Returns:
+        tuple: (order, reverse), the path indices in drawing order and a boolean per path
+        that is True where the path should be drawn end to start.
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    if not len(starts):
+        return np.arange(0), np.zeros(0, dtype=bool)
+
+    order, reverse = _nearest_neighbour(starts, ends, origin)
+    if len(starts) > 1 and window > 0 and passes > 0:
+        deadline = time.monotonic() + time_limit
+        order, reverse = _two_opt(starts, ends, order, reverse, origin, window, passes, deadline)
+    return order, reverse
@@ -0,0 +1,263 @@
+import asyncio
+import os
+import uuid
+from utils.gpt_utils import FALLBACK_PROMPT, PROMPT_MODEL, generate_prompt_from_chatgpt
+from utils.dalle_utils import IMAGE_MODEL, IMAGE_QUALITY
+from utils.app_utils import generate_image, create_image_folder, convert_image_to_svg, convert_svg_to_gcode, write_file
+from utils.cache_utils import cache_key, cache_get, cache_put, cache_get_json, cache_put_json, cache_get_file, cache_put_file, data_digest, file_digest, normalize_concept
+from utils.compression_utils import create_image_derivatives, render_toolpath_preview
+from utils.machine_profiles import get_machine_profile
+from utils.metrics_utils import SIZE_BUCKETS, observe, time_stage
+from utils.rate_limit_utils import get_rate_limiter
+from utils.retention_utils import record_artifact
+from utils.worker_utils import run_in_worker
+from utils import conversion_prep_utils, converter_utils, svg_to_gcode_utils, vectorizer_utils
+
+# Base directory to store generated assets
+BASE_FOLDER = "tmp/static"
+
+# Pipeline stages, in execution order
+STAGES = ["prompt", "image", "thumbnail", "svg", "gcode"]
+
+# Maximum number of concurrent calls per external stage
+STAGE_CONCURRENCY = {
+    "prompt": int(os.getenv("PROMPT_CONCURRENCY", 4)),
+    "image": int(os.getenv("IMAGE_CONCURRENCY", 2)),
+    "svg": int(os.getenv("SVG_CONCURRENCY", 2)),
+}
+
+_stage_semaphores = {}
+
+class PipelineError(Exception):
+    """Raised when a pipeline stage fails."""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
+
+def _stage_slot(stage: str):
+    """Returns the semaphore limiting concurrency for a stage, or None if it is unlimited."""
+    limit = STAGE_CONCURRENCY.get(stage)
+    if not limit:
+        return None
+    if stage not in _stage_semaphores:
+        _stage_semaphores[stage] = asyncio.Semaphore(limit)
+    return _stage_semaphores[stage]
+
+async def _run_stage(stage, state, on_stage, func, *args, **kwargs):
+    """Runs a single stage under its concurrency and rate limits, reporting progress through on_stage."""
+    if on_stage:
+        await on_stage(stage, "running", state)
+    slot = _stage_slot(stage)
+    limiter = get_rate_limiter(stage)
+    with time_stage(stage):
+        if slot is None:
+            if limiter:
+                await limiter.acquire()
+            result = await func(*args, **kwargs)
+        else:
+            async with slot:
+                if limiter:
+                    await limiter.acquire()
+                result = await func(*args, **kwargs)
+    return result
+
+async def _report_done(stage, state, on_stage):
+    if on_stage:
+        await on_stage(stage, "done", state)
+
+def _svg_cache_key(image_digest: str) -> str:
+    """Cache key for the SVG traced from an image, covering the vectorizer, preprocessing and their settings."""
+    return cache_key(
+        "svg", image_digest, converter_utils.VECTORIZER, vectorizer_utils.VECTORIZER_TOLERANCE, vectorizer_utils.VECTORIZER_MIN_PERIMETER,
+        conversion_prep_utils.PREPROCESS_THRESHOLD, conversion_prep_utils.PREPROCESS_BLOCK_SIZE, conversion_prep_utils.PREPROCESS_OFFSET,
+        conversion_prep_utils.PREPROCESS_OPEN_RADIUS, conversion_prep_utils.PREPROCESS_CLOSE_RADIUS,
+        conversion_prep_utils.PREPROCESS_MIN_SPECK_AREA, conversion_prep_utils.PREPROCESS_MAX_HOLE_AREA, conversion_prep_utils.PREPROCESS_THIN,
+    )
+
+def _gcode_cache_key(svg_digest: str, profile: dict) -> str:
+    """Cache key for the G-code derived from an SVG, covering the machine profile and conversion settings."""
+    return cache_key(
+        "gcode", svg_digest, profile, svg_to_gcode_utils.OPTIMIZE_TRAVEL, svg_to_gcode_utils.GCODE_CURVE_TOLERANCE,
+        svg_to_gcode_utils.GCODE_ARC_FITTING, svg_to_gcode_utils.GCODE_SIMPLIFY, svg_to_gcode_utils.GCODE_SIMPLIFY_TOLERANCE,
+    )
+
+def _save_image(image_path: str, image_data: bytes, image_key: str = None) -> str:
+    """Writes a generated image to disk and, when given a cache key, to the cache."""
+    write_file(image_path, image_data)
+    if image_key:
+        cache_put("image", image_key, image_data)
+    return image_path
+
+def _completed(state: dict, key: str) -> bool:
+    """Checks whether a stage output recorded in the state is still available."""
+    value = state.get(key)
+    if not value:
+        return False
+    if key.endswith("_path"):
+        return os.path.exists(value)
+    return True
+
+async def _run_prompt_stage(concept: str, state: dict, on_stage):
+    """Fills in state["prompt"] from the cache or ChatGPT, unless it is already there."""
+    if not _completed(state, "prompt"):
+        prompt_key = cache_key("prompt", normalize_concept(concept), PROMPT_MODEL)
+        prompt = await run_in_worker(cache_get, "prompt", prompt_key)
+        if prompt is not None:
+            state["prompt"] = prompt.decode("utf-8")
+            state["cache_hits"].append("prompt")
+        else:
+            state["prompt"] = await _run_stage("prompt", state, on_stage, generate_prompt_from_chatgpt, concept)
+            if state["prompt"] and state["prompt"] != FALLBACK_PROMPT:
+                await run_in_worker(cache_put, "prompt", prompt_key, state["prompt"].encode("utf-8"))
+    await _report_done("prompt", state, on_stage)
+
+async def generate_prompt(concept: str) -> dict:
+    """
+    Runs only the prompt stage, so that several pipelines for the same concept can share it.
+
+    Args:
+        concept (str): The concept provided by the user.
+
+    Returns:
+        dict: A pipeline state holding the prompt, to be passed to run_generation_pipeline.
+    """
+    state = {"concept": concept, "cache_hits": []}
+    await _run_prompt_stage(concept, state, None)
+    return state
+
+async def run_generation_pipeline(concept: str, state: dict = None, on_stage=None, machine_profile: str = None, variant: int = 0, fresh: bool = False) -> dict:
+    """
+    Runs the full generation pipeline for a concept: prompt, image, thumbnail and previews,
+    SVG, and G-code with a rasterized preview of its toolpath.
+    The ZIP of all outputs is assembled on download rather than here.
+
+    Prompts, images, SVGs and G-code are looked up in the content-addressed cache before
+    being generated, and the stages served from it are listed under "cache_hits".
+
+    Args:
+        concept (str): The concept provided by the user.
+        state (dict, optional): Outputs of a previous partial run. Stages whose outputs are
+            still present are skipped, so interrupted runs can be resumed.
+        on_stage (callable, optional): Async callback invoked as on_stage(stage, status, state)
+            when a stage starts ("running") or finishes ("done").
+        machine_profile (str, optional): Name of the machine profile to generate G-code for.
+            Defaults to the profile recorded in the state, then the MACHINE_PROFILE setting.
+        variant (int, optional): Which of several images generated from the same prompt this
+            run produces. Each variant is generated and cached separately.
+        fresh (bool, optional): Generate a new image rather than reusing a cached one. Its
+            image, SVG and G-code are not cached, since no later request can look them up.
+
+    Returns:
+        dict: The pipeline state holding the prompt and the paths of all generated files.
+
+    Raises:
+        PipelineError: If any stage fails.
+        ValueError: If the machine profile is unknown.
+    """
+    state = dict(state or {})
+    state["concept"] = concept
+    profile = get_machine_profile(machine_profile or state.get("machine_profile"))
+    state["machine_profile"] = profile["name"]
+    cache_hits = state.setdefault("cache_hits", [])
+
+    # Step 1: Generate a detailed prompt from ChatGPT
+    await _run_prompt_stage(concept, state, on_stage)
+
+    # Create a unique output folder using UUID
+    if not state.get("output_folder"):
+        state["output_folder"] = os.path.join(BASE_FOLDER, str(uuid.uuid4()))
+    output_folder = state["output_folder"]
+    await run_in_worker(os.makedirs, output_folder, exist_ok=True)
+    await run_in_worker(record_artifact, output_folder)
+
+    # Step 2: Generate the image, keeping it in memory for the thumbnail and SVG stages
+    image_data, image_saved, image_from_cache = None, None, False
+    if not _completed(state, "image_path"):
+        image_key = None if fresh else cache_key("image", state["prompt"], IMAGE_MODEL, IMAGE_QUALITY, *([variant] if variant else []))
+        image_data = await run_in_worker(cache_get, "image", image_key) if image_key else None
+        image_from_cache = image_data is not None
+        if image_from_cache:
+            cache_hits.append("image")
+        else:
+            image_data = await _run_stage("image", state, on_stage, generate_image, state["prompt"])
+            if not image_data:
+                raise PipelineError("image", "Failed to generate image.")
+            observe("image_bytes", len(image_data), buckets=SIZE_BUCKETS)
+        # Write the image to disk (and the cache) in the background while it is processed from memory
+        image_path = os.path.join(await run_in_worker(create_image_folder, output_folder, concept), "generated.png")
+        image_saved = asyncio.ensure_future(run_in_worker(_save_image, image_path, image_data, None if image_from_cache else image_key))
+    else:
+        image_path = state["image_path"]
+
+    try:
+        await _report_done("image", state, on_stage)
+
+        # Step 3: Create the thumbnail and previews of the image, decoding it once for all of them
+        if not _completed(state, "thumbnail_path"):
+            derivatives = await _run_stage("thumbnail", state, on_stage, create_image_derivatives, image_data or image_path, output_folder)
+            if not derivatives:
+                raise PipelineError("thumbnail", "Thumbnail generation failed.")
+            state["thumbnail_path"] = derivatives["thumbnail"]["path"]
+            state["derivatives"] = derivatives
+        await _report_done("thumbnail", state, on_stage)
+
+        # Step 4: Convert the image to SVG
+        if not _completed(state, "svg_path"):
+            if image_data is not None:
+                image_digest = await run_in_worker(data_digest, image_data)
+            else:
+                image_digest = await run_in_worker(file_digest, image_path)
+            svg_key = _svg_cache_key(image_digest)
+            svg_path = os.path.join(output_folder, "generated.svg")
+            if await run_in_worker(cache_get_file, "svg", svg_key, svg_path):
+                cache_hits.append("svg")
+            else:
+                svg_path = await _run_stage("svg", state, on_stage, convert_image_to_svg, image_data or image_path, output_folder)
+                if not svg_path:
+                    raise PipelineError("svg", "SVG conversion failed.")
+                observe("svg_bytes", os.path.getsize(svg_path), buckets=SIZE_BUCKETS)
+                if not fresh:
+                    await run_in_worker(cache_put_file, "svg", svg_key, svg_path)
+            state["svg_path"] = svg_path
+        await _report_done("svg", state, on_stage)
+    finally:
+        # Let the image write finish even when a stage failed, so it can't race the cleanup
+        # of a failed generation and its outcome is always retrieved
+        if image_saved is not None:
+            await asyncio.gather(image_saved, return_exceptions=True)
+
+    # The image must be on disk before the state refers to it
+    if image_saved is not None:
+        try:
+            state["image_path"] = image_saved.result()
+        except OSError as e:
+            raise PipelineError("image", f"Failed to save image: {e}")
+
+    # Step 5: Convert the SVG to G-code
+    if not _completed(state, "gcode_path"):
+        gcode_key = _gcode_cache_key(await run_in_worker(file_digest, state["svg_path"]), profile)
+        gcode_path = os.path.join(output_folder, "generated.gcode")
+        gcode_stats = await run_in_worker(cache_get_json, "gcode_stats", gcode_key)
+        if gcode_stats is not None and await run_in_worker(cache_get_file, "gcode", gcode_key, gcode_path):
+            cache_hits.append("gcode")
+        else:
+            gcode_path, gcode_stats = await _run_stage("gcode", state, on_stage, convert_svg_to_gcode, state["svg_path"], output_folder, profile)
+            if not gcode_path:
+                raise PipelineError("gcode", "G-code conversion failed.")
+            observe("svg_path_count", gcode_stats["path_count"], buckets=SIZE_BUCKETS)
+            observe("gcode_line_count", gcode_stats["line_count"], buckets=SIZE_BUCKETS)
+            if not fresh:
+                await run_in_worker(cache_put_file, "gcode", gcode_key, gcode_path)
+                await run_in_worker(cache_put_json, "gcode_stats", gcode_key, gcode_stats)
+        state["gcode_path"] = gcode_path
+        state["gcode_stats"] = gcode_stats
+
+    # Rasterize the toolpath for previewing; the G-code is usable without it, so failures aren't fatal
+    if not _completed(state, "toolpath_preview_path"):
+        state["toolpath_preview_path"] = await run_in_worker(render_toolpath_preview, state["gcode_path"], profile, os.path.join(output_folder, "toolpath_preview.png"))
+    await _report_done("gcode", state, on_stage)
+
+    # Record the final size of the outputs for the retention sweeper
+    await run_in_worker(record_artifact, output_folder)
+    return state
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import time
+
+# Requests per minute allowed to each OpenAI endpoint, matching the account's rate limits (0 disables throttling)
+STAGE_RATE_LIMITS = {
+    "prompt": float(os.getenv("PROMPT_RATE_LIMIT", 500)),
+    "image": float(os.getenv("IMAGE_RATE_LIMIT", 7)),
+}
+
+_buckets = {}
+
+class TokenBucket:
+    """
+    Token bucket throttling calls to a steady rate while allowing short bursts.
+
+    The bucket holds up to `capacity` tokens and refills at `rate_per_minute`. Each call
+    takes one token, waiting for the refill when the bucket is empty. Waiters are served
+    in arrival order.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Takes a token, sleeping until one is available."""
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+def get_rate_limiter(stage: str):
+    """
+    Returns the token bucket throttling a stage, or None if the stage isn't rate limited.
+
+    Args:
+        stage (str): The pipeline stage, e.g. "prompt" or "image".
+
+    Returns:
+        TokenBucket: The stage's bucket, shared by every pipeline in the process.
+    """
+    rate = STAGE_RATE_LIMITS.get(stage)
+    if not rate:
+        return None
+    if stage not in _buckets:
+        _buckets[stage] = TokenBucket(rate)
+    return _buckets[stage]
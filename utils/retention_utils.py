@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from utils.job_store import list_unfinished_jobs
+from utils.worker_utils import run_in_worker
+
+logger = logging.getLogger(__name__)
+
+# Manifest of generated artifact folders, so cleanup never has to walk tmp/static
+RETENTION_DB_PATH = os.getenv("RETENTION_DB_PATH", "tmp/artifacts.sqlite3")
+
+# Folder holding one uuid folder per generation
+ARTIFACT_ROOT = "tmp/static"
+
+# Generations not downloaded for ARTIFACT_TTL seconds are deleted, and the least recently
+# used ones are deleted while all generations together exceed ARTIFACT_MAX_BYTES
+ARTIFACT_TTL = float(os.getenv("ARTIFACT_TTL", 3 * 24 * 3600))
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", 2 * 1024 ** 3))
+
+# Seconds between sweeps, and the minimum interval between recorded accesses of one folder
+RETENTION_SWEEP_INTERVAL = float(os.getenv("RETENTION_SWEEP_INTERVAL", 600))
+ACCESS_RESOLUTION = 60
+
+# Scratch folders used by the converters; files left there are removed once older than ARTIFACT_TTL
+INTERMEDIATE_FOLDERS = ["tmp/static/converted", "tmp/staticgcode"]
+
+_connection = None
+_lock = threading.Lock()
+_sweeper = None
+
+def _get_connection() -> sqlite3.Connection:
+    """Opens the manifest database on first use and creates the artifacts table if needed."""
+    global _connection
+    if _connection is None:
+        directory = os.path.dirname(RETENTION_DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _connection = sqlite3.connect(RETENTION_DB_PATH, check_same_thread=False)
+        _connection.row_factory = sqlite3.Row
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                folder TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        _connection.execute("CREATE INDEX IF NOT EXISTS artifacts_last_access ON artifacts (last_access)")
+        _connection.commit()
+    return _connection
+
+def _folder_id(relative_path: str) -> str:
+    """Returns the generation folder (uuid) a path relative to ARTIFACT_ROOT belongs to, or None."""
+    first = relative_path.replace("\\", "/").lstrip("/").split("/", 1)[0]
+    try:
+        uuid.UUID(first)
+    except ValueError:
+        return None
+    return first
+
+def _folder_size(folder: str) -> int:
+    size = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return size
+
+def record_artifact(output_folder: str):
+    """
+    Adds a generation's output folder to the manifest, or refreshes its size and last access.
+
+    Args:
+        output_folder (str): The generation's folder under ARTIFACT_ROOT.
+    """
+    folder = _folder_id(os.path.relpath(output_folder, ARTIFACT_ROOT))
+    if folder is None:
+        return
+    size = _folder_size(os.path.join(ARTIFACT_ROOT, folder))
+    now = time.time()
+    with _lock:
+        connection = _get_connection()
+        connection.execute(
+            "INSERT INTO artifacts (folder, size, created_at, last_access) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(folder) DO UPDATE SET size = excluded.size, last_access = excluded.last_access",
+            (folder, size, now, now),
+        )
+        connection.commit()
+
+def touch_artifact(relative_path: str):
+    """
+    Records that a generation's files were accessed. Accesses within ACCESS_RESOLUTION
+    seconds of the last recorded one are not written.
+
+    Args:
+        relative_path (str): A path relative to ARTIFACT_ROOT, e.g. "<uuid>/generated.gcode".
+    """
+    folder = _folder_id(relative_path)
+    if folder is None:
+        return
+    now = time.time()
+    with _lock:
+        connection = _get_connection()
+        connection.execute(
+            "UPDATE artifacts SET last_access = ? WHERE folder = ? AND last_access < ?",
+            (now, folder, now - ACCESS_RESOLUTION),
+        )
+        connection.commit()
+
+def index_untracked_artifacts() -> int:
+    """
+    Adds generation folders missing from the manifest, such as ones written before it
+    existed, using their modification time as the last access. Only the top level of
+    ARTIFACT_ROOT is listed.
+
+    Returns:
+        int: The number of folders added.
+    """
+    if not os.path.isdir(ARTIFACT_ROOT):
+        return 0
+    with _lock:
+        known = {row["folder"] for row in _get_connection().execute("SELECT folder FROM artifacts")}
+    rows = []
+    for entry in os.scandir(ARTIFACT_ROOT):
+        if entry.is_dir() and entry.name not in known and _folder_id(entry.name):
+            modified = entry.stat().st_mtime
+            rows.append((entry.name, _folder_size(entry.path), modified, modified))
+    if rows:
+        with _lock:
+            connection = _get_connection()
+            connection.executemany("INSERT OR IGNORE INTO artifacts (folder, size, created_at, last_access) VALUES (?, ?, ?, ?)", rows)
+            connection.commit()
+    return len(rows)
+
+def _remove_intermediates(expires: float) -> int:
+    removed = 0
+    for folder in INTERMEDIATE_FOLDERS:
+        if not os.path.isdir(folder):
+            continue
+        for entry in os.scandir(folder):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < expires:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
+
+def sweep_artifacts(protected: set = frozenset()) -> int:
+    """
+    Deletes generations whose last access is older than ARTIFACT_TTL, then the least
+    recently used ones until the total size fits ARTIFACT_MAX_BYTES, along with stale
+    converter scratch files.
+
+    Args:
+        protected (set): Folder ids that must be kept, e.g. those of unfinished jobs.
+
+    Returns:
+        int: The number of generation folders deleted.
+    """
+    now = time.time()
+    expires = now - ARTIFACT_TTL
+    with _lock:
+        connection = _get_connection()
+        rows = connection.execute("SELECT folder, size, last_access FROM artifacts ORDER BY last_access").fetchall()
+    total = sum(row["size"] for row in rows)
+
+    evicted = []
+    for row in rows:
+        if row["last_access"] >= expires and total <= ARTIFACT_MAX_BYTES:
+            break
+        if row["folder"] in protected:
+            continue
+        shutil.rmtree(os.path.join(ARTIFACT_ROOT, row["folder"]), ignore_errors=True)
+        evicted.append((row["folder"],))
+        total -= row["size"]
+
+    if evicted:
+        with _lock:
+            connection = _get_connection()
+            connection.executemany("DELETE FROM artifacts WHERE folder = ?", evicted)
+            connection.commit()
+    removed_intermediates = _remove_intermediates(expires)
+    if evicted or removed_intermediates:
+        logger.info(f"Retention sweep removed {len(evicted)} generations and {removed_intermediates} intermediate files")
+    return len(evicted)
+
+def _protected_folders() -> set:
+    """Folder ids of queued or running jobs, which must survive a sweep."""
+    return {
+        _folder_id(os.path.relpath(job["state"]["output_folder"], ARTIFACT_ROOT))
+        for job in list_unfinished_jobs()
+        if job["state"].get("output_folder")
+    }
+
+async def _sweep_periodically():
+    await run_in_worker(index_untracked_artifacts)
+    while True:
+        try:
+            await run_in_worker(sweep_artifacts, _protected_folders())
+        except Exception as e:
+            logger.error(f"Retention sweep failed: {e}")
+        await asyncio.sleep(RETENTION_SWEEP_INTERVAL)
+
+def start_retention_sweeper():
+    """Starts the background task that indexes and sweeps generated artifacts."""
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = asyncio.create_task(_sweep_periodically())
+
+async def stop_retention_sweeper():
+    """Stops the background sweeper and closes the manifest database."""
+    global _sweeper, _connection
+    if _sweeper is not None:
+        _sweeper.cancel()
+        await asyncio.gather(_sweeper, return_exceptions=True)
+        _sweeper = None
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection = None
@@ -0,0 +1,73 @@
+import asyncio
+from utils.cache_utils import cache_key, normalize_concept
+from utils.machine_profiles import get_machine_profile
+from utils.metrics_utils import increment
+from utils.pipeline_utils import run_generation_pipeline
+
+# Generations currently running, by generation key
+_in_flight = {}
+
+def generation_key(concept: str, machine_profile: str = None) -> str:
+    """
+    Builds the key identifying requests that produce the same generation: the normalized
+    concept and the resolved machine profile.
+
+    Args:
+        concept (str): The concept provided by the user.
+        machine_profile (str, optional): Name of the machine profile.
+
+    Returns:
+        str: The generation key.
+    """
+    return cache_key("generation", normalize_concept(concept), get_machine_profile(machine_profile)["name"])
+
+async def run_once(key: str, factory) -> tuple:
+    """
+    Runs factory() unless a call with the same key is already running, in which case its
+    result (or exception) is shared instead.
+
+    The shared call runs as its own task, so a caller that disconnects doesn't cancel it
+    for the others.
+
+    Args:
+        key (str): Identifies equivalent calls.
+        factory (callable): Returns the coroutine to run.
+
+    Returns:
+        tuple: The result and whether it was shared from a call already in flight.
+    """
+    task = _in_flight.get(key)
+    coalesced = task is not None
+    if not coalesced:
+        task = asyncio.ensure_future(factory())
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task), coalesced
+
+async def run_generation_once(concept: str, machine_profile: str = None, fresh: bool = False) -> tuple:
+    """
+    Runs the generation pipeline for a concept, sharing one run between concurrent
+    identical requests. Requests are counted in the generation_requests_total metric by
+    whether they led a run, joined one or asked for a fresh variant.
+
+    Args:
+        concept (str): The concept provided by the user.
+        machine_profile (str, optional): Name of the machine profile to generate G-code for.
+        fresh (bool): Run separately and generate a new image variant instead of joining an
+            identical request in flight or reusing a cached image.
+
+    Returns:
+        tuple: The pipeline state and whether it was shared with another request.
+
+    Raises:
+        PipelineError: If any stage fails.
+    """
+    if fresh:
+        increment("generation_requests_total", {"coalescing": "fresh"})
+        state = await run_generation_pipeline(concept, machine_profile=machine_profile, fresh=True)
+        return state, False
+
+    key = generation_key(concept, machine_profile)
+    increment("generation_requests_total", {"coalescing": "coalesced" if key in _in_flight else "leader"})
+    state, coalesced = await run_once(key, lambda: run_generation_pipeline(concept, machine_profile=machine_profile))
+    return dict(state), coalesced
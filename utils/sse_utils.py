@@ -0,0 +1,74 @@
+import asyncio
+import json
+import logging
+import os
+from utils.pipeline_utils import run_generation_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Seconds without events after which a comment is sent, so proxies don't close an idle stream
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", 15))
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Formats one server-sent event.
+
+    Args:
+        event (str): The event name.
+        data (dict): The payload, sent as JSON.
+
+    Returns:
+        str: The event in text/event-stream format.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Generation failed after its client disconnected: {task.exception()}")
+
+async def iter_pipeline_events(concept: str, machine_profile: str = None, fresh: bool = False):
+    """
+    Runs the generation pipeline and yields its progress as it happens.
+
+    If the consumer stops listening, the pipeline is left to finish in the background, so
+    that its results land in the cache and a retry of the same concept is served from there.
+
+    Args:
+        concept (str): The concept provided by the user.
+        machine_profile (str, optional): Name of the machine profile to generate G-code for.
+        fresh (bool, optional): Generate a new image rather than reusing a cached one.
+
+    Yields:
+        tuple: (kind, payload). kind is "stage" with payload (stage, status, state) when a
+        stage starts or finishes, "complete" with the final state, "error" with the
+        PipelineError or other exception, or "keepalive" with None when nothing happened
+        for SSE_KEEPALIVE_INTERVAL seconds.
+    """
+    events = asyncio.Queue()
+
+    async def on_stage(stage, status, state):
+        events.put_nowait(("stage", (stage, status, dict(state))))
+
+    task = asyncio.ensure_future(run_generation_pipeline(concept, on_stage=on_stage, machine_profile=machine_profile, fresh=fresh))
+    task.add_done_callback(lambda _: events.put_nowait(("finished", None)))
+    try:
+        while True:
+            try:
+                kind, payload = await asyncio.wait_for(events.get(), SSE_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield "keepalive", None
+                continue
+            if kind == "stage":
+                yield kind, payload
+            elif task.cancelled():
+                yield "error", RuntimeError("The generation was cancelled.")
+                return
+            elif task.exception() is not None:
+                yield "error", task.exception()
+                return
+            else:
+                yield "complete", task.result()
+                return
+    finally:
+        if not task.done():
+            task.add_done_callback(_log_failure)
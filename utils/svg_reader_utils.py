@@ -0,0 +1,337 @@
+import re
+import xml.etree.ElementTree as ElementTree
+from typing import NamedTuple
+import numpy as np
+
+# Segment kinds of a subpath
+SEGMENT_LINE, SEGMENT_QUADRATIC, SEGMENT_CUBIC, SEGMENT_ARC = 0, 1, 2, 3
+
+# Containers whose content is never drawn directly
+SKIPPED_ELEMENTS = {"defs", "clipPath", "mask", "marker", "pattern", "symbol", "metadata", "title", "desc", "style", "script"}
+
+_TOKEN = re.compile(r"[MmZzLlHhVvCcSsQqTtAa]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_TRANSFORM = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+_PATH_COMMANDS = re.compile(r"[A-DF-Za-df-z]")
+
+class SvgSubpath(NamedTuple):
+    """
+    A continuous run of SVG path segments, in user units with all transforms applied.
+
+    points is an (n + 1, 2) array holding the start point followed by the end point of each
+    segment. kinds is an (n,) array of SEGMENT_* codes. controls is None when every segment
+    is a line, otherwise an (n, 5) array holding per segment the control point of a
+    quadratic curve (x, y), the two control points of a cubic curve (x1, y1, x2, y2), or
+    the radii, x-axis rotation in degrees, large-arc and sweep flags of an elliptical arc.
+    """
+    points: np.ndarray
+    kinds: np.ndarray
+    controls: np.ndarray
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def _number(value, default: float = 0.0) -> float:
+    match = _NUMBER.match(value.strip()) if value else None
+    return float(match.group(0)) if match else default
+
+def parse_transform(value: str) -> np.ndarray:
+    """
+    Parses an SVG transform attribute.
+
+    Args:
+        value (str): The transform list, e.g. "translate(10 20) rotate(45)".
+
+    Returns:
+        np.ndarray: The equivalent 3x3 affine matrix.
+    """
+    matrix = np.eye(3)
+    for name, arguments in _TRANSFORM.findall(value or ""):
+        values = [float(number) for number in _NUMBER.findall(arguments)]
+        step = np.eye(3)
+        if name == "matrix" and len(values) == 6:
+            step[:2] = np.array(values).reshape(3, 2).T
+        elif name == "translate" and values:
+            step[:2, 2] = values[0], values[1] if len(values) > 1 else 0.0
+        elif name == "scale" and values:
+            step[0, 0], step[1, 1] = values[0], values[1] if len(values) > 1 else values[0]
+        elif name == "rotate" and values:
+            angle = np.radians(values[0])
+            step[:2, :2] = [[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]]
+            if len(values) == 3:
+                center = np.array(values[1:])
+                step[:2, 2] = center - step[:2, :2] @ center
+        elif name == "skewX" and values:
+            step[0, 1] = np.tan(np.radians(values[0]))
+        elif name == "skewY" and values:
+            step[1, 0] = np.tan(np.radians(values[0]))
+        matrix = matrix @ step
+    return matrix
+
+def _line_subpath(points) -> SvgSubpath:
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    return SvgSubpath(points, np.full(len(points) - 1, SEGMENT_LINE, dtype=np.int8), None)
+
+class _SubpathBuilder:
+    """Collects the segments of one subpath while path data is parsed."""
+
+    def __init__(self, start):
+        self.points = [start]
+        self.kinds = []
+        self.controls = []
+        self.curved = False
+
+    def add(self, kind: int, end, controls=(0.0, 0.0, 0.0, 0.0, 0.0)):
+        self.points.append(end)
+        self.kinds.append(kind)
+        self.controls.append(controls)
+        self.curved = self.curved or kind != SEGMENT_LINE
+
+    def build(self) -> SvgSubpath:
+        return SvgSubpath(
+            np.array(self.points, dtype=float),
+            np.array(self.kinds, dtype=np.int8),
+            np.array(self.controls, dtype=float) if self.curved else None,
+        )
+
+def parse_path_data(d: str) -> list:
+    """
+    Parses the d attribute of a path element into its subpaths.
+
+    Args:
+        d (str): The path data.
+
+    Returns:
+        list: SvgSubpath entries for the subpaths that draw at least one segment.
+    """
+    body = d.strip()
+    closed = body.endswith(("Z", "z"))
+    body = body[:-1] if closed else body
+    if body.startswith("M") and body.count("M") == 1 and set(_PATH_COMMANDS.findall(body)) <= {"M", "L"}:
+        # Fast path for single polylines, such as those written by the local vectorizer
+        values = np.array(_NUMBER.findall(body), dtype=float)
+        points = values[:len(values) // 2 * 2].reshape(-1, 2)
+        if closed and len(points) > 1 and not np.array_equal(points[0], points[-1]):
+            points = np.vstack([points, points[:1]])
+        return [_line_subpath(points)] if len(points) > 1 else []
+
+    tokens = _TOKEN.findall(d)
+    subpaths, builder = [], None
+    current, start = (0.0, 0.0), (0.0, 0.0)
+    last_control, last_command = None, None
+    index, command = 0, None
+
+    def number():
+        nonlocal index
+        value = float(tokens[index])
+        index += 1
+        return value
+
+    def flag():
+        # Arc flags may be written without separators, e.g. "a10 10 0 01 20 0"
+        nonlocal index
+        token = tokens[index]
+        if len(token) > 1 and token[0] in "01":
+            tokens[index] = token[1:]
+        else:
+            index += 1
+        return float(token[0] == "1")
+
+    def finish():
+        nonlocal builder
+        if builder is not None and builder.kinds:
+            subpaths.append(builder.build())
+        builder = None
+
+    def draw(kind, end, controls=(0.0, 0.0, 0.0, 0.0, 0.0)):
+        nonlocal builder, current
+        if builder is None:
+            builder = _SubpathBuilder(current)
+        builder.add(kind, end, controls)
+        current = end
+
+    while index < len(tokens):
+        token = tokens[index]
+        if token.isalpha():
+            command = token
+            index += 1
+        elif command is None:
+            break
+        elif command in "Mm":
+            # Coordinates after a moveto are implicit linetos
+            command = "L" if command == "M" else "l"
+
+        relative = command.islower()
+        name = command.upper()
+        origin = current if relative else (0.0, 0.0)
+        try:
+            if name == "Z":
+                if builder is not None and current != start:
+                    draw(SEGMENT_LINE, start)
+                finish()
+                current = start
+            elif name == "M":
+                finish()
+                current = start = (origin[0] + number(), origin[1] + number())
+            elif name == "L":
+                draw(SEGMENT_LINE, (origin[0] + number(), origin[1] + number()))
+            elif name == "H":
+                draw(SEGMENT_LINE, ((current[0] if relative else 0.0) + number(), current[1]))
+            elif name == "V":
+                draw(SEGMENT_LINE, (current[0], (current[1] if relative else 0.0) + number()))
+            elif name in "CS":
+                if name == "C":
+                    control1 = (origin[0] + number(), origin[1] + number())
+                elif last_command in ("C", "S") and last_control is not None:
+                    control1 = (2 * current[0] - last_control[0], 2 * current[1] - last_control[1])
+                else:
+                    control1 = current
+                control2 = (origin[0] + number(), origin[1] + number())
+                end = (origin[0] + number(), origin[1] + number())
+                draw(SEGMENT_CUBIC, end, (*control1, *control2, 0.0))
+                last_control = control2
+            elif name in "QT":
+                if name == "Q":
+                    control = (origin[0] + number(), origin[1] + number())
+                elif last_command in ("Q", "T") and last_control is not None:
+                    control = (2 * current[0] - last_control[0], 2 * current[1] - last_control[1])
+                else:
+                    control = current
+                end = (origin[0] + number(), origin[1] + number())
+                draw(SEGMENT_QUADRATIC, end, (*control, 0.0, 0.0, 0.0))
+                last_control = control
+            elif name == "A":
+                rx, ry, rotation = abs(number()), abs(number()), number()
+                large_arc, sweep = flag(), flag()
+                end = (origin[0] + number(), origin[1] + number())
+                if end == current:
+                    pass
+                elif rx == 0 or ry == 0:
+                    draw(SEGMENT_LINE, end)
+                else:
+                    draw(SEGMENT_ARC, end, (rx, ry, rotation, large_arc, sweep))
+            else:
+                break
+        except (IndexError, ValueError):
+            # Malformed data: keep what was parsed so far, as browsers do
+            break
+        last_command = name
+        if name == "Z":
+            # Z takes no arguments, so stray numbers after it end the path data
+            command = None
+    finish()
+    return subpaths
+
+def _transform_subpath(subpath: SvgSubpath, matrix: np.ndarray) -> SvgSubpath:
+    """Applies an affine transform to a subpath, mapping elliptical arcs onto their images."""
+    linear, offset = matrix[:2, :2], matrix[:2, 2]
+    points = subpath.points @ linear.T + offset
+    controls = subpath.controls
+    if controls is not None:
+        controls = controls.copy()
+        kinds = subpath.kinds
+        curves = (kinds == SEGMENT_QUADRATIC) | (kinds == SEGMENT_CUBIC)
+        controls[curves, 0:2] = controls[curves, 0:2] @ linear.T + offset
+        cubic = kinds == SEGMENT_CUBIC
+        controls[cubic, 2:4] = controls[cubic, 2:4] @ linear.T + offset
+        mirrored = np.linalg.det(linear) < 0
+        for index in np.flatnonzero(kinds == SEGMENT_ARC):
+            rx, ry, rotation, large_arc, sweep = controls[index]
+            angle = np.radians(rotation)
+            axes = linear @ np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]]) @ np.diag([rx, ry])
+            # The image of an ellipse is an ellipse whose axes are the singular vectors
+            left, radii, _ = np.linalg.svd(axes)
+            controls[index] = (
+                radii[0], radii[1], np.degrees(np.arctan2(left[1, 0], left[0, 0])),
+                large_arc, 1.0 - sweep if mirrored else sweep,
+            )
+    return SvgSubpath(points, subpath.kinds, controls)
+
+def _shape_subpaths(name: str, attributes: dict) -> list:
+    """Converts a basic shape element into subpaths, or parses a path's data."""
+    get = lambda key: _number(attributes.get(key))
+    if name == "path":
+        return parse_path_data(attributes.get("d", ""))
+    if name == "line":
+        return [_line_subpath([get("x1"), get("y1"), get("x2"), get("y2")])]
+    if name in ("polyline", "polygon"):
+        values = np.array(_NUMBER.findall(attributes.get("points", "")), dtype=float)
+        points = values[:len(values) // 2 * 2].reshape(-1, 2)
+        if name == "polygon" and len(points) > 2 and not np.array_equal(points[0], points[-1]):
+            points = np.vstack([points, points[:1]])
+        return [_line_subpath(points)] if len(points) > 1 else []
+    if name in ("circle", "ellipse"):
+        cx, cy = get("cx"), get("cy")
+        rx, ry = (get("r"), get("r")) if name == "circle" else (get("rx"), get("ry"))
+        if rx <= 0 or ry <= 0:
+            return []
+        return parse_path_data(f"M {cx - rx} {cy} A {rx} {ry} 0 1 0 {cx + rx} {cy} A {rx} {ry} 0 1 0 {cx - rx} {cy} Z")
+    if name == "rect":
+        x, y, width, height = get("x"), get("y"), get("width"), get("height")
+        if width <= 0 or height <= 0:
+            return []
+        rx = _number(attributes.get("rx"), -1)
+        ry = _number(attributes.get("ry"), -1)
+        rx, ry = (rx if rx >= 0 else ry), (ry if ry >= 0 else rx)
+        rx, ry = min(max(rx, 0), width / 2), min(max(ry, 0), height / 2)
+        if rx == 0 or ry == 0:
+            return [_line_subpath([x, y, x + width, y, x + width, y + height, x, y + height, x, y])]
+        return parse_path_data(
+            f"M {x + rx} {y} H {x + width - rx} A {rx} {ry} 0 0 1 {x + width} {y + ry} V {y + height - ry} "
+            f"A {rx} {ry} 0 0 1 {x + width - rx} {y + height} H {x + rx} A {rx} {ry} 0 0 1 {x} {y + height - ry} "
+            f"V {y + ry} A {rx} {ry} 0 0 1 {x + rx} {y} Z"
+        )
+    return []
+
+def _iter_subpaths(events, root):
+    """Yields the subpaths of drawable elements as iterparse reports them, freeing each element once read."""
+    elements, transforms = [root], [parse_transform(root.get("transform"))]
+    skipped_depth = 0
+    for event, element in events:
+        name = _local_name(element.tag)
+        if event == "start":
+            elements.append(element)
+            transforms.append(transforms[-1] @ parse_transform(element.get("transform")) if element.get("transform") else transforms[-1])
+            if skipped_depth or name in SKIPPED_ELEMENTS or element.get("display") == "none":
+                skipped_depth += 1
+            continue
+
+        if not skipped_depth:
+            matrix = transforms[-1]
+            identity = np.array_equal(matrix, np.eye(3))
+            for subpath in _shape_subpaths(name, element.attrib):
+                yield subpath if identity else _transform_subpath(subpath, matrix)
+        elif skipped_depth:
+            skipped_depth -= 1
+        elements.pop()
+        transforms.pop()
+        # Drop the element from the tree so the document is never held in memory
+        element.clear()
+        if elements:
+            parent = elements[-1]
+            if len(parent) and parent[0] is element:
+                parent.remove(element)
+
+def read_svg(svg_file_path: str) -> tuple:
+    """
+    Opens an SVG file for incremental reading.
+
+    Only the root element is read up front. The drawable elements (path, line, polyline,
+    polygon, rect, circle and ellipse) are then parsed one at a time as the returned
+    generator is consumed, with their own and their ancestors' transforms applied, so large
+    traced documents never have to be loaded whole. Content of <defs>, <clipPath>, <mask>
+    and similar containers, and elements with display="none", is skipped.
+
+    Args:
+        svg_file_path (str): The path to the SVG file.
+
+    Returns:
+        tuple: (root attributes, generator of SvgSubpath). The subpaths are in user units;
+        the root attributes give the viewBox and size that map them onto the page.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: If the file is not well-formed XML.
+    """
+    events = ElementTree.iterparse(svg_file_path, events=("start", "end"))
+    _, root = next(events)
+    return dict(root.attrib), _iter_subpaths(events, root)
@@ -1,52 +1,133 @@
-from svgpathtools import svg2paths
+import logging
+import numpy as np
 import os
+from utils.curve_utils import LINE
+from utils.gcode_analyzer_utils import analyze_gcode
+from utils.gcode_writer_utils import iter_gcode, machine_transform
+from utils.machine_profiles import get_machine_profile
+from utils.path_ordering_utils import order_paths, travel_distance
+from utils.svg_reader_utils import read_svg
+from utils.svg_units_utils import document_geometry
+from utils.toolpath_utils import count_moves, reverse_toolpath, simplify_toolpaths, subpath_to_toolpath, toolpath_bounds, transform_toolpath
 
-def svg_to_gcode(svg_file_path: str, output_directory: str = "tmp/staticgcode") -> str:
+logger = logging.getLogger(__name__)
+
+# Reorder paths (and reverse them where useful) to minimize pen-up travel
+OPTIMIZE_TRAVEL = os.getenv("OPTIMIZE_TRAVEL", "true").lower() in ("1", "true", "yes")
+
+# Maximum deviation from the SVG geometry when flattening curves, and whether to emit G2/G3 arcs
+GCODE_CURVE_TOLERANCE = float(os.getenv("GCODE_CURVE_TOLERANCE", 0.05))
+GCODE_ARC_FITTING = os.getenv("GCODE_ARC_FITTING", "true").lower() in ("1", "true", "yes")
+
+# Polyline simplification before output: "rdp", "visvalingam" or "none", and its tolerance
+GCODE_SIMPLIFY = os.getenv("GCODE_SIMPLIFY", "rdp")
+GCODE_SIMPLIFY_TOLERANCE = float(os.getenv("GCODE_SIMPLIFY_TOLERANCE", 0.1))
+
+def prepare_toolpaths(svg_file_path: str, profile: dict, optimize_travel: bool = OPTIMIZE_TRAVEL, curve_tolerance: float = GCODE_CURVE_TOLERANCE, arc_fitting: bool = GCODE_ARC_FITTING, simplify: str = GCODE_SIMPLIFY, simplify_tolerance: float = GCODE_SIMPLIFY_TOLERANCE) -> tuple:
+    """
+    Turns the paths of an SVG file into machine-coordinate strokes ready to be written as G-code.
+
+    Args:
+        svg_file_path (str): The path to the SVG file.
+        profile (dict): The machine profile giving bed size, units and coordinate transform.
+        optimize_travel (bool): Whether to reorder and reverse paths to minimize pen-up travel.
+        curve_tolerance (float): Maximum deviation from curves when flattening them, in output units.
+        arc_fitting (bool): Whether to emit G2/G3 arcs where curves fit a circle.
+        simplify (str): Simplification of straight runs: "rdp", "visvalingam" or "none".
+        simplify_tolerance (float): Simplification tolerance in output units; smaller strokes are dropped.
+
+    Returns:
+        tuple: The strokes in drawing order and a dict of conversion statistics (path, line
+        and arc counts, moves before and after simplification, pen-up travel before and after
+        ordering, and the drawing bounds).
+    """
+    # Read the document's coordinate system; its paths are parsed one at a time as they are converted
+    svg_attributes, subpaths = read_svg(svg_file_path)
+    geometry = document_geometry(svg_attributes)
+    scale_x, scale_y, offset_x, offset_y = machine_transform(geometry, profile)
+
+    # Split the paths into continuous strokes, each drawn with the pen down. Fitting to the
+    # drawing can only shrink it, so the tolerance from the viewBox scale stays within bounds.
+    source_tolerance = curve_tolerance / abs(scale_x)
+    strokes = [subpath_to_toolpath(subpath, source_tolerance, arc_fitting) for subpath in subpaths]
+
+    # Map the strokes to machine coordinates, fitting everything drawn onto the bed
+    if profile["scale_to_fit"]:
+        scale_x, scale_y, offset_x, offset_y = machine_transform(geometry, profile, toolpath_bounds(strokes))
+    strokes = [transform_toolpath(stroke, scale_x, scale_y, offset_x, offset_y) for stroke in strokes]
+
+    # Simplify the strokes, merging tiny collinear segments and dropping specks
+    moves_before = count_moves(strokes)
+    strokes = simplify_toolpaths(strokes, simplify_tolerance, simplify)
+
+    # Order the strokes to minimize the rapid moves between them
+    starts = np.array([stroke.start for stroke in strokes]).reshape(-1, 2)
+    ends = np.array([stroke.end for stroke in strokes]).reshape(-1, 2)
+    order, reverse = np.arange(len(strokes)), np.zeros(len(strokes), dtype=bool)
+    travel_before = travel_distance(starts, ends, order, reverse)
+    if optimize_travel:
+        order, reverse = order_paths(starts, ends)
+    travel_after = travel_distance(starts, ends, order, reverse)
+    ordered = [reverse_toolpath(strokes[index]) if reverse[index] else strokes[index] for index in order]
+
+    motions = np.concatenate([stroke.segments[:, 2] for stroke in strokes]) if strokes else np.empty(0)
+    points = np.vstack([stroke.points for stroke in strokes]) if strokes else np.zeros((1, 2))
+    stats = {
+        "machine_profile": profile["name"],
+        "path_count": len(strokes),
+        "line_count": int(np.count_nonzero(motions == LINE)),
+        "arc_count": int(np.count_nonzero(motions != LINE)),
+        "moves_before": moves_before,
+        "moves_after": count_moves(strokes),
+        "travel_before": round(travel_before, 2),
+        "travel_after": round(travel_after, 2),
+        "bounds": [round(float(value), 3) for value in (*points.min(axis=0), *points.max(axis=0))],
+    }
+    return ordered, stats
+
+def svg_to_gcode(svg_file_path: str, output_path: str = None, profile: dict = None, **options) -> tuple:
     """
-    Converts an SVG file to G-code and saves it to the specified directory.
+    Converts an SVG file to G-code and saves it to the specified path.
 
     Args:
         svg_file_path (str): The path to the SVG file to convert.
-        output_directory (str): Directory to save the generated G-code file.
+        output_path (str, optional): Where to write the G-code. Defaults to a file named after
+            the SVG in tmp/staticgcode, which is shared between requests.
+        profile (dict, optional): The machine profile. Defaults to the MACHINE_PROFILE setting.
+        **options: Conversion options passed on to prepare_toolpaths.
 
     Returns:
-        str: The path to the generated G-code file.
+        tuple: The path to the generated G-code file and a dict of conversion statistics,
+        including the analysis of the written program under "analysis", or (None, None) on
+        failure.
     """
     try:
+        # Extract the base name to create the G-code file
+        if output_path:
+            gcode_file_path = output_path
+        else:
+            base_name = os.path.splitext(os.path.basename(svg_file_path))[0]
+            gcode_file_path = os.path.join("tmp/staticgcode", f"{base_name}.gcode")
+
         # Ensure the output directory exists
-        if not os.path.exists(output_directory):
+        output_directory = os.path.dirname(gcode_file_path)
+        if output_directory and not os.path.exists(output_directory):
             os.makedirs(output_directory)
 
-        # Extract the base name to create the G-code file
-        base_name = os.path.splitext(os.path.basename(svg_file_path))[0]
-        gcode_file_path = os.path.join(output_directory, f"{base_name}.gcode")
-
-        # Parse the SVG paths
-        paths, attributes = svg2paths(svg_file_path)
+        profile = profile or get_machine_profile()
+        strokes, stats = prepare_toolpaths(svg_file_path, profile, **options)
 
+        # Stream the program to disk chunk by chunk
         with open(gcode_file_path, "w") as gcode_file:
-            # Write G-code header
-            gcode_file.write("; G-code generated from SVG\n")
-            gcode_file.write("G21 ; Set units to mm\n")
-            gcode_file.write("G90 ; Absolute positioning\n")
-
-            # Iterate over the paths to generate G-code
-            for path in paths:
-                # Move to the starting point of the path
-                start = path.start
-                gcode_file.write(f"G0 X{start.real:.2f} Y{start.imag:.2f}\n")
-
-                # Generate G-code for each segment in the path
-                for segment in path:
-                    end = segment.end
-                    gcode_file.write(f"G1 X{end.real:.2f} Y{end.imag:.2f}\n")
+            gcode_file.writelines(iter_gcode(strokes, profile))
 
-            # Write G-code footer
-            gcode_file.write("M2 ; End of program\n")
+        # Summarize the written program: bounds, distances and estimated plot time
+        with open(gcode_file_path) as gcode_file:
+            stats["analysis"] = analyze_gcode(gcode_file, profile)
 
-        print(f"G-code saved to {gcode_file_path}")
-        return gcode_file_path
+        logger.info(f"G-code saved to {gcode_file_path} (pen-up travel {stats['travel_before']} -> {stats['travel_after']})")
+        return gcode_file_path, stats
 
     except Exception as e:
-        print(f"Failed to convert SVG to G-code: {e}")
-        return None
+        logger.error(f"Failed to convert SVG to G-code: {e}")
+        return None, None
@@ -0,0 +1,64 @@
+import re
+
+# Millimetres per unit for the absolute CSS units SVG lengths may use; unitless means px
+MM_PER_UNIT = {
+    "": 25.4 / 96,
+    "px": 25.4 / 96,
+    "pt": 25.4 / 72,
+    "pc": 25.4 / 6,
+    "mm": 1.0,
+    "cm": 10.0,
+    "in": 25.4,
+    "q": 0.25,
+}
+
+_LENGTH = re.compile(r"^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-zA-Z%]*)\s*$")
+
+def parse_length(value: str) -> tuple:
+    """
+    Parses an SVG length such as "210mm" or "1024".
+
+    Args:
+        value (str): The length attribute.
+
+    Returns:
+        tuple: (number, unit) with the unit lower-cased ("" when unitless), or None if the
+        value is missing or not an absolute length.
+    """
+    if not value:
+        return None
+    match = _LENGTH.match(value)
+    if not match or match.group(2).lower() not in MM_PER_UNIT:
+        return None
+    return float(match.group(1)), match.group(2).lower()
+
+def document_geometry(svg_attributes: dict) -> dict:
+    """
+    Works out the user-unit coordinate system of an SVG document from its root attributes.
+
+    Args:
+        svg_attributes (dict): Attributes of the root <svg> element.
+
+    Returns:
+        dict: "viewbox" as (min_x, min_y, width, height) in user units, and "mm_per_unit",
+        the physical size of one user unit in millimetres. Without a usable width and
+        viewBox, one user unit is one CSS pixel.
+    """
+    width = parse_length(svg_attributes.get("width"))
+    height = parse_length(svg_attributes.get("height"))
+    viewbox = None
+    if svg_attributes.get("viewBox"):
+        values = [float(v) for v in re.split(r"[\s,]+", svg_attributes["viewBox"].strip()) if v]
+        if len(values) == 4 and values[2] > 0 and values[3] > 0:
+            viewbox = tuple(values)
+
+    if viewbox is None:
+        viewbox = (0.0, 0.0, width[0] if width else 0.0, height[0] if height else 0.0)
+        mm_per_unit = MM_PER_UNIT[width[1]] if width else MM_PER_UNIT["px"]
+    elif width:
+        mm_per_unit = width[0] * MM_PER_UNIT[width[1]] / viewbox[2]
+    elif height:
+        mm_per_unit = height[0] * MM_PER_UNIT[height[1]] / viewbox[3]
+    else:
+        mm_per_unit = MM_PER_UNIT["px"]
+    return {"viewbox": viewbox, "mm_per_unit": mm_per_unit}
@@ -0,0 +1,214 @@
+from typing import NamedTuple
+import numpy as np
+from utils.curve_utils import LINE, ARC_CW, ARC_CCW, arc_endpoint_to_center, fit_arcs, flatten_bezier, flatten_elliptical_arc
+from utils.gcode_analyzer_utils import arc_bounds, arc_sweeps
+from utils.geometry_utils import join_polylines, merge_collinear, simplify_rdp, simplify_visvalingam, split_polylines
+from utils.svg_reader_utils import SEGMENT_ARC, SEGMENT_CUBIC, SEGMENT_LINE, SvgSubpath
+
+class Toolpath(NamedTuple):
+    """
+    A continuous pen-down stroke.
+
+    points is an (n, 2) array of segment endpoints. segments is an (n - 1, 3) array holding,
+    for the segment ending at points[i + 1], the arc centre (x, y) and its motion code
+    (LINE, ARC_CW or ARC_CCW, matching G1, G2 and G3).
+    """
+    points: np.ndarray
+    segments: np.ndarray
+
+    @property
+    def start(self) -> np.ndarray:
+        return self.points[0]
+
+    @property
+    def end(self) -> np.ndarray:
+        return self.points[-1]
+
+def reverse_toolpath(toolpath: Toolpath) -> Toolpath:
+    """
+    Returns the same stroke drawn from its end to its start.
+
+    Args:
+        toolpath (Toolpath): The stroke to reverse.
+
+    Returns:
+        Toolpath: The reversed stroke. Arcs keep their centres and swap direction.
+    """
+    segments = toolpath.segments[::-1].copy()
+    motion = segments[:, 2]
+    segments[:, 2] = np.where(motion == ARC_CW, ARC_CCW, np.where(motion == ARC_CCW, ARC_CW, motion))
+    return Toolpath(toolpath.points[::-1].copy(), segments)
+
+def transform_toolpath(toolpath: Toolpath, scale_x: float, scale_y: float, offset_x: float, offset_y: float) -> Toolpath:
+    """
+    Maps a stroke through the transform (x, y) -> (scale_x * x + offset_x, scale_y * y + offset_y).
+
+    Args:
+        toolpath (Toolpath): The stroke to transform.
+        scale_x (float): Scale along X; should equal scale_y in magnitude to keep arcs circular.
+        scale_y (float): Scale along Y; negative values mirror the stroke.
+        offset_x (float): Offset along X.
+        offset_y (float): Offset along Y.
+
+    Returns:
+        Toolpath: The transformed stroke. Mirroring swaps the direction of its arcs.
+    """
+    scale, offset = np.array([scale_x, scale_y]), np.array([offset_x, offset_y])
+    segments = toolpath.segments.copy()
+    motion = segments[:, 2]
+    arcs = motion != LINE
+    segments[arcs, :2] = segments[arcs, :2] * scale + offset
+    if scale_x * scale_y < 0:
+        segments[:, 2] = np.where(motion == ARC_CW, ARC_CCW, np.where(motion == ARC_CCW, ARC_CW, motion))
+    return Toolpath(toolpath.points * scale + offset, segments)
+
+def _segment_geometry(start: np.ndarray, end: np.ndarray, kind: int, controls: np.ndarray, tolerance: float, arc_fitting: bool) -> tuple:
+    """Converts one SVG segment into (vertices, segments) without its start point."""
+    if kind == SEGMENT_LINE:
+        return end[None, :], np.array([[0.0, 0.0, LINE]])
+
+    if kind == SEGMENT_ARC:
+        rx, ry, rotation, large_arc, sweep = controls
+        center, radii, start_angle, sweep_angle = arc_endpoint_to_center(start, end, (rx, ry), np.radians(rotation), large_arc > 0.5, sweep > 0.5)
+        if arc_fitting and abs(radii[0] - radii[1]) <= tolerance:
+            # Circular arcs map straight onto G2/G3, split so that no piece sweeps more than 180 degrees
+            pieces = max(1, int(np.ceil(abs(sweep_angle) / np.pi - 1e-9)))
+            angles = start_angle + np.radians(rotation) + sweep_angle * np.arange(1, pieces + 1) / pieces
+            vertices = center + radii[0] * np.column_stack([np.cos(angles), np.sin(angles)])
+            vertices[-1] = end
+            motion = ARC_CCW if sweep_angle > 0 else ARC_CW
+            return vertices, np.tile([center[0], center[1], motion], (pieces, 1))
+        samples = flatten_elliptical_arc(center, radii, np.radians(rotation), start_angle, sweep_angle, tolerance)
+        samples[0], samples[-1] = start, end
+    elif kind == SEGMENT_CUBIC:
+        samples = flatten_bezier([start, controls[0:2], controls[2:4], end], tolerance)
+    else:
+        samples = flatten_bezier([start, controls[0:2], end], tolerance)
+
+    if arc_fitting:
+        vertices, segments = fit_arcs(samples, tolerance)
+        return vertices[1:], segments
+    return samples[1:], np.tile([0.0, 0.0, LINE], (len(samples) - 1, 1))
+
+def subpath_to_toolpath(subpath: SvgSubpath, tolerance: float, arc_fitting: bool = True) -> Toolpath:
+    """
+    Converts a continuous SVG subpath into a toolpath of lines and circular arcs.
+
+    Curves are flattened adaptively so that the toolpath stays within the tolerance of the
+    original geometry; with arc fitting, flattened curves are re-expressed as circular arcs
+    wherever they fit, which keeps curves smooth without emitting many short lines.
+
+    Args:
+        subpath (SvgSubpath): A subpath from the SVG reader.
+        tolerance (float): Maximum deviation from the original geometry.
+        arc_fitting (bool): Whether to emit circular arcs (G2/G3) where they fit.
+
+    Returns:
+        Toolpath: The converted stroke.
+    """
+    points = subpath.points
+    if subpath.controls is None:
+        # Straight polylines, the bulk of traced drawings, convert without a per-segment loop
+        return Toolpath(points, np.tile([0.0, 0.0, LINE], (len(points) - 1, 1)))
+
+    vertices, segments = [points[:1]], []
+    for index, kind in enumerate(subpath.kinds):
+        segment_vertices, segment_segments = _segment_geometry(points[index], points[index + 1], kind, subpath.controls[index], tolerance, arc_fitting)
+        vertices.append(segment_vertices)
+        segments.append(segment_segments)
+    return Toolpath(np.vstack(vertices), np.vstack(segments) if segments else np.empty((0, 3)))
+
+def count_moves(toolpaths: list) -> int:
+    """
+    Counts the G-code moves needed to draw the toolpaths: one rapid per stroke plus one
+    G1/G2/G3 move per segment.
+
+    Args:
+        toolpaths (list): Toolpath strokes.
+
+    Returns:
+        int: The number of moves.
+    """
+    return sum(len(toolpath.segments) + 1 for toolpath in toolpaths)
+
+def toolpath_bounds(toolpaths: list) -> np.ndarray:
+    """
+    Computes the bounding box of strokes, including the parts of arcs bulging past their end points.
+
+    Args:
+        toolpaths (list): Toolpath strokes.
+
+    Returns:
+        np.ndarray: [min_x, min_y, max_x, max_y], or None if there are no strokes.
+    """
+    if not toolpaths:
+        return None
+    points = np.vstack([toolpath.points for toolpath in toolpaths])
+    starts = np.vstack([toolpath.points[:-1] for toolpath in toolpaths])
+    ends = np.vstack([toolpath.points[1:] for toolpath in toolpaths])
+    segments = np.vstack([toolpath.segments.reshape(-1, 3) for toolpath in toolpaths])
+    arcs = segments[:, 2] != LINE
+    radii, start_angles, sweeps = arc_sweeps(starts[arcs], ends[arcs], segments[arcs, :2], segments[arcs, 2])
+    return arc_bounds(points, (segments[arcs, :2], radii, start_angles, sweeps))
+
+def _line_runs(toolpath: Toolpath) -> list:
+    """Returns (first, last) vertex indices of each maximal run of line segments."""
+    is_line = np.concatenate([[False], toolpath.segments[:, 2] == LINE, [False]])
+    edges = np.flatnonzero(np.diff(is_line.astype(np.int8)))
+    return list(zip(edges[::2], edges[1::2]))
+
+def simplify_toolpaths(toolpaths: list, tolerance: float, method: str = "rdp") -> list:
+    """
+    Simplifies the straight-line parts of toolpaths and drops strokes smaller than the tolerance.
+
+    Runs of line segments from all strokes are simplified together in one batch: repeated and
+    collinear points are merged, then Ramer-Douglas-Peucker or Visvalingam-Whyatt removes
+    points within the tolerance. Arc segments are kept as they are.
+
+    Args:
+        toolpaths (list): Toolpath strokes.
+        tolerance (float): Simplification tolerance, in drawing units.
+        method (str): "rdp", "visvalingam", or "none" to only merge collinear points.
+
+    Returns:
+        list: The simplified strokes.
+    """
+    runs, polylines = [], []
+    for index, toolpath in enumerate(toolpaths):
+        for first, last in _line_runs(toolpath):
+            runs.append((index, first, last))
+            polylines.append(toolpath.points[first:last + 1])
+
+    points, offsets = join_polylines(polylines)
+    points, offsets = merge_collinear(points, offsets)
+    if method == "rdp":
+        points, offsets = simplify_rdp(points, offsets, tolerance)
+    elif method == "visvalingam":
+        points, offsets = simplify_visvalingam(points, offsets, tolerance)
+    simplified = split_polylines(points, offsets) if polylines else []
+
+    # Stitch the simplified line runs back together with the untouched arc segments
+    runs_by_toolpath = {}
+    for (index, first, last), polyline in zip(runs, simplified):
+        runs_by_toolpath.setdefault(index, []).append((first, last, polyline))
+
+    result = []
+    for index, toolpath in enumerate(toolpaths):
+        vertices, segments, cursor = [toolpath.points[:1]], [], 0
+        for first, last, polyline in runs_by_toolpath.get(index, []):
+            if first > cursor:
+                vertices.append(toolpath.points[cursor + 1:first + 1])
+                segments.append(toolpath.segments[cursor:first])
+            vertices.append(polyline[1:])
+            segments.append(np.tile([0.0, 0.0, LINE], (len(polyline) - 1, 1)))
+            cursor = last
+        if cursor < len(toolpath.segments):
+            vertices.append(toolpath.points[cursor + 1:])
+            segments.append(toolpath.segments[cursor:])
+
+        points = np.vstack(vertices)
+        extent = points.max(axis=0) - points.min(axis=0)
+        if extent.max() < tolerance:
+            continue
+        result.append(Toolpath(points, np.vstack(segments) if segments else np.empty((0, 3))))
+    return result
@@ -0,0 +1,296 @@
+import io
+import logging
+import os
+import numpy as np
+from PIL import Image
+from utils.conversion_prep_utils import PREPROCESS_THIN, preprocess_image
+from utils.geometry_utils import simplify_rdp, split_polylines
+
+logger = logging.getLogger(__name__)
+
+# Tracing settings
+VECTORIZER_TOLERANCE = float(os.getenv("VECTORIZER_TOLERANCE", 1.0))
+VECTORIZER_MIN_PERIMETER = int(os.getenv("VECTORIZER_MIN_PERIMETER", 12))
+
+# Boundary edge directions, indexed by direction code: 0 = +x, 1 = +y, 2 = -x, 3 = -y
+_DIRECTIONS = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]])
+
+def _boundary_edges(mask: np.ndarray) -> tuple:
+    """
+    Finds the pixel edges separating ink from background, oriented so that ink lies on
+    the same side of every edge. Coordinates are pixel corners of the mask padded by one.
+    """
+    padded = np.pad(mask, 1)
+
+    # Horizontal edges between vertically adjacent pixels
+    upper, lower = padded[:-1, :], padded[1:, :]
+    rows_down, cols_down = np.nonzero(lower & ~upper)
+    rows_up, cols_up = np.nonzero(upper & ~lower)
+
+    # Vertical edges between horizontally adjacent pixels
+    left, right = padded[:, :-1], padded[:, 1:]
+    rows_left, cols_left = np.nonzero(left & ~right)
+    rows_right, cols_right = np.nonzero(right & ~left)
+
+    start_x = np.concatenate([cols_down, cols_up + 1, cols_left + 1, cols_right + 1])
+    start_y = np.concatenate([rows_down + 1, rows_up + 1, rows_left, rows_right + 1])
+    direction = np.concatenate([
+        np.full(len(rows_down), 0), np.full(len(rows_up), 2),
+        np.full(len(rows_left), 1), np.full(len(rows_right), 3),
+    ])
+    return start_x, start_y, direction
+
+def _link_edges(start_x, start_y, direction, stride) -> np.ndarray:
+    """
+    Finds the successor of every boundary edge. Where two contours touch diagonally the
+    edge turns away from the ink, so diagonally connected ink is traced as one contour.
+    """
+    end_x = start_x + _DIRECTIONS[direction, 0]
+    end_y = start_y + _DIRECTIONS[direction, 1]
+    keys = (start_y * stride + start_x) * 4 + direction
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    end_vertex = end_y * stride + end_x
+
+    successor = np.full(len(keys), -1)
+    for turn in (3, 0, 1):
+        wanted = end_vertex * 4 + (direction + turn) % 4
+        position = np.minimum(np.searchsorted(sorted_keys, wanted), len(keys) - 1)
+        found = (sorted_keys[position] == wanted) & (successor < 0)
+        successor[found] = order[position[found]]
+    return successor
+
+def _order_cycles(successor: np.ndarray) -> tuple:
+    """
+    Splits the successor permutation into cycles using pointer jumping.
+
+    Returns:
+        tuple: (label, rank, predecessor), where label is the smallest edge index of each
+        edge's cycle, rank its distance from that edge along the cycle and predecessor the
+        edge preceding it.
+    """
+    count = len(successor)
+    iterations = int(np.ceil(np.log2(max(count, 2)))) + 1
+    index = np.arange(count)
+
+    label, pointer = index.copy(), successor.copy()
+    for _ in range(iterations):
+        label = np.minimum(label, label[pointer])
+        pointer = pointer[pointer]
+
+    predecessor = np.empty(count, dtype=np.int64)
+    predecessor[successor] = index
+    head = label == index
+    rank = np.where(head, 0, 1)
+    pointer = np.where(head, index, predecessor)
+    for _ in range(iterations):
+        rank = rank + rank[pointer]
+        pointer = pointer[pointer]
+    return label, rank, predecessor
+
+def trace_contours(mask: np.ndarray, tolerance: float = VECTORIZER_TOLERANCE, min_perimeter: int = VECTORIZER_MIN_PERIMETER) -> list:
+    """
+    Traces the outlines of the ink regions of a boolean mask as closed polylines.
+
+    Args:
+        mask (np.ndarray): (height, width) boolean array, True where the image is ink.
+        tolerance (float): Simplification tolerance in pixels.
+        min_perimeter (int): Contours shorter than this many pixel edges are dropped as speckles.
+
+    Returns:
+        list: Closed polylines as (n, 2) arrays of (x, y) pixel coordinates.
+    """
+    start_x, start_y, direction = _boundary_edges(mask)
+    if len(direction) == 0:
+        return []
+    successor = _link_edges(start_x, start_y, direction, mask.shape[1] + 3)
+    label, rank, predecessor = _order_cycles(successor)
+
+    # Drop short contours, then walk the remaining edges contour by contour
+    cycle_length = np.bincount(label, minlength=len(label))
+    long_enough = cycle_length[label] >= min_perimeter
+    # Only corners matter: drop edges that continue in the same direction as the previous one
+    corner = long_enough & (direction != direction[predecessor])
+    edges = np.nonzero(corner)[0]
+    edges = edges[np.lexsort((rank[edges], label[edges]))]
+    if len(edges) == 0:
+        return []
+
+    points = np.column_stack([start_x[edges], start_y[edges]]).astype(float) - 1.0
+    _, counts = np.unique(label[edges], return_counts=True)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    # Close every contour by repeating its first point
+    points = np.insert(points, offsets[1:], points[offsets[:-1]], axis=0)
+    offsets = offsets + np.arange(len(offsets))
+
+    points, offsets = simplify_rdp(points, offsets, tolerance)
+    return split_polylines(points, offsets)
+
+def _skeleton_edges(skeleton: np.ndarray) -> tuple:
+    """
+    Links 8-connected skeleton pixels into an undirected graph. Diagonal links are skipped
+    where an orthogonal path already joins the two pixels, so corners don't form triangles.
+    """
+    height, width = skeleton.shape
+    padded = np.pad(skeleton, 1)
+    index = np.arange(padded.size).reshape(padded.shape)
+    inner = (slice(1, height + 1), slice(1, width + 1))
+
+    def shifted(dy, dx):
+        return padded[1 + dy:height + 1 + dy, 1 + dx:width + 1 + dx]
+
+    here = padded[inner]
+    links = [
+        (here & shifted(0, 1), (0, 1)),
+        (here & shifted(1, 0), (1, 0)),
+        (here & shifted(1, 1) & ~shifted(0, 1) & ~shifted(1, 0), (1, 1)),
+        (here & shifted(1, -1) & ~shifted(0, -1) & ~shifted(1, 0), (1, -1)),
+    ]
+    tails, heads = [], []
+    for linked, (dy, dx) in links:
+        tail = index[inner][linked]
+        tails.append(tail)
+        heads.append(tail + dy * (width + 2) + dx)
+    return np.concatenate(tails), np.concatenate(heads), width + 2
+
+def trace_centerlines(skeleton: np.ndarray, tolerance: float = VECTORIZER_TOLERANCE, min_length: int = VECTORIZER_MIN_PERIMETER) -> list:
+    """
+    Traces a one-pixel-wide skeleton as open polylines running between endpoints and
+    junctions, plus closed polylines for loops, so every stroke is drawn once.
+
+    Each link becomes two half-edges. A half-edge arriving at a pixel with two links
+    continues along the other one; arriving at an endpoint or junction it turns back along
+    its twin. That makes the successor a permutation whose cycles each hold one stroke in
+    both directions (or one direction of a loop), which are ordered with pointer jumping.
+
+    Args:
+        skeleton (np.ndarray): (height, width) boolean array of one-pixel-wide strokes.
+        tolerance (float): Simplification tolerance in pixels.
+        min_length (int): Strokes shorter than this many pixels that end in a loose end are
+            dropped as spurs.
+
+    Returns:
+        list: Polylines as (n, 2) arrays of (x, y) pixel coordinates. Closed polylines
+        repeat their first point.
+    """
+    tails, heads, stride = _skeleton_edges(skeleton)
+    links = len(tails)
+    if links == 0:
+        return []
+
+    # Half-edges: h < links runs tail -> head, h >= links the reverse
+    start = np.concatenate([tails, heads])
+    end = np.concatenate([heads, tails])
+    half = np.arange(2 * links)
+    twin = (half + links) % (2 * links)
+
+    degree = np.bincount(start)
+    order = np.argsort(start, kind="stable")
+    first_out = np.searchsorted(start[order], end)
+    passes_through = degree[end] == 2
+    out_a = order[np.minimum(first_out, len(order) - 1)]
+    out_b = order[np.minimum(first_out + 1, len(order) - 1)]
+    successor = np.where(passes_through, out_a + out_b - twin, twin)
+
+    label, rank, _ = _order_cycles(successor)
+    cycles = np.max(label) + 1
+    turns = successor == twin
+
+    # Strokes: keep the half-edges after the cycle's first turn up to and including its second
+    first_turn = np.full(cycles, np.iinfo(np.int64).max)
+    last_turn = np.full(cycles, -1)
+    np.minimum.at(first_turn, label[turns], rank[turns])
+    np.maximum.at(last_turn, label[turns], rank[turns])
+    stroke = last_turn[label] >= 0
+    keep = stroke & (rank > first_turn[label]) & (rank <= last_turn[label])
+    # Rotate ranks so that each kept stroke starts right after its first turn
+    rank = np.where(stroke, rank - first_turn[label] - 1, rank)
+
+    # Loops: of the two cycles running in opposite directions, keep the one holding the lower half-edge
+    loop = ~stroke
+    lowest_own = np.full(cycles, np.iinfo(np.int64).max)
+    lowest_either = np.full(cycles, np.iinfo(np.int64).max)
+    np.minimum.at(lowest_own, label[loop], half[loop])
+    np.minimum.at(lowest_either, label[loop], np.minimum(half, twin)[loop])
+    keep |= loop & (lowest_own[label] == lowest_either[label])
+
+    edges = np.nonzero(keep)[0]
+    edges = edges[np.lexsort((rank[edges], label[edges]))]
+    _, counts = np.unique(label[edges], return_counts=True)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    # Drop short spurs hanging off the drawing
+    first_edge, last_edge = edges[offsets[:-1]], edges[offsets[1:] - 1]
+    loose_end = (degree[start[first_edge]] == 1) | (degree[end[last_edge]] == 1)
+    kept_strokes = ~(loose_end & (counts < min_length))
+    edges = edges[np.repeat(kept_strokes, counts)]
+    counts = counts[kept_strokes]
+    if len(edges) == 0:
+        return []
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    # Each stroke is the start of its first half-edge followed by the end of every half-edge
+    vertices = np.insert(end[edges], offsets[:-1], start[edges[offsets[:-1]]])
+    offsets = offsets + np.arange(len(offsets))
+    points = np.column_stack([vertices % stride, vertices // stride]).astype(float) - 1.0
+
+    points, offsets = simplify_rdp(points, offsets, tolerance)
+    return split_polylines(points, offsets)
+
+def polylines_to_svg(polylines: list, width: int, height: int) -> str:
+    """
+    Renders polylines as an SVG document with one stroked path element per polyline.
+
+    Args:
+        polylines (list): Polylines as (n, 2) arrays. Closed polylines repeat their first point.
+        width (int): Width of the drawing in pixels.
+        height (int): Height of the drawing in pixels.
+
+    Returns:
+        str: The SVG document.
+    """
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{width}" height="{height}" viewBox="0 0 {width} {height}">\n',
+        '<g fill="none" stroke="black" stroke-width="1">\n',
+    ]
+    for polyline in polylines:
+        closed = len(polyline) > 2 and np.array_equal(polyline[0], polyline[-1])
+        coords = polyline[:-1] if closed else polyline
+        values = ["%g" % value for value in np.round(coords, 2).ravel()]
+        d = f"M{values[0]} {values[1]}L" + " ".join(values[2:]) + ("Z" if closed else "")
+        parts.append(f'<path d="{d}"/>\n')
+    parts.append("</g>\n</svg>\n")
+    return "".join(parts)
+
+def vectorize_png_to_svg(image, output_path: str) -> str:
+    """
+    Converts a PNG file to SVG locally: the image is cleaned up into an ink mask, then the
+    outlines of its dark regions are traced, or their centerlines when thinning is enabled.
+
+    Args:
+        image (str or bytes): The path to the PNG file to convert, or its content.
+        output_path (str): The path to write the SVG file to.
+
+    Returns:
+        str: The path of the written SVG file, or None if the conversion failed.
+    """
+    try:
+        with Image.open(io.BytesIO(image) if isinstance(image, bytes) else image) as img:
+            mask = preprocess_image(img)
+        polylines = trace_centerlines(mask) if PREPROCESS_THIN else trace_contours(mask)
+
+        output_directory = os.path.dirname(output_path)
+        if output_directory:
+            os.makedirs(output_directory, exist_ok=True)
+        with open(output_path, "w") as svg_file:
+            svg_file.write(polylines_to_svg(polylines, mask.shape[1], mask.shape[0]))
+
+        logger.info(f"Traced {len(polylines)} paths, SVG saved locally as {output_path}")
+        return output_path
+    except Exception as e:
+        logger.error(f"Failed to vectorize image: {e}")
+        return None
@@ -0,0 +1,46 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Bounded pool for CPU-bound and blocking steps (thumbnailing, tracing, G-code conversion)
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", min(8, (os.cpu_count() or 1) + 2)))
+
+_executor = None
+
+def get_worker_pool() -> ThreadPoolExecutor:
+    """
+    Returns the shared worker pool, creating it on first use.
+
+    Returns:
+        ThreadPoolExecutor: The process-wide worker pool.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKER_POOL_SIZE, thread_name_prefix="pipeline-worker")
+    return _executor
+
+async def run_in_worker(func, *args, **kwargs):
+    """
+    Runs a blocking function in the worker pool without blocking the event loop. It runs in
+    a copy of the caller's context, so its logs carry the request's correlation id.
+
+    Args:
+        func (callable): The blocking function to run.
+        *args: Positional arguments for the function.
+        **kwargs: Keyword arguments for the function.
+
+    Returns:
+        The return value of the function.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_worker_pool(), functools.partial(context.run, func, *args, **kwargs))
+
+def shutdown_worker_pool():
+    """Shuts down the worker pool, waiting for running tasks to finish."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+    _executor = None
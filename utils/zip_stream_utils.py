@@ -0,0 +1,75 @@
+import io
+import os
+import zipfile
+
+# Bytes read from each file per write, and roughly the size of each yielded chunk
+ZIP_CHUNK_SIZE = int(os.getenv("ZIP_CHUNK_SIZE", 65536))
+
+# Already-compressed formats are stored as they are; everything else is deflated
+STORED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".zip"}
+
+class _ChunkBuffer(io.RawIOBase):
+    """
+    Write-only, unseekable sink that collects the archive's bytes until they are drained.
+    zipfile writes data descriptors after each entry instead of seeking back.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks, self.size = [], 0
+        return data
+
+def compression_for(file_path: str) -> int:
+    """
+    Chooses the compression method for an archive entry.
+
+    Args:
+        file_path (str): The file being archived.
+
+    Returns:
+        int: zipfile.ZIP_STORED for already-compressed images, zipfile.ZIP_DEFLATED otherwise.
+    """
+    if os.path.splitext(file_path)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+def iter_zip_archive(file_paths: list, chunk_size: int = ZIP_CHUNK_SIZE):
+    """
+    Generates a ZIP archive of the given files chunk by chunk, without writing it to disk
+    or holding it in memory, so it can be fed straight into a streaming HTTP response.
+
+    Args:
+        file_paths (list): Files to archive, each stored under its base name.
+        chunk_size (int): Bytes read per write and approximate size of each yielded chunk.
+
+    Yields:
+        bytes: Consecutive pieces of the archive.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for file_path in file_paths:
+            info = zipfile.ZipInfo.from_file(file_path, arcname=os.path.basename(file_path))
+            info.compress_type = compression_for(file_path)
+            with open(file_path, "rb") as source, archive.open(info, "w") as entry:
+                for block in iter(lambda: source.read(chunk_size), b""):
+                    entry.write(block)
+                    if buffer.size >= chunk_size:
+                        yield buffer.drain()
+    yield buffer.drain()